@@ -4,10 +4,12 @@ Generates personalized weekly workout plans in Farsi based on user profile
 """
 import os
 import json
+import asyncio
+import hashlib
 import requests
 import psycopg2
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
 # ─────────────────────────────────────────────
@@ -18,12 +20,18 @@ AVALAI_BASE_URL = "https://api.avalai.ir"
 # Get API key from settings when imported as module, or from env for standalone testing
 try:
     from app.core.config import settings
+    from app.core.single_flight import SingleFlight
+    from app.services.reference_data import reference_data
     AVALAI_API_KEY = settings.AVALAI_API_KEY
 except ImportError:
     # Fallback for standalone testing
     from dotenv import load_dotenv
     load_dotenv()
     AVALAI_API_KEY = os.getenv("x-goog-api-key")
+    # Without the app package identical calls are not coalesced, and plans
+    # can't be generated (goal/equipment labels come from reference_data)
+    SingleFlight = None
+    reference_data = None
 
 if not AVALAI_API_KEY:
     raise ValueError("x-goog-api-key not found in .env file or settings")
@@ -31,6 +39,9 @@ if not AVALAI_API_KEY:
 # Gemini model configuration
 GEMINI_MODEL = "gemini-2.5-pro"
 
+# Longest a request waits for an AvalAI call (3 attempts of up to 60s each)
+AVALAI_WAIT_TIMEOUT_SECONDS = 200
+
 # Standard tempo for all exercises (if database requires it)
 STANDARD_TEMPO = "2-0-2-0"  # Eccentric-Pause-Concentric-Pause
 
@@ -44,8 +55,8 @@ class FarsiExerciseSearchEngine:
     Returns exercises with Farsi names and instructions.
     """
     
-    def search_exercises(self, 
-                        db: Session,
+    async def search_exercises(self, 
+                        db: AsyncSession,
                         difficulty: Optional[str] = None,
                         muscle_groups: Optional[List[str]] = None,
                         equipment_ids: Optional[List[int]] = None,
@@ -56,7 +67,7 @@ class FarsiExerciseSearchEngine:
         Search for exercises using SQL filters.
         
         Args:
-            db: SQLAlchemy database session
+            db: SQLAlchemy async database session
             difficulty: Difficulty level (Beginner, Novice, Intermediate, Advanced)
             muscle_groups: Target muscle groups in English
             equipment_ids: Available equipment IDs
@@ -129,7 +140,7 @@ class FarsiExerciseSearchEngine:
         
         # Execute query
         full_query = " ".join(query_parts)
-        result = db.execute(text(full_query), params)
+        result = await db.execute(text(full_query), params)
         
         exercises = []
         for row in result:
@@ -150,11 +161,11 @@ class FarsiExerciseSearchEngine:
         
         return exercises
     
-    def search_warmup_exercises(self, db: Session, muscle_focus: Optional[str] = None, 
+    async def search_warmup_exercises(self, db: AsyncSession, muscle_focus: Optional[str] = None, 
                                 equipment_ids: Optional[List[int]] = None, limit: int = 15) -> List[Dict]:
         """Search for warmup exercises"""
         # For warmup, we look for stretches and recovery exercises
-        return self.search_exercises(
+        return await self.search_exercises(
             db=db,
             style='Stretches',
             muscle_groups=[muscle_focus] if muscle_focus else None,
@@ -162,20 +173,20 @@ class FarsiExerciseSearchEngine:
             limit=limit
         )
     
-    def search_cooldown_exercises(self, db: Session, muscle_focus: Optional[str] = None,
+    async def search_cooldown_exercises(self, db: AsyncSession, muscle_focus: Optional[str] = None,
                                   limit: int = 15) -> List[Dict]:
         """Search for cooldown/stretching exercises"""
-        return self.search_exercises(
+        return await self.search_exercises(
             db=db,
             style='Stretches',
             muscle_groups=[muscle_focus] if muscle_focus else None,
             limit=limit
         )
     
-    def search_by_muscle_group(self, db: Session, muscle_group: str, difficulty: str, 
+    async def search_by_muscle_group(self, db: AsyncSession, muscle_group: str, difficulty: str, 
                                equipment_ids: List[int], limit: int = 30) -> List[Dict]:
         """Search exercises targeting specific muscle group"""
-        return self.search_exercises(
+        return await self.search_exercises(
             db=db,
             difficulty=difficulty,
             muscle_groups=[muscle_group],
@@ -193,12 +204,12 @@ class FarsiWorkoutPlanGenerator:
     def __init__(self, search_engine: FarsiExerciseSearchEngine):
         self.search_engine = search_engine
     
-    def generate_weekly_plan(self, db: Session, user_profile: Dict) -> Dict:
+    async def generate_weekly_plan(self, db: AsyncSession, user_profile: Dict) -> Dict:
         """
         Generate a complete weekly workout plan based on user profile.
         
         Args:
-            db: SQLAlchemy database session
+            db: SQLAlchemy async database session
             user_profile: Dictionary containing:
                 - user_id: User identifier
                 - age: User age
@@ -228,19 +239,18 @@ class FarsiWorkoutPlanGenerator:
         location = user_profile.get('training_location', 'home')
         equipment_ids = user_profile.get('equipment_ids', [1])  # 1 = Bodyweight
         
+        # Goal and equipment labels come from the in-memory reference data
+        if reference_data is None:
+            raise RuntimeError("Generating plans needs the app package (app.services.reference_data)")
+        reference = await reference_data.get(db)
+        
         # Get workout goal info
         goal_label = "تناسب اندام عمومی"
         goal_description = ""
-        if user_profile.get('workout_goal_id'):
-            goal_query = text("""
-                SELECT goal_label_fa, description_fa 
-                FROM workout_goals 
-                WHERE workout_goal_id = :goal_id
-            """)
-            goal_result = db.execute(goal_query, {'goal_id': user_profile['workout_goal_id']}).fetchone()
-            if goal_result:
-                goal_label = goal_result[0] or goal_label
-                goal_description = goal_result[1] or ""
+        goal = reference.workout_goals.get(user_profile.get('workout_goal_id'))
+        if goal:
+            goal_label = goal.goal_label_fa or goal_label
+            goal_description = goal.description_fa or ""
         
         # Map fitness level to difficulty
         difficulty_mapping = {
@@ -252,13 +262,7 @@ class FarsiWorkoutPlanGenerator:
         difficulty = difficulty_mapping.get(physical_fitness.lower(), 'Beginner')
         
         # Get equipment names in Farsi
-        equipment_names = []
-        if equipment_ids:
-            eq_query = text("""
-                SELECT name_fa FROM equipment WHERE equipment_id = ANY(:ids)
-            """)
-            eq_result = db.execute(eq_query, {'ids': equipment_ids})
-            equipment_names = [row[0] for row in eq_result.fetchall()]
+        equipment_names = reference.names_fa('equipment', equipment_ids or [])
         
         print(f"🎯 در حال تولید برنامه تمرینی برای: {user_profile.get('user_id', 'کاربر ناشناس')}")
         print(f"   هدف: {goal_label} | سطح: {physical_fitness} | روزهای تمرین: {fitness_days}")
@@ -271,7 +275,7 @@ class FarsiWorkoutPlanGenerator:
         print("\n🔍 جستجوی تمرینات از پایگاه داده...")
         daily_exercises = []
         for day_info in weekly_split:
-            exercises = self._search_exercises_for_day(
+            exercises = await self._search_exercises_for_day(
                 db, day_info, difficulty, equipment_ids
             )
             daily_exercises.append({
@@ -281,7 +285,7 @@ class FarsiWorkoutPlanGenerator:
         
         # Generate structured plan using AvalAI
         print("\n🤖 تولید برنامه ساختاریافته با AvalAI Gemini API...")
-        workout_plan = self._generate_plan_with_avalai(
+        workout_plan = await self._generate_plan_with_avalai(
             user_profile, daily_exercises, limitations, difficulty,
             goal_label, goal_description, equipment_names
         )
@@ -330,7 +334,7 @@ class FarsiWorkoutPlanGenerator:
         
         return split[:training_days]
     
-    def _search_exercises_for_day(self, db: Session, day_info: Dict, difficulty: str,
+    async def _search_exercises_for_day(self, db: AsyncSession, day_info: Dict, difficulty: str,
                                   equipment_ids: List[int]) -> Dict:
         """Search for exercises for a specific training day"""
         
@@ -339,7 +343,7 @@ class FarsiWorkoutPlanGenerator:
         
         # Search warmup exercises
         warmup_muscle = muscle_groups[0] if muscle_groups else None
-        warmup_exercises = self.search_engine.search_warmup_exercises(
+        warmup_exercises = await self.search_engine.search_warmup_exercises(
             db=db,
             muscle_focus=warmup_muscle,
             equipment_ids=equipment_ids,
@@ -351,7 +355,7 @@ class FarsiWorkoutPlanGenerator:
         seen_ids = set()
         
         for muscle in muscle_groups:
-            exercises = self.search_engine.search_by_muscle_group(
+            exercises = await self.search_engine.search_by_muscle_group(
                 db=db,
                 muscle_group=muscle,
                 difficulty=difficulty,
@@ -367,7 +371,7 @@ class FarsiWorkoutPlanGenerator:
         
         # Search cooldown exercises
         cooldown_muscle = muscle_groups[0] if muscle_groups else None
-        cooldown_exercises = self.search_engine.search_cooldown_exercises(
+        cooldown_exercises = await self.search_engine.search_cooldown_exercises(
             db=db,
             muscle_focus=cooldown_muscle,
             limit=10
@@ -379,9 +383,9 @@ class FarsiWorkoutPlanGenerator:
             'cooldown': cooldown_exercises[:10]
         }
     
-    def _generate_plan_with_avalai(self, user_profile: Dict, daily_exercises: List[Dict],
-                                   limitations: str, difficulty: str, goal_label: str,
-                                   goal_description: str, equipment_names: List[str]) -> Dict:
+    async def _generate_plan_with_avalai(self, user_profile: Dict, daily_exercises: List[Dict],
+                                         limitations: str, difficulty: str, goal_label: str,
+                                         goal_description: str, equipment_names: List[str]) -> Dict:
         """Use AvalAI Gemini API to structure the workout plan in Farsi"""
         
         # Extract focus
@@ -543,7 +547,7 @@ class FarsiWorkoutPlanGenerator:
 
         # Call AvalAI API
         try:
-            response_text = self._call_avalai_api(system_instructions, user_message)
+            response_text = await self._call_avalai_shared(system_instructions, user_message)
             workout_data = self._parse_json_response(response_text)
             
             # Validate and return
@@ -574,6 +578,21 @@ class FarsiWorkoutPlanGenerator:
             print(f"❌ خطا در تولید برنامه با AvalAI: {e}")
             return self._generate_fallback_plan(daily_exercises)
     
+    async def _call_avalai_shared(self, system_instructions: str, user_message: str) -> str:
+        """
+        Call AvalAI once for identical concurrent prompts.
+        The blocking request runs in a thread; callers with the same prompt
+        share it and each parses its own copy of the response text.
+        """
+        call = lambda: asyncio.to_thread(self._call_avalai_api, system_instructions, user_message)
+        if avalai_calls is None:
+            return await asyncio.wait_for(call(), AVALAI_WAIT_TIMEOUT_SECONDS)
+        
+        prompt_hash = hashlib.sha256(
+            json.dumps([GEMINI_MODEL, system_instructions, user_message], ensure_ascii=False).encode()
+        ).hexdigest()
+        return await avalai_calls.run(prompt_hash, call, timeout=AVALAI_WAIT_TIMEOUT_SECONDS)
+    
     def _call_avalai_api(self, system_instructions: str, user_message: str, 
                          max_retries: int = 3) -> str:
         """Call AvalAI Gemini API with retry logic"""
@@ -771,15 +790,19 @@ class FarsiWorkoutPlanGenerator:
         }
 
 
+# Identical AvalAI prompts in flight at the same time share one request
+avalai_calls = SingleFlight() if SingleFlight is not None else None
+
+
 # ─────────────────────────────────────────────
 # MAIN API FUNCTION
 # ─────────────────────────────────────────────
-def generate_farsi_workout_plan(db: Session, user_profile: Dict) -> Dict:
+async def generate_farsi_workout_plan(db: AsyncSession, user_profile: Dict) -> Dict:
     """
     Main function to generate a Farsi workout plan using AvalAI API.
     
     Args:
-        db: SQLAlchemy database session
+        db: SQLAlchemy async database session
         user_profile: User profile dictionary containing:
             - user_id, age, weight, height, gender
             - workout_goal_id, physical_fitness, fitness_days
@@ -794,6 +817,6 @@ def generate_farsi_workout_plan(db: Session, user_profile: Dict) -> Dict:
     plan_generator = FarsiWorkoutPlanGenerator(search_engine)
     
     # Generate the plan
-    result = plan_generator.generate_weekly_plan(db, user_profile)
+    result = await plan_generator.generate_weekly_plan(db, user_profile)
     
     return result
@@ -0,0 +1,28 @@
+"""Add composite indexes for keyset pagination of list endpoints
+
+Revision ID: 003_add_keyset_pagination_indexes
+Revises: 002_update_workout_plan_schema
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '003_add_keyset_pagination_indexes'
+down_revision = '002_update_workout_plan_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # (user_id, sort key, id) lets each page be a single backward index range scan
+    op.create_index('ix_workout_plans_user_created_id', 'workout_plans', ['user_id', 'created_at', 'plan_id'], unique=False)
+    op.create_index('ix_nutrition_plans_user_created_id', 'nutrition_plans', ['user_id', 'created_at', 'plan_id'], unique=False)
+    op.create_index('ix_feedback_user_submitted_id', 'feedback', ['user_id', 'submitted_at', 'feedback_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_feedback_user_submitted_id', table_name='feedback')
+    op.drop_index('ix_nutrition_plans_user_created_id', table_name='nutrition_plans')
+    op.drop_index('ix_workout_plans_user_created_id', table_name='workout_plans')
@@ -0,0 +1,49 @@
+"""Composite indexes and archive table for verification codes
+
+Revision ID: 004_verification_code_lifecycle
+Revises: 003_add_keyset_pagination_indexes
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004_verification_code_lifecycle'
+down_revision = '003_add_keyset_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Built concurrently: verification_codes is written on every login attempt
+    with op.get_context().autocommit_block():
+        op.create_index('ix_verification_codes_identifier_type_created', 'verification_codes', ['identifier', 'code_type', 'created_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_verification_codes_code_type', 'verification_codes', ['code', 'code_type'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_verification_codes_expires_at', 'verification_codes', ['expires_at'], unique=False, postgresql_concurrently=True)
+        # Leading column of the composite index
+        op.drop_index('ix_verification_codes_identifier', table_name='verification_codes', postgresql_concurrently=True)
+
+    op.create_table(
+        'verification_codes_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('identifier', sa.String(length=255), nullable=False),
+        sa.Column('code', sa.String(length=6), nullable=False),
+        sa.Column('code_type', sa.String(length=10), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('verified', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('verification_codes_archive')
+    with op.get_context().autocommit_block():
+        op.create_index('ix_verification_codes_identifier', 'verification_codes', ['identifier'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_verification_codes_expires_at', table_name='verification_codes', postgresql_concurrently=True)
+        op.drop_index('ix_verification_codes_code_type', table_name='verification_codes', postgresql_concurrently=True)
+        op.drop_index('ix_verification_codes_identifier_type_created', table_name='verification_codes', postgresql_concurrently=True)
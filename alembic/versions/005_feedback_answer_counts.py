@@ -0,0 +1,40 @@
+"""Feedback answer rollups
+
+Revision ID: 005_feedback_answer_counts
+Revises: 004_verification_code_lifecycle
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005_feedback_answer_counts'
+down_revision = '004_verification_code_lifecycle'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'feedback_answer_counts',
+        sa.Column('question_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('answer', sa.String(length=255), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('question_id', 'answer')
+    )
+    op.create_table(
+        'feedback_analytics_state',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('rebuild_through', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Existing feedback is not counted yet: writes leave counters alone until
+    # `python -m app.services.feedback_analytics rebuild` has run
+    op.execute("INSERT INTO feedback_analytics_state (id, rebuild_through) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('feedback_analytics_state')
+    op.drop_table('feedback_answer_counts')
@@ -0,0 +1,34 @@
+"""One feedback submission per user and week
+
+Revision ID: 006_feedback_unique_week
+Revises: 005_feedback_answer_counts
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006_feedback_unique_week'
+down_revision = '005_feedback_answer_counts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Duplicates could only come from racing submissions; keep the first.
+    # Rerun `python -m app.services.feedback_analytics rebuild` if any were removed.
+    op.execute("""
+        DELETE FROM feedback f
+        USING feedback d
+        WHERE f.user_id = d.user_id
+          AND f.week_table = d.week_table
+          AND f.week_id = d.week_id
+          AND f.feedback_id > d.feedback_id
+    """)
+    op.create_unique_constraint('uq_feedback_user_week', 'feedback', ['user_id', 'week_table', 'week_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_feedback_user_week', 'feedback', type_='unique')
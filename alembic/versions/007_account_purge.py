@@ -0,0 +1,29 @@
+"""Deleted accounts are purged in the background
+
+Revision ID: 007_account_purge
+Revises: 006_feedback_unique_week
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_account_purge'
+down_revision = '006_feedback_unique_week'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        'ix_users_deleted_at', 'users', ['deleted_at'],
+        postgresql_where=sa.text('deleted_at IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_deleted_at', table_name='users')
+    op.drop_column('users', 'deleted_at')
@@ -2,20 +2,29 @@
 Authentication endpoints - Telegram, SMS, Email, Google OAuth
 """
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Dict, Optional
 import secrets
 import hashlib
 import hmac
 import json
 import urllib.parse
-import string
-import random
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, BackgroundTasks
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.session import get_db
+from app.core.referral import assign_referral_code
+from app.core.rate_limit import (
+    SEND_CODE_PER_IDENTIFIER,
+    SEND_CODE_PER_IP,
+    TELEGRAM_TOKEN_PER_USER,
+    VERIFY_CODE_PER_IP,
+    limit_by_ip,
+    rate_limiter,
+)
+from app.core.principal import Principal, invalidate_user, revoke_token
+from app.database.loaders import get_user_profile
 from app.core.security import (
     verify_telegram_auth,
     generate_verification_code,
@@ -48,13 +57,15 @@ from app.schemas.auth import (
 )
 from app.schemas.user import UserCreate, UserResponse
 from app.services.external import sms_service, email_service, google_oauth_service
-from app.dependencies import get_current_user
+from app.services.telegram_identity import find_telegram_user, load_telegram_user, resolve_telegram_user
+from app.services.telegram_updates import update_dispatcher
+from app.dependencies import get_current_principal, get_current_user
 
 router = APIRouter()
 
 
-def create_user_with_auth_method(
-    db: Session,
+async def create_user_with_auth_method(
+    db: AsyncSession,
     user_data: UserCreate,
     auth_provider: str,
     auth_identifier: str,
@@ -62,14 +73,12 @@ def create_user_with_auth_method(
 ) -> User:
     """Helper function to create user with auth method"""
     # Create user
-    referral_code = generate_referral_code(db)
     user = User(
         telegram_id=None,  # Will be set if auth_provider is telegram
-        referral_code=referral_code,
         **user_data.model_dump()
     )
     db.add(user)
-    db.flush()  # Get user.user_id
+    await assign_referral_code(db, user)  # Inserts the user and sets user.user_id
     
     # Update telegram_id if telegram auth
     if auth_provider == "telegram":
@@ -85,14 +94,13 @@ def create_user_with_auth_method(
         is_primary=True
     )
     db.add(auth_method)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     
-    return user
+    return await get_user_profile(db, user.user_id)
 
 
-def get_or_create_user(
-    db: Session,
+async def get_or_create_user(
+    db: AsyncSession,
     auth_provider: str,
     auth_identifier: str,
     user_data: UserCreate = None,
@@ -100,16 +108,16 @@ def get_or_create_user(
 ) -> tuple[User, bool]:
     """Get existing user or create new one. Returns (user, is_new_user)"""
     # Check if auth method exists
-    auth_method = db.query(UserAuthMethod).filter(
+    auth_method = await db.scalar(select(UserAuthMethod).where(
         and_(
             UserAuthMethod.auth_provider == auth_provider,
             UserAuthMethod.auth_identifier == auth_identifier
         )
-    ).first()
+    ))
     
     if auth_method:
         # Existing user
-        return auth_method.user, False
+        return await get_user_profile(db, auth_method.user_id), False
     
     # New user
     if not user_data:
@@ -118,7 +126,7 @@ def get_or_create_user(
             detail="User data required for new user registration"
         )
     
-    user = create_user_with_auth_method(db, user_data, auth_provider, auth_identifier, auth_data)
+    user = await create_user_with_auth_method(db, user_data, auth_provider, auth_identifier, auth_data)
     return user, True
 
 
@@ -133,17 +141,6 @@ def generate_tokens(user_id: int) -> Dict[str, str]:
     }
 
 
-def generate_referral_code(db: Session, length: int = 8) -> str:
-    """Generate a unique referral code"""
-    characters = string.ascii_uppercase + string.digits
-    while True:
-        code = ''.join(random.choices(characters, k=length))
-        # Check if code already exists
-        existing = db.query(User).filter(User.referral_code == code).first()
-        if not existing:
-            return code
-
-
 def validate_telegram_webapp_data(init_data: str, bot_token: str) -> bool:
     """
     Validates Telegram WebApp initData using HMAC-SHA256.
@@ -198,36 +195,12 @@ def parse_telegram_init_data(init_data: str) -> dict:
         return {}
 
 
-async def send_telegram_message(chat_id: int, text: str, reply_markup: dict = None):
-    """Helper function to send messages via Telegram Bot API"""
-    import httpx
-    
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    
-    payload = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "Markdown"
-    }
-    
-    if reply_markup:
-        payload["reply_markup"] = reply_markup
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload)
-            return response.status_code == 200
-    except Exception as e:
-        print(f"Error sending Telegram message: {e}")
-        return False
-
-
 # =============== Telegram Authentication ===============
 @router.post("/telegram/login", response_model=TelegramAuthResponse)
 async def telegram_login(
     auth_request: TelegramAuthRequest,
     user_data: UserCreate = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Authenticate or register user via Telegram
@@ -249,7 +222,7 @@ async def telegram_login(
     }
     
     # Get or create user
-    user, is_new = get_or_create_user(
+    user, is_new = await get_or_create_user(
         db=db,
         auth_provider="telegram",
         auth_identifier=telegram_id,
@@ -271,7 +244,7 @@ async def telegram_login(
 async def telegram_link(
     auth_request: TelegramAuthRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Link Telegram account to existing user
@@ -287,12 +260,12 @@ async def telegram_link(
     telegram_id = str(auth_request.id)
     
     # Check if telegram already linked
-    existing = db.query(UserAuthMethod).filter(
+    existing = await db.scalar(select(UserAuthMethod).where(
         and_(
             UserAuthMethod.auth_provider == "telegram",
             UserAuthMethod.auth_identifier == telegram_id
         )
-    ).first()
+    ))
     
     if existing:
         if existing.user_id == current_user.user_id:
@@ -326,7 +299,8 @@ async def telegram_link(
         current_user.telegram_id = auth_request.id
     
     db.add(auth_method)
-    db.commit()
+    await db.commit()
+    invalidate_user(current_user.user_id)
     
     return MessageResponse(message="Telegram account linked successfully")
 
@@ -334,7 +308,7 @@ async def telegram_link(
 @router.post("/telegram/auto-login", response_model=TelegramAuthResponse)
 async def telegram_auto_login(
     request: TelegramAutoLogin,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Automatic login when user opens web app from Telegram (Mini App).
@@ -360,38 +334,12 @@ async def telegram_auto_login(
     first_name = user_data_dict.get("first_name", "")
     last_name = user_data_dict.get("last_name", "")
     
-    # Get or create user
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
-    is_new = False
-    
-    if not user:
-        # Create new user (profile will be completed later)
-        referral_code = generate_referral_code(db)
-        user = User(
-            telegram_id=int(telegram_id),
-            referral_code=referral_code,
-            is_active=True
-        )
-        db.add(user)
-        db.flush()
-        
-        # Create auth method
-        auth_method = UserAuthMethod(
-            user_id=user.user_id,
-            auth_provider="telegram",
-            auth_identifier=telegram_id,
-            auth_data={
-                "username": username,
-                "first_name": first_name,
-                "last_name": last_name
-            },
-            is_verified=True,
-            is_primary=True
-        )
-        db.add(auth_method)
-        db.commit()
-        db.refresh(user)
-        is_new = True
+    # Get or create user (profile will be completed later), with goals and equipment for the response
+    user, is_new = await load_telegram_user(db, int(telegram_id), {
+        "username": username,
+        "first_name": first_name,
+        "last_name": last_name
+    })
     
     # Generate JWT tokens
     tokens = generate_tokens(user.user_id)
@@ -406,7 +354,7 @@ async def telegram_auto_login(
 @router.post("/telegram/request-token")
 async def telegram_request_token(
     request: TelegramTokenRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Called by Telegram bot when user sends /login command.
@@ -414,32 +362,13 @@ async def telegram_request_token(
     """
     telegram_id = request.telegram_id
     
-    # Check if user exists, create if not
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
-    if not user:
-        referral_code = generate_referral_code(db)
-        user = User(
-            telegram_id=int(telegram_id),
-            referral_code=referral_code,
-            is_active=True
-        )
-        db.add(user)
-        db.flush()
-        
-        # Create auth method
-        auth_method = UserAuthMethod(
-            user_id=user.user_id,
-            auth_provider="telegram",
-            auth_identifier=telegram_id,
-            auth_data={
-                "username": request.username,
-                "first_name": request.first_name
-            },
-            is_verified=True,
-            is_primary=True
-        )
-        db.add(auth_method)
-        db.commit()
+    await rate_limiter.hit(TELEGRAM_TOKEN_PER_USER, telegram_id)
+    
+    # Make sure the user exists (no query for known telegram ids)
+    await resolve_telegram_user(db, int(telegram_id), {
+        "username": request.username,
+        "first_name": request.first_name
+    })
     
     # Generate random 6-character token
     login_token = secrets.token_urlsafe(6)[:6].upper()
@@ -452,7 +381,7 @@ async def telegram_request_token(
         expires_at=datetime.utcnow() + timedelta(minutes=5)
     )
     db.add(verification)
-    db.commit()
+    await db.commit()
     
     return {
         "token": login_token,
@@ -463,21 +392,21 @@ async def telegram_request_token(
 @router.post("/telegram/verify-token", response_model=TelegramAuthResponse)
 async def telegram_verify_token(
     request: TelegramTokenVerify,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Web app calls this endpoint with the token from Telegram.
     Returns JWT tokens if valid.
     """
     # Find valid verification code
-    verification = db.query(VerificationCode).filter(
+    verification = await db.scalar(select(VerificationCode).where(
         and_(
             VerificationCode.code == request.token.upper(),
             VerificationCode.code_type == "telegram",
             VerificationCode.verified == False,
             VerificationCode.expires_at > datetime.utcnow()
         )
-    ).order_by(VerificationCode.created_at.desc()).first()
+    ).order_by(VerificationCode.created_at.desc()).limit(1))
     
     if not verification:
         raise HTTPException(
@@ -493,11 +422,11 @@ async def telegram_verify_token(
         )
     
     verification.attempts += 1
-    db.commit()
+    await db.commit()
     
     # Get user by telegram_id
     telegram_id = verification.identifier
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await find_telegram_user(db, int(telegram_id))
     
     if not user:
         raise HTTPException(
@@ -507,7 +436,7 @@ async def telegram_verify_token(
     
     # Mark token as used
     verification.verified = True
-    db.commit()
+    await db.commit()
     
     # Generate JWT tokens
     tokens = generate_tokens(user.user_id)
@@ -522,154 +451,47 @@ async def telegram_verify_token(
 @router.post("/telegram/webhook")
 async def telegram_webhook(
     update: dict,
-    db: Session = Depends(get_db)
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
 ):
     """
     Webhook for Telegram bot to receive messages.
-    Handles user registration and token requests.
+    Acknowledges immediately; registration and token requests are handled
+    by background workers (app.services.telegram_updates).
     """
-    try:
-        if "message" not in update:
-            return {"ok": True}
-        
-        message = update["message"]
-        telegram_user = message.get("from", {})
-        text = message.get("text", "")
-        chat_id = message.get("chat", {}).get("id")
-        
-        telegram_id = str(telegram_user.get("id"))
-        username = telegram_user.get("username")
-        first_name = telegram_user.get("first_name", "User")
-        
-        # Handle /start command - register user
-        if text.startswith("/start"):
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-            
-            if not user:
-                referral_code = generate_referral_code(db)
-                user = User(
-                    telegram_id=int(telegram_id),
-                    referral_code=referral_code,
-                    is_active=True
-                )
-                db.add(user)
-                db.flush()
-                
-                # Create auth method
-                auth_method = UserAuthMethod(
-                    user_id=user.user_id,
-                    auth_provider="telegram",
-                    auth_identifier=telegram_id,
-                    auth_data={
-                        "username": username,
-                        "first_name": first_name
-                    },
-                    is_verified=True,
-                    is_primary=True
-                )
-                db.add(auth_method)
-                db.commit()
-            
-            # Send welcome message with web app button
-            await send_telegram_message(
-                chat_id,
-                f"Welcome {first_name}! 🎉\n\n"
-                f"Choose how to access MovoAI:\n"
-                f"• Tap the button below to open the app directly\n"
-                f"• Or use /login to get a token for web browser",
-                reply_markup={
-                    "inline_keyboard": [[
-                        {
-                            "text": "Open MovoAI App",
-                            "web_app": {"url": f"{settings.FRONTEND_URL}"}
-                        }
-                    ]]
-                }
-            )
-        
-        # Handle /login command - generate token
-        elif text.startswith("/login"):
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-            
-            if not user:
-                referral_code = generate_referral_code(db)
-                user = User(
-                    telegram_id=int(telegram_id),
-                    referral_code=referral_code,
-                    is_active=True
-                )
-                db.add(user)
-                db.flush()
-                
-                # Create auth method
-                auth_method = UserAuthMethod(
-                    user_id=user.user_id,
-                    auth_provider="telegram",
-                    auth_identifier=telegram_id,
-                    auth_data={
-                        "username": username,
-                        "first_name": first_name
-                    },
-                    is_verified=True,
-                    is_primary=True
-                )
-                db.add(auth_method)
-                db.commit()
-            
-            # Generate token
-            login_token = secrets.token_urlsafe(6)[:6].upper()
-            
-            verification = VerificationCode(
-                identifier=telegram_id,
-                code=login_token,
-                code_type="telegram",
-                expires_at=datetime.utcnow() + timedelta(minutes=5)
-            )
-            db.add(verification)
-            db.commit()
-            
-            # Send token to user
-            await send_telegram_message(
-                chat_id,
-                f"🔐 Your login token:\n\n"
-                f"`{login_token}`\n\n"
-                f"Enter this on {settings.FRONTEND_URL} within 5 minutes.\n"
-                f"This token can only be used once."
-            )
-        
+    if settings.TELEGRAM_WEBHOOK_SECRET and not hmac.compare_digest(
+        x_telegram_bot_api_secret_token or "", settings.TELEGRAM_WEBHOOK_SECRET
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid webhook secret"
+        )
+    
+    if not isinstance(update.get("update_id"), int):
         return {"ok": True}
-        
-    except Exception as e:
-        print(f"Webhook error: {e}")
-        return {"ok": False}
+    
+    if update_dispatcher.submit(update) is False:
+        # Queue full - let Telegram redeliver later
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Update queue full"
+        )
+    
+    return {"ok": True}
 
 
 # =============== Phone/SMS Authentication ===============
-@router.post("/phone/send-code", response_model=CodeSentResponse)
+@router.post("/phone/send-code", response_model=CodeSentResponse, dependencies=[Depends(limit_by_ip(SEND_CODE_PER_IP))])
 async def phone_send_code(
     request: PhoneSendCodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Send verification code via SMS
     """
     phone_number = request.phone_number
     
-    # Check rate limiting
-    one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-    recent_codes = db.query(VerificationCode).filter(
-        and_(
-            VerificationCode.identifier == phone_number,
-            VerificationCode.code_type == "sms",
-            VerificationCode.created_at >= one_hour_ago
-        )
-    ).count()
-    
-    if recent_codes >= settings.MAX_CODES_PER_HOUR:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Maximum {settings.MAX_CODES_PER_HOUR} codes per hour exceeded"
-        )
+    # Check rate limiting (MAX_CODES_PER_HOUR per phone number)
+    await rate_limiter.hit(SEND_CODE_PER_IDENTIFIER, "sms", phone_number)
     
     # Generate code
     code = generate_verification_code()
@@ -683,14 +505,14 @@ async def phone_send_code(
         expires_at=expires_at
     )
     db.add(verification)
-    db.commit()
+    await db.commit()
     
-    # Send SMS
+    # Queue SMS (sent in the background)
     success = await sms_service.send_verification_code(phone_number, code)
     if not success:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send SMS"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Failed to send SMS, please try again later"
         )
     
     return CodeSentResponse(
@@ -699,10 +521,10 @@ async def phone_send_code(
     )
 
 
-@router.post("/phone/verify-code", response_model=PhoneAuthResponse)
+@router.post("/phone/verify-code", response_model=PhoneAuthResponse, dependencies=[Depends(limit_by_ip(VERIFY_CODE_PER_IP))])
 async def phone_verify_code(
     request: PhoneVerifyCodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Verify SMS code and login/register user
@@ -711,7 +533,7 @@ async def phone_verify_code(
     code = request.code
     
     # Find latest valid code
-    verification = db.query(VerificationCode).filter(
+    verification = await db.scalar(select(VerificationCode).where(
         and_(
             VerificationCode.identifier == phone_number,
             VerificationCode.code_type == "sms",
@@ -719,7 +541,7 @@ async def phone_verify_code(
             VerificationCode.expires_at > datetime.utcnow(),
             VerificationCode.verified == False
         )
-    ).order_by(VerificationCode.created_at.desc()).first()
+    ).order_by(VerificationCode.created_at.desc()).limit(1))
     
     if not verification:
         raise HTTPException(
@@ -738,7 +560,7 @@ async def phone_verify_code(
     
     # Verify code
     if verification.code != code:
-        db.commit()
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid verification code"
@@ -746,10 +568,10 @@ async def phone_verify_code(
     
     # Mark as verified
     verification.verified = True
-    db.commit()
+    await db.commit()
     
     # Get or create user
-    user, is_new = get_or_create_user(
+    user, is_new = await get_or_create_user(
         db=db,
         auth_provider="sms",
         auth_identifier=phone_number,
@@ -769,8 +591,8 @@ async def phone_verify_code(
 @router.post("/phone/link", response_model=MessageResponse)
 async def phone_link(
     request: PhoneVerifyCodeRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Link phone number to existing account
@@ -779,7 +601,7 @@ async def phone_link(
     phone_number = request.phone_number
     code = request.code
     
-    verification = db.query(VerificationCode).filter(
+    verification = await db.scalar(select(VerificationCode).where(
         and_(
             VerificationCode.identifier == phone_number,
             VerificationCode.code_type == "sms",
@@ -787,7 +609,7 @@ async def phone_link(
             VerificationCode.expires_at > datetime.utcnow(),
             VerificationCode.verified == False
         )
-    ).order_by(VerificationCode.created_at.desc()).first()
+    ).order_by(VerificationCode.created_at.desc()).limit(1))
     
     if not verification or verification.code != code:
         raise HTTPException(
@@ -796,15 +618,15 @@ async def phone_link(
         )
     
     verification.verified = True
-    db.commit()
+    await db.commit()
     
     # Check if phone already linked
-    existing = db.query(UserAuthMethod).filter(
+    existing = await db.scalar(select(UserAuthMethod).where(
         and_(
             UserAuthMethod.auth_provider == "sms",
             UserAuthMethod.auth_identifier == phone_number
         )
-    ).first()
+    ))
     
     if existing:
         raise HTTPException(
@@ -821,37 +643,25 @@ async def phone_link(
         is_primary=False
     )
     db.add(auth_method)
-    db.commit()
+    await db.commit()
+    invalidate_user(current_user.user_id)
     
     return MessageResponse(message="Phone number linked successfully")
 
 
 # =============== Email Authentication ===============
-@router.post("/email/send-code", response_model=CodeSentResponse)
+@router.post("/email/send-code", response_model=CodeSentResponse, dependencies=[Depends(limit_by_ip(SEND_CODE_PER_IP))])
 async def email_send_code(
     request: EmailSendCodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Send verification code via email
     """
     email = request.email
     
-    # Check rate limiting
-    one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-    recent_codes = db.query(VerificationCode).filter(
-        and_(
-            VerificationCode.identifier == email,
-            VerificationCode.code_type == "email",
-            VerificationCode.created_at >= one_hour_ago
-        )
-    ).count()
-    
-    if recent_codes >= settings.MAX_CODES_PER_HOUR:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Maximum {settings.MAX_CODES_PER_HOUR} codes per hour exceeded"
-        )
+    # Check rate limiting (MAX_CODES_PER_HOUR per email)
+    await rate_limiter.hit(SEND_CODE_PER_IDENTIFIER, "email", email)
     
     # Generate code
     code = generate_verification_code()
@@ -865,14 +675,14 @@ async def email_send_code(
         expires_at=expires_at
     )
     db.add(verification)
-    db.commit()
+    await db.commit()
     
-    # Send email
+    # Queue email (sent in the background)
     success = await email_service.send_verification_code(email, code)
     if not success:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send email"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Failed to send email, please try again later"
         )
     
     return CodeSentResponse(
@@ -881,10 +691,10 @@ async def email_send_code(
     )
 
 
-@router.post("/email/verify-code", response_model=EmailAuthResponse)
+@router.post("/email/verify-code", response_model=EmailAuthResponse, dependencies=[Depends(limit_by_ip(VERIFY_CODE_PER_IP))])
 async def email_verify_code(
     request: EmailVerifyCodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Verify email code and login/register user
@@ -893,7 +703,7 @@ async def email_verify_code(
     code = request.code
     
     # Find latest valid code
-    verification = db.query(VerificationCode).filter(
+    verification = await db.scalar(select(VerificationCode).where(
         and_(
             VerificationCode.identifier == email,
             VerificationCode.code_type == "email",
@@ -901,7 +711,7 @@ async def email_verify_code(
             VerificationCode.expires_at > datetime.utcnow(),
             VerificationCode.verified == False
         )
-    ).order_by(VerificationCode.created_at.desc()).first()
+    ).order_by(VerificationCode.created_at.desc()).limit(1))
     
     if not verification:
         raise HTTPException(
@@ -920,7 +730,7 @@ async def email_verify_code(
     
     # Verify code
     if verification.code != code:
-        db.commit()
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid verification code"
@@ -928,10 +738,10 @@ async def email_verify_code(
     
     # Mark as verified
     verification.verified = True
-    db.commit()
+    await db.commit()
     
     # Get or create user
-    user, is_new = get_or_create_user(
+    user, is_new = await get_or_create_user(
         db=db,
         auth_provider="email",
         auth_identifier=email,
@@ -951,8 +761,8 @@ async def email_verify_code(
 @router.post("/email/link", response_model=MessageResponse)
 async def email_link(
     request: EmailVerifyCodeRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Link email to existing account
@@ -961,7 +771,7 @@ async def email_link(
     code = request.code
     
     # Verify code
-    verification = db.query(VerificationCode).filter(
+    verification = await db.scalar(select(VerificationCode).where(
         and_(
             VerificationCode.identifier == email,
             VerificationCode.code_type == "email",
@@ -969,7 +779,7 @@ async def email_link(
             VerificationCode.expires_at > datetime.utcnow(),
             VerificationCode.verified == False
         )
-    ).order_by(VerificationCode.created_at.desc()).first()
+    ).order_by(VerificationCode.created_at.desc()).limit(1))
     
     if not verification or verification.code != code:
         raise HTTPException(
@@ -978,15 +788,15 @@ async def email_link(
         )
     
     verification.verified = True
-    db.commit()
+    await db.commit()
     
     # Check if email already linked
-    existing = db.query(UserAuthMethod).filter(
+    existing = await db.scalar(select(UserAuthMethod).where(
         and_(
             UserAuthMethod.auth_provider == "email",
             UserAuthMethod.auth_identifier == email
         )
-    ).first()
+    ))
     
     if existing:
         raise HTTPException(
@@ -1003,7 +813,8 @@ async def email_link(
         is_primary=False
     )
     db.add(auth_method)
-    db.commit()
+    await db.commit()
+    invalidate_user(current_user.user_id)
     
     return MessageResponse(message="Email linked successfully")
 
@@ -1037,7 +848,7 @@ async def google_login():
 async def google_callback(
     code: str = Query(...),
     user_data: UserCreate = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Handle Google OAuth callback
@@ -1063,7 +874,7 @@ async def google_callback(
     }
     
     # Get or create user
-    user, is_new = get_or_create_user(
+    user, is_new = await get_or_create_user(
         db=db,
         auth_provider="google",
         auth_identifier=google_id,
@@ -1084,8 +895,8 @@ async def google_callback(
 @router.post("/google/link", response_model=MessageResponse)
 async def google_link(
     id_token: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Link Google account to existing user
@@ -1101,12 +912,12 @@ async def google_link(
     google_id = google_user['google_id']
     
     # Check if Google account already linked
-    existing = db.query(UserAuthMethod).filter(
+    existing = await db.scalar(select(UserAuthMethod).where(
         and_(
             UserAuthMethod.auth_provider == "google",
             UserAuthMethod.auth_identifier == google_id
         )
-    ).first()
+    ))
     
     if existing:
         if existing.user_id == current_user.user_id:
@@ -1134,7 +945,8 @@ async def google_link(
         is_primary=False
     )
     db.add(auth_method)
-    db.commit()
+    await db.commit()
+    invalidate_user(current_user.user_id)
     
     return MessageResponse(message="Google account linked successfully")
 
@@ -1143,7 +955,7 @@ async def google_link(
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     request: TokenRefresh,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Refresh access token using refresh token
@@ -1162,8 +974,8 @@ async def refresh_token(
             detail="Invalid token payload"
         )
     
-    # Verify user exists
-    user = db.query(User).filter(User.user_id == user_id).first()
+    # Verify user exists (and was not deleted)
+    user = await db.scalar(select(User).where(User.user_id == user_id, User.deleted_at.is_(None)))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1178,27 +990,28 @@ async def refresh_token(
 
 @router.post("/logout", response_model=MessageResponse)
 async def logout(
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Logout user (client should delete tokens)
-    In production, add refresh token to blacklist
+    The access token is revoked; in production, add refresh token to blacklist
     """
+    revoke_token(current_user.token_id, current_user.expires_at)
     return MessageResponse(message="Logged out successfully")
 
 
 # =============== Auth Method Management ===============
 @router.get("/methods", response_model=list[AuthMethodResponse])
 async def get_auth_methods(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get all authentication methods for current user
     """
-    auth_methods = db.query(UserAuthMethod).filter(
+    auth_methods = (await db.scalars(select(UserAuthMethod).where(
         UserAuthMethod.user_id == current_user.id
-    ).all()
+    ))).all()
     
     return [AuthMethodResponse.model_validate(am) for am in auth_methods]
 
@@ -1206,19 +1019,19 @@ async def get_auth_methods(
 @router.delete("/methods/{method_id}", response_model=MessageResponse)
 async def delete_auth_method(
     method_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Remove authentication method (must have at least one remaining)
     """
     # Get auth method
-    auth_method = db.query(UserAuthMethod).filter(
+    auth_method = await db.scalar(select(UserAuthMethod).where(
         and_(
             UserAuthMethod.id == method_id,
             UserAuthMethod.user_id == current_user.id
         )
-    ).first()
+    ))
     
     if not auth_method:
         raise HTTPException(
@@ -1227,12 +1040,12 @@ async def delete_auth_method(
         )
     
     # Check if user has other auth methods
-    other_methods = db.query(UserAuthMethod).filter(
+    other_methods = await db.scalar(select(func.count()).select_from(UserAuthMethod).where(
         and_(
             UserAuthMethod.user_id == current_user.user_id,
             UserAuthMethod.id != method_id
         )
-    ).count()
+    ))
     
     if other_methods == 0:
         raise HTTPException(
@@ -1242,17 +1055,18 @@ async def delete_auth_method(
     
     # If removing primary method, set another as primary
     if auth_method.is_primary:
-        new_primary = db.query(UserAuthMethod).filter(
+        new_primary = await db.scalar(select(UserAuthMethod).where(
             and_(
                 UserAuthMethod.user_id == current_user.user_id,
                 UserAuthMethod.id != method_id
             )
-        ).first()
+        ))
         if new_primary:
             new_primary.is_primary = True
     
-    db.delete(auth_method)
-    db.commit()
+    await db.delete(auth_method)
+    await db.commit()
+    invalidate_user(current_user.user_id)
     
     return MessageResponse(message="Authentication method removed successfully")
 
@@ -1260,19 +1074,19 @@ async def delete_auth_method(
 @router.post("/methods/{method_id}/set-primary", response_model=MessageResponse)
 async def set_primary_auth_method(
     method_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Set authentication method as primary
     """
     # Get auth method
-    auth_method = db.query(UserAuthMethod).filter(
+    auth_method = await db.scalar(select(UserAuthMethod).where(
         and_(
             UserAuthMethod.id == method_id,
             UserAuthMethod.user_id == current_user.id
         )
-    ).first()
+    ))
     
     if not auth_method:
         raise HTTPException(
@@ -1281,12 +1095,13 @@ async def set_primary_auth_method(
         )
     
     # Remove primary from all other methods
-    db.query(UserAuthMethod).filter(
+    await db.execute(update(UserAuthMethod).where(
         UserAuthMethod.user_id == current_user.user_id
-    ).update({"is_primary": False})
+    ).values({"is_primary": False}))
     
     # Set as primary
     auth_method.is_primary = True
-    db.commit()
+    await db.commit()
+    invalidate_user(current_user.user_id)
     
     return MessageResponse(message="Primary authentication method updated")
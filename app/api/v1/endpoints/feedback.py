@@ -1,27 +1,40 @@
 """
 Feedback endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from sqlalchemy import func, desc, select, literal_column, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from app.database.session import get_db
-from app.models.user import User
-from app.models.feedback import Feedback, FeedbackQuestion
-from app.models.workout_plan import WorkoutWeek, WorkoutDay, WorkoutDayExercise
-from app.models.nutrition_plan import NutritionWeek, NutritionDay, Meal
-from app.models.exercise import Exercise
+from app.database.replicas import get_read_db
+from app.core.pagination import paginate_keyset, estimate_count
+from app.models.feedback import Feedback
+from app.models.workout_plan import WorkoutPlan, WorkoutWeek
+from app.models.nutrition_plan import NutritionPlan, NutritionWeek
 from app.schemas.feedback import (
     FeedbackCreate,
+    FeedbackBatchCreate,
+    FeedbackBatchItemResult,
+    FeedbackBatchResponse,
     FeedbackDetail,
     FeedbackSummary,
     FeedbackListResponse,
     FeedbackQuestionDetail,
-    FeedbackQuestionListResponse
+    FeedbackQuestionListResponse,
+    AnswerCount,
+    QuestionAnalytics,
+    FeedbackAnalyticsResponse
 )
 from app.schemas.auth import MessageResponse
-from app.dependencies import get_current_user
+from app.dependencies import get_current_principal
+from app.core.principal import Principal
+from app.services.feedback_analytics import answer_counts, record_feedback_change, record_feedback_changes
+from app.core.etag import catalog_response
+from app.services.feedback_catalog import feedback_catalog
+from app.services.feedback_options import get_week_options
 
 router = APIRouter()
 
@@ -29,8 +42,8 @@ router = APIRouter()
 @router.post("", response_model=FeedbackDetail, status_code=status.HTTP_201_CREATED)
 async def submit_feedback(
     feedback_data: FeedbackCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Submit feedback for a workout or nutrition week
@@ -41,12 +54,12 @@ async def submit_feedback(
     """
     # Verify the week exists and belongs to user
     if feedback_data.week_table == 'workout_weeks':
-        week = db.query(WorkoutWeek).join(
+        week = await db.scalar(select(WorkoutWeek).join(
             WorkoutWeek.workout_plan
-        ).filter(
+        ).where(
             WorkoutWeek.week_id == feedback_data.week_id,
             WorkoutWeek.workout_plan.has(user_id=current_user.user_id)
-        ).first()
+        ))
         
         if not week:
             raise HTTPException(
@@ -55,12 +68,12 @@ async def submit_feedback(
             )
     
     elif feedback_data.week_table == 'nutrition_weeks':
-        week = db.query(NutritionWeek).join(
-            NutritionWeek.nutrition_plan
-        ).filter(
+        week = await db.scalar(select(NutritionWeek).join(
+            NutritionWeek.plan
+        ).where(
             NutritionWeek.week_id == feedback_data.week_id,
-            NutritionWeek.nutrition_plan.has(user_id=current_user.user_id)
-        ).first()
+            NutritionWeek.plan.has(user_id=current_user.user_id)
+        ))
         
         if not week:
             raise HTTPException(
@@ -69,11 +82,11 @@ async def submit_feedback(
             )
     
     # Check if feedback already exists for this week
-    existing_feedback = db.query(Feedback).filter(
+    existing_feedback = await db.scalar(select(Feedback).where(
         Feedback.user_id == current_user.user_id,
         Feedback.week_table == feedback_data.week_table,
         Feedback.week_id == feedback_data.week_id
-    ).first()
+    ))
     
     if existing_feedback:
         raise HTTPException(
@@ -90,29 +103,135 @@ async def submit_feedback(
     )
     
     db.add(new_feedback)
-    db.commit()
-    db.refresh(new_feedback)
+    try:
+        await db.flush()
+    except IntegrityError:
+        # Submitted concurrently
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Feedback already submitted for this week"
+        )
+    await record_feedback_change(db, new_feedback.feedback_id, None, new_feedback.responses)
+    await db.commit()
+    await db.refresh(new_feedback)
     
     return FeedbackDetail.model_validate(new_feedback)
 
 
+@router.post("/batch", response_model=FeedbackBatchResponse)
+async def submit_feedback_batch(
+    batch: FeedbackBatchCreate,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Submit feedback for several weeks at once
+    
+    Used by the mini-app to sync feedback collected offline. Ownership of all
+    weeks is checked with one query and new feedback is written with one
+    INSERT ... ON CONFLICT DO NOTHING, in a single transaction.
+    
+    Each item gets a status, in request order:
+    - **created**: feedback saved
+    - **exists**: the week already has feedback (edit it with PUT /feedback/{feedback_id})
+    - **not_found**: the week does not exist or does not belong to you
+    """
+    user_id = current_user.user_id
+    workout_week_ids = {item.week_id for item in batch.items if item.week_table == 'workout_weeks'}
+    nutrition_week_ids = {item.week_id for item in batch.items if item.week_table == 'nutrition_weeks'}
+    
+    # Verify all weeks exist and belong to user
+    owned = set((await db.execute(union_all(
+        select(literal_column("'workout_weeks'"), WorkoutWeek.week_id).join(WorkoutWeek.workout_plan).where(
+            WorkoutPlan.user_id == user_id,
+            WorkoutWeek.week_id.in_(workout_week_ids)
+        ),
+        select(literal_column("'nutrition_weeks'"), NutritionWeek.week_id).join(NutritionWeek.plan).where(
+            NutritionPlan.user_id == user_id,
+            NutritionWeek.week_id.in_(nutrition_week_ids)
+        )
+    ))).all())
+    
+    # First item per week wins
+    new_items = {}
+    for item in batch.items:
+        key = (item.week_table, item.week_id)
+        if key in owned and key not in new_items:
+            new_items[key] = item
+    
+    feedback_ids = {}
+    if new_items:
+        conn = await db.connection()
+        insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+        stmt = insert(Feedback).values([
+            {"user_id": user_id, "week_table": week_table, "week_id": week_id, "responses": item.responses}
+            for (week_table, week_id), item in new_items.items()
+        ]).on_conflict_do_nothing(
+            index_elements=[Feedback.user_id, Feedback.week_table, Feedback.week_id]
+        ).returning(Feedback.feedback_id, Feedback.week_table, Feedback.week_id)
+        for row in await db.execute(stmt):
+            feedback_ids[(row.week_table, row.week_id)] = row.feedback_id
+    
+    created = set(feedback_ids)
+    await record_feedback_changes(db, [
+        (feedback_ids[key], None, new_items[key].responses) for key in created
+    ])
+    
+    # Weeks that already had feedback
+    if len(created) < len(new_items):
+        rows = await db.execute(select(Feedback.feedback_id, Feedback.week_table, Feedback.week_id).where(
+            Feedback.user_id == user_id,
+            Feedback.week_id.in_({week_id for _, week_id in new_items.keys() - created})
+        ))
+        for row in rows:
+            feedback_ids.setdefault((row.week_table, row.week_id), row.feedback_id)
+    
+    await db.commit()
+    
+    results = []
+    reported = set()
+    for item in batch.items:
+        key = (item.week_table, item.week_id)
+        if key not in owned:
+            outcome = 'not_found'
+        elif key in created and key not in reported:
+            outcome = 'created'
+        else:
+            # Already submitted, or repeated within this batch
+            outcome = 'exists'
+        reported.add(key)
+        results.append(FeedbackBatchItemResult(
+            week_table=item.week_table,
+            week_id=item.week_id,
+            status=outcome,
+            feedback_id=feedback_ids.get(key)
+        ))
+    
+    return FeedbackBatchResponse(
+        results=results,
+        created=sum(result.status == 'created' for result in results)
+    )
+
+
 @router.get("", response_model=FeedbackListResponse)
 async def list_feedback(
     week_table: Optional[str] = Query(None, description="Filter by week_table: workout_weeks or nutrition_weeks"),
     week_id: Optional[int] = Query(None, description="Filter by specific week_id"),
     limit: int = Query(50, ge=1, le=100, description="Number of results to return"),
-    offset: int = Query(0, ge=0, description="Number of results to skip"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    include_total: bool = Query(False, description="Include an approximate total count"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    List all feedback submissions by current user
+    List feedback submissions by current user, newest first
     
     Optional filters:
     - **week_table**: Filter by workout_weeks or nutrition_weeks
     - **week_id**: Filter by specific week
     """
-    query = db.query(Feedback).filter(Feedback.user_id == current_user.user_id)
+    query = select(Feedback).where(Feedback.user_id == current_user.user_id)
     
     if week_table:
         if week_table not in ['workout_weeks', 'nutrition_weeks']:
@@ -125,11 +244,16 @@ async def list_feedback(
     if week_id:
         query = query.filter(Feedback.week_id == week_id)
     
-    # Get total count
-    total = query.count()
-    
     # Get paginated results
-    feedback_list = query.order_by(desc(Feedback.submitted_at)).offset(offset).limit(limit).all()
+    try:
+        feedback_list, next_cursor = await paginate_keyset(
+            db, query, Feedback.submitted_at, Feedback.feedback_id, limit, cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     
     # Convert to summary format
     summaries = [
@@ -144,27 +268,18 @@ async def list_feedback(
         for f in feedback_list
     ]
     
-    return FeedbackListResponse(feedback=summaries, total=total)
+    return FeedbackListResponse(
+        feedback=summaries,
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None,
+        total=await estimate_count(db, query) if include_total else None
+    )
 
 
 # ========== Feedback Questions Endpoints ==========
 
-@router.get("/questions", response_model=FeedbackQuestionListResponse)
-async def list_feedback_questions(
-    week_table: str = Query(..., description="Filter by week_table: workout_weeks or nutrition_weeks"),
-    week_number: int = Query(..., description="Filter by specific week_number (1-12)"),
-    focus: str = Query(..., description="User's fitness focus"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """
-    List feedback questions for a specific week
-    
-    Required params:
-    - **week_table**: 'workout_weeks' or 'nutrition_weeks'
-    - **week_number**: Week number (1-12)
-    - **focus**: User's fitness focus (performance_enhancement, body_recomposition, efficiency, rebuilding_rehab)
-    """
+def validate_question_filters(week_table: str, week_number: int, focus: str):
+    """400 unless (week_table, week_number, focus) names a question set"""
     # Validate week_table
     if week_table not in ['workout_weeks', 'nutrition_weeks']:
         raise HTTPException(
@@ -186,43 +301,51 @@ async def list_feedback_questions(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"focus must be one of: {', '.join(valid_focus_values)}"
         )
+
+
+@router.get("/questions", response_model=FeedbackQuestionListResponse)
+async def list_feedback_questions(
+    week_table: str = Query(..., description="Filter by week_table: workout_weeks or nutrition_weeks"),
+    week_number: int = Query(..., description="Filter by specific week_number (1-12)"),
+    focus: str = Query(..., description="User's fitness focus"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    List feedback questions for a specific week
     
-    # Build query for questions
-    query = db.query(FeedbackQuestion).filter(
-        FeedbackQuestion.week_table == week_table,
-        FeedbackQuestion.week_number == week_number,
-        FeedbackQuestion.focus == focus
-    )
-    
-    # Get questions ordered by question_order
-    questions = query.order_by(FeedbackQuestion.question_order).all()
+    Required params:
+    - **week_table**: 'workout_weeks' or 'nutrition_weeks'
+    - **week_number**: Week number (1-12)
+    - **focus**: User's fitness focus (performance_enhancement, body_recomposition, efficiency, rebuilding_rehab)
+    """
+    validate_question_filters(week_table, week_number, focus)
     
-    return FeedbackQuestionListResponse(
-        questions=[FeedbackQuestionDetail.model_validate(q) for q in questions],
-        total=len(questions)
-    )
+    catalog = await feedback_catalog.get(db)
+    return catalog_response(catalog.lists[(week_table, week_number, focus)], if_none_match)
 
 
 @router.get("/questions/{question_id}", response_model=FeedbackQuestionDetail)
 async def get_feedback_question(
     question_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get specific feedback question by ID
     """
-    question = db.query(FeedbackQuestion).filter(
-        FeedbackQuestion.question_id == question_id
-    ).first()
+    catalog = await feedback_catalog.get(db)
+    entry = catalog.questions.get(question_id)
     
-    if not question:
+    if not entry:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Question not found"
         )
     
-    return FeedbackQuestionDetail.model_validate(question)
+    return catalog_response(entry, if_none_match)
 
 
 @router.get("/questions/week/{week_table}/{week_number}/options", response_model=dict)
@@ -230,8 +353,8 @@ async def get_dynamic_options(
     week_table: str,
     week_number: int,
     option_type: str = Query(..., description="Type of options: 'exercises' or 'meals'"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get dynamic options (exercises or meals) for a specific week number
@@ -258,89 +381,98 @@ async def get_dynamic_options(
             detail="week_number must be between 1 and 12"
         )
     
-    options = []
-    
-    if week_table == 'workout_weeks' and option_type == 'exercises':
-        # Get all exercises for this workout week
-        week = db.query(WorkoutWeek).join(
-            WorkoutWeek.workout_plan
-        ).filter(
-            WorkoutWeek.week_number == week_number,
-            WorkoutWeek.workout_plan.has(user_id=current_user.user_id)
-        ).first()
-        
-        if not week:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Workout week not found"
-            )
-        
-        # Get unique exercises from all days in this week
-        exercise_ids = set()
-        for day in week.days:
-            for workout_exercise in day.exercises:
-                exercise_ids.add(workout_exercise.exercise_id)
-        
-        # Fetch exercise details
-        exercises = db.query(Exercise).filter(Exercise.exercise_id.in_(exercise_ids)).all()
-        
-        options = [
-            {"label": ex.name_fa or ex.name_en, "value": str(ex.exercise_id)}
-            for ex in exercises
-        ]
-    
-    elif week_table == 'nutrition_weeks' and option_type == 'meals':
-        # Get all meals for this nutrition week
-        week = db.query(NutritionWeek).join(
-            NutritionWeek.nutrition_plan
-        ).filter(
-            NutritionWeek.week_number == week_number,
-            NutritionWeek.nutrition_plan.has(user_id=current_user.user_id)
-        ).first()
-        
-        if not week:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Nutrition week not found"
-            )
-        
-        # Get unique meals from all days in this week
-        meal_names = set()
-        for day in week.days:
-            for meal in day.meals:
-                meal_names.add(meal.name)
-        
-        options = [
-            {"label": name, "value": name}
-            for name in sorted(meal_names)
-        ]
-    
-    else:
+    if (week_table, option_type) not in [('workout_weeks', 'exercises'), ('nutrition_weeks', 'meals')]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid combination: {week_table} with {option_type}"
         )
     
+    options = await get_week_options(db, current_user.user_id, week_table, week_number)
+    
+    if options is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workout week not found" if week_table == 'workout_weeks' else "Nutrition week not found"
+        )
+    
     return {"options": options, "total": len(options)}
 
 
+# ========== Feedback Analytics Endpoints ==========
+
+def question_analytics(question_id: int, counts: list) -> QuestionAnalytics:
+    return QuestionAnalytics(
+        question_id=question_id,
+        answers=[AnswerCount(answer=answer, count=count) for answer, count in counts],
+        total=sum(count for _, count in counts)
+    )
+
+
+@router.get("/analytics", response_model=FeedbackAnalyticsResponse)
+async def get_feedback_analytics(
+    week_table: str = Query(..., description="workout_weeks or nutrition_weeks"),
+    week_number: int = Query(..., description="Week number (1-12)"),
+    focus: str = Query(..., description="Fitness focus"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Answer distributions for the feedback questions of a week and focus
+    
+    Read from rollups maintained as feedback is submitted, edited and deleted.
+    """
+    validate_question_filters(week_table, week_number, focus)
+    
+    catalog = await feedback_catalog.get(db)
+    question_ids = catalog.question_ids[(week_table, week_number, focus)]
+    counts = await answer_counts(db, question_ids)
+    
+    return FeedbackAnalyticsResponse(
+        week_table=week_table,
+        week_number=week_number,
+        focus=focus,
+        questions=[question_analytics(question_id, counts[question_id]) for question_id in question_ids]
+    )
+
+
+@router.get("/analytics/questions/{question_id}", response_model=QuestionAnalytics)
+async def get_question_analytics(
+    question_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Answer distribution for one feedback question
+    """
+    catalog = await feedback_catalog.get(db)
+    
+    if question_id not in catalog.questions:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found"
+        )
+    
+    counts = await answer_counts(db, [question_id])
+    return question_analytics(question_id, counts[question_id])
+
+
 # ========== Feedback CRUD Endpoints ==========
 
 @router.get("/{feedback_id}", response_model=FeedbackDetail)
 async def get_feedback(
     feedback_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get detailed feedback by ID
     
     Returns full feedback including all question responses
     """
-    feedback = db.query(Feedback).filter(
+    feedback = await db.scalar(select(Feedback).where(
         Feedback.feedback_id == feedback_id,
         Feedback.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not feedback:
         raise HTTPException(
@@ -355,18 +487,18 @@ async def get_feedback(
 async def update_feedback(
     feedback_id: int,
     feedback_data: FeedbackCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update existing feedback
     
     Allows user to modify their feedback responses before final submission
     """
-    feedback = db.query(Feedback).filter(
+    feedback = await db.scalar(select(Feedback).where(
         Feedback.feedback_id == feedback_id,
         Feedback.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not feedback:
         raise HTTPException(
@@ -375,10 +507,11 @@ async def update_feedback(
         )
     
     # Update responses
+    await record_feedback_change(db, feedback.feedback_id, feedback.responses, feedback_data.responses)
     feedback.responses = feedback_data.responses
     
-    db.commit()
-    db.refresh(feedback)
+    await db.commit()
+    await db.refresh(feedback)
     
     return FeedbackDetail.model_validate(feedback)
 
@@ -386,16 +519,16 @@ async def update_feedback(
 @router.delete("/{feedback_id}", response_model=MessageResponse)
 async def delete_feedback(
     feedback_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Delete feedback submission
     """
-    feedback = db.query(Feedback).filter(
+    feedback = await db.scalar(select(Feedback).where(
         Feedback.feedback_id == feedback_id,
         Feedback.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not feedback:
         raise HTTPException(
@@ -403,7 +536,8 @@ async def delete_feedback(
             detail="Feedback not found"
         )
     
-    db.delete(feedback)
-    db.commit()
+    await record_feedback_change(db, feedback.feedback_id, feedback.responses, None)
+    await db.delete(feedback)
+    await db.commit()
     
     return MessageResponse(message="Feedback deleted successfully")
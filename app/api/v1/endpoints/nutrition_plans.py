@@ -2,12 +2,18 @@
 Nutrition Plan endpoints (Phase 3)
 Includes mock AI generation for nutrition plans until AI agents are implemented
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
 import random
 
 from app.database.session import get_db
+from app.database.replicas import get_read_db
+from app.core.pagination import paginate_keyset, estimate_count
+from app.core.projection import parse_fields, nested_load_options
+from app.core.idempotency import plan_idempotency
 from app.models.user import User
 from app.models.nutrition_plan import NutritionPlan, NutritionWeek, NutritionDay, Meal
 from app.models.nutrition_goal import NutritionGoal
@@ -19,13 +25,37 @@ from app.schemas.nutrition_plan import (
     NutritionPlanListResponse,
     NutritionWeekCompletionRequest,
     NutritionWeekCompletionResponse,
-    NutritionWeekResponse
+    NutritionWeekResponse,
+    NutritionDayResponse
 )
 from app.schemas.auth import MessageResponse
-from app.dependencies import get_current_user
+from app.dependencies import get_current_principal, get_current_user
+from app.core.principal import Principal
+from app.services.feedback_options import invalidate_week_options
+from app.services.reference_data import reference_data
 
 router = APIRouter()
 
+# Nested relationship levels selectable with ?fields= (outermost first)
+NUTRITION_PLAN_LEVELS = [
+    ("weeks", NutritionPlan.weeks),
+    ("days", NutritionWeek.days),
+    ("meals", NutritionDay.meals),
+]
+NUTRITION_WEEK_LEVELS = NUTRITION_PLAN_LEVELS[1:]
+
+
+def resolve_load_options(fields: Optional[str], levels: list) -> list:
+    """Translate a fields parameter into loader options, 400 on unknown fields"""
+    try:
+        depth = parse_fields(fields, [name for name, _ in levels])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return nested_load_options(levels, depth)
+
 
 # ========== Mock AI Generation Functions ==========
 
@@ -92,8 +122,8 @@ def generate_mock_meals(meal_type: str, day_number: int, base_calories: int) ->
     }
 
 
-def generate_mock_nutrition_week(
-    db: Session, 
+async def generate_mock_nutrition_week(
+    db: AsyncSession, 
     plan: NutritionPlan, 
     week_number: int,
     user: User
@@ -125,7 +155,7 @@ def generate_mock_nutrition_week(
         description=week_data["description"]
     )
     db.add(week)
-    db.flush()  # Get week_id
+    await db.flush()  # Get week_id
     
     # Calculate daily calorie target - convert Decimal to int
     weight = int(user.weight) if user.weight else 70
@@ -142,7 +172,7 @@ def generate_mock_nutrition_week(
             daily_calories=base_calories
         )
         db.add(day)
-        db.flush()  # Get day_id
+        await db.flush()  # Get day_id
         
         # Add 4 meals per day (breakfast, lunch, dinner, snacks)
         for meal_type in ["breakfast", "lunch", "dinner", "snacks"]:
@@ -172,13 +202,34 @@ def generate_mock_nutrition_week(
 @router.post("", response_model=NutritionPlanDetailResponse, status_code=status.HTTP_201_CREATED)
 async def create_nutrition_plan(
     plan_data: NutritionPlanCreate,
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key return the first response"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new nutrition plan with AI-generated content.
     Currently uses mock AI generation - will be replaced with real AI agents.
+    With an Idempotency-Key header, duplicates of the request (retries, double
+    taps) return the first request's plan instead of generating another.
     """
+    if idempotency_key is None:
+        return await generate_nutrition_plan(plan_data, current_user, db)
+    return await plan_idempotency.response(
+        "nutrition_plans",
+        current_user.user_id,
+        idempotency_key,
+        plan_data,
+        lambda: generate_nutrition_plan(plan_data, current_user, db),
+        status_code=status.HTTP_201_CREATED
+    )
+
+
+async def generate_nutrition_plan(
+    plan_data: NutritionPlanCreate,
+    current_user: User,
+    db: AsyncSession
+) -> NutritionPlanDetailResponse:
+    """Validate the request, generate the plan and store it"""
     
     # Validate total_weeks
     if plan_data.total_weeks not in [1, 4, 12]:
@@ -190,9 +241,7 @@ async def create_nutrition_plan(
     # Get nutrition goal if provided
     nutrition_goal = None
     if plan_data.nutrition_goal_id:
-        nutrition_goal = db.query(NutritionGoal).filter(
-            NutritionGoal.nutrition_goal_id == plan_data.nutrition_goal_id
-        ).first()
+        nutrition_goal = (await reference_data.get(db)).nutrition_goals.get(plan_data.nutrition_goal_id)
         if not nutrition_goal:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -215,55 +264,73 @@ async def create_nutrition_plan(
         expectations=expectations
     )
     db.add(nutrition_plan)
-    db.flush()  # Get plan_id
+    await db.flush()  # Get plan_id
     
     # Generate nutrition weeks with mock AI
     for week_num in range(1, plan_data.total_weeks + 1):
-        generate_mock_nutrition_week(db, nutrition_plan, week_num, current_user)
+        await generate_mock_nutrition_week(db, nutrition_plan, week_num, current_user)
     
-    db.commit()
+    await db.commit()
+    invalidate_week_options(current_user.user_id, 'nutrition_weeks')
     
     # Reload with all relationships
-    plan = db.query(NutritionPlan).options(
+    plan = await db.scalar(select(NutritionPlan).options(
         joinedload(NutritionPlan.weeks).joinedload(NutritionWeek.days).joinedload(NutritionDay.meals)
-    ).filter(NutritionPlan.plan_id == nutrition_plan.plan_id).first()
+    ).where(NutritionPlan.plan_id == nutrition_plan.plan_id))
     
     return NutritionPlanDetailResponse.model_validate(plan)
 
 
 @router.get("", response_model=NutritionPlanListResponse)
 async def get_user_nutrition_plans(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100, description="Number of plans per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    include_total: bool = Query(False, description="Include an approximate total count"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get all nutrition plans for the current user
+    Get the current user's nutrition plans, newest first, one page at a time
     """
-    plans = db.query(NutritionPlan).filter(
+    query = select(NutritionPlan).where(
         NutritionPlan.user_id == current_user.user_id
-    ).order_by(NutritionPlan.created_at.desc()).all()
+    )
+    
+    try:
+        plans, next_cursor = await paginate_keyset(
+            db, query, NutritionPlan.created_at, NutritionPlan.plan_id, limit, cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     
     return NutritionPlanListResponse(
         plans=[NutritionPlanResponse.model_validate(p) for p in plans],
-        total=len(plans)
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None,
+        total=await estimate_count(db, query) if include_total else None
     )
 
 
 @router.get("/{plan_id}", response_model=NutritionPlanDetailResponse)
 async def get_nutrition_plan(
     plan_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated levels to include: weeks, days, meals (default: all)"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get a specific nutrition plan with all details
+    Get a specific nutrition plan with all details.
+    Use `fields` to load only some nested levels; omitted levels come back empty.
     """
-    plan = db.query(NutritionPlan).options(
-        joinedload(NutritionPlan.weeks).joinedload(NutritionWeek.days).joinedload(NutritionDay.meals)
-    ).filter(
+    plan = await db.scalar(select(NutritionPlan).options(
+        *resolve_load_options(fields, NUTRITION_PLAN_LEVELS)
+    ).where(
         NutritionPlan.plan_id == plan_id,
         NutritionPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -278,17 +345,21 @@ async def get_nutrition_plan(
 async def get_nutrition_week(
     plan_id: int,
     week_number: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated levels to include: days, meals (default: all)"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get a specific week from a nutrition plan
+    Get a specific week from a nutrition plan.
+    Use `fields` to load only some nested levels; omitted levels come back empty.
     """
+    load_options = resolve_load_options(fields, NUTRITION_WEEK_LEVELS)
+    
     # Verify plan ownership
-    plan = db.query(NutritionPlan).filter(
+    plan = await db.scalar(select(NutritionPlan).where(
         NutritionPlan.plan_id == plan_id,
         NutritionPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -297,12 +368,10 @@ async def get_nutrition_week(
         )
     
     # Get the week
-    week = db.query(NutritionWeek).options(
-        joinedload(NutritionWeek.days).joinedload(NutritionDay.meals)
-    ).filter(
+    week = await db.scalar(select(NutritionWeek).options(*load_options).where(
         NutritionWeek.plan_id == plan_id,
         NutritionWeek.week_number == week_number
-    ).first()
+    ))
     
     if not week:
         raise HTTPException(
@@ -313,20 +382,53 @@ async def get_nutrition_week(
     return NutritionWeekResponse.model_validate(week)
 
 
+@router.get("/{plan_id}/week/{week_number}/day/{day_id}", response_model=NutritionDayResponse)
+async def get_nutrition_day(
+    plan_id: int,
+    week_number: int,
+    day_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Get a single day from a nutrition plan week with its meals
+    """
+    day = await db.scalar(select(NutritionDay).join(
+        NutritionDay.week
+    ).join(
+        NutritionWeek.plan
+    ).options(
+        joinedload(NutritionDay.meals)
+    ).where(
+        NutritionDay.day_id == day_id,
+        NutritionWeek.week_number == week_number,
+        NutritionPlan.plan_id == plan_id,
+        NutritionPlan.user_id == current_user.user_id
+    ))
+    
+    if not day:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Nutrition day not found"
+        )
+    
+    return NutritionDayResponse.model_validate(day)
+
+
 @router.put("/{plan_id}", response_model=NutritionPlanResponse)
 async def update_nutrition_plan(
     plan_id: int,
     plan_update: NutritionPlanUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update a nutrition plan (name, current_week)
     """
-    plan = db.query(NutritionPlan).filter(
+    plan = await db.scalar(select(NutritionPlan).where(
         NutritionPlan.plan_id == plan_id,
         NutritionPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -340,8 +442,8 @@ async def update_nutrition_plan(
     for field, value in update_data.items():
         setattr(plan, field, value)
     
-    db.commit()
-    db.refresh(plan)
+    await db.commit()
+    await db.refresh(plan)
     
     return NutritionPlanResponse.model_validate(plan)
 
@@ -350,16 +452,16 @@ async def update_nutrition_plan(
 async def complete_nutrition_week(
     plan_id: int,
     completion: NutritionWeekCompletionRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Mark a week as completed and advance to the next week
     """
-    plan = db.query(NutritionPlan).filter(
+    plan = await db.scalar(select(NutritionPlan).where(
         NutritionPlan.plan_id == plan_id,
         NutritionPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -382,8 +484,8 @@ async def complete_nutrition_week(
     if completion.week_number == plan.current_week and plan.current_week < plan.total_weeks:
         plan.current_week += 1
     
-    db.commit()
-    db.refresh(plan)
+    await db.commit()
+    await db.refresh(plan)
     
     return NutritionWeekCompletionResponse(
         plan_id=plan.plan_id,
@@ -397,16 +499,16 @@ async def complete_nutrition_week(
 @router.delete("/{plan_id}", response_model=MessageResponse)
 async def delete_nutrition_plan(
     plan_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Delete a nutrition plan (cascades to all weeks, days, and meals)
     """
-    plan = db.query(NutritionPlan).filter(
+    plan = await db.scalar(select(NutritionPlan).where(
         NutritionPlan.plan_id == plan_id,
         NutritionPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -414,7 +516,8 @@ async def delete_nutrition_plan(
             detail="Nutrition plan not found"
         )
     
-    db.delete(plan)
-    db.commit()
+    await db.delete(plan)
+    await db.commit()
+    invalidate_week_options(current_user.user_id, 'nutrition_weeks')
     
     return MessageResponse(message="Nutrition plan deleted successfully")
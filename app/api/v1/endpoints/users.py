@@ -1,52 +1,68 @@
 """
 User management endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import delete, func, inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from app.database.session import get_db
+from app.core.config import settings
+from app.core.principal import Principal, invalidate_user, profile_cache, revoke_user_tokens
+from app.database.loaders import get_user_profile
 from app.models.user import User
 from app.models.auth_method import UserAuthMethod
+from app.models.user_equipment import UserGymEquipment, UserHomeEquipment
+from app.services.account_purge import account_purger
+from app.services.reference_data import reference_data
+from app.services.telegram_identity import forget_telegram_user
+from app.services.user_equipment import set_user_equipment, user_equipment_ids
 from app.schemas.user import UserResponse, UserUpdate, UserWithAuthMethods
 from app.schemas.auth import MessageResponse
-from app.dependencies import get_current_user
+from app.dependencies import get_current_principal, get_current_user
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=UserWithAuthMethods)
 async def get_current_user_profile(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get current user profile with auth methods and goals
-    """
-    from app.models.user_equipment import UserHomeEquipment, UserGymEquipment
     
-    # Reload user with auth methods, goals, and equipment
-    user = db.query(User).options(
-        joinedload(User.auth_methods),
-        joinedload(User.workout_goal),
-        joinedload(User.nutrition_goal),
-        joinedload(User.home_equipment_rel).joinedload(UserHomeEquipment.equipment),
-        joinedload(User.gym_equipment_rel).joinedload(UserGymEquipment.equipment)
-    ).filter(User.user_id == current_user.user_id).first()
+    Served from the serialized profile cache; dropped by invalidate_user.
+    """
+    body = profile_cache.get(current_user.user_id)
+    if body is None:
+        # Goals joined (many-to-one); auth methods and equipment by SELECT ... IN
+        user = await get_user_profile(db, current_user.user_id, selectinload(User.auth_methods))
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        body = UserWithAuthMethods.model_validate(user).model_dump_json().encode()
+        profile_cache.set(current_user.user_id, body, ttl=settings.PROFILE_CACHE_TTL_SECONDS)
     
-    return UserWithAuthMethods.model_validate(user)
+    return Response(content=body, media_type="application/json")
 
 
 @router.put("/me", response_model=UserResponse)
 async def update_current_user_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update current user profile
-    """
-    from app.models.user_equipment import UserHomeEquipment, UserGymEquipment
     
+    Equipment lists are diffed against the stored ones; the response is
+    built from the updated instance and cached goals instead of reloading
+    the profile.
+    """
     # Update only provided fields
     update_data = user_update.model_dump(exclude_unset=True)
     
@@ -59,61 +75,53 @@ async def update_current_user_profile(
     for field, value in update_data.items():
         setattr(current_user, field, value)
     
-    # Update home equipment if provided
+    home_equipment, gym_equipment = await user_equipment_ids(db, current_user.user_id)
     if home_equipment_ids is not None:
-        # Delete existing equipment
-        db.query(UserHomeEquipment).filter(
-            UserHomeEquipment.user_id == current_user.user_id
-        ).delete()
-        
-        # Insert new equipment
-        if home_equipment_ids:
-            for equipment_id in home_equipment_ids:
-                new_equipment = UserHomeEquipment(
-                    user_id=current_user.user_id,
-                    equipment_id=equipment_id
-                )
-                db.add(new_equipment)
-    
-    # Update gym equipment if provided
+        home_equipment = await set_user_equipment(
+            db, UserHomeEquipment, current_user.user_id, home_equipment, home_equipment_ids
+        )
     if gym_equipment_ids is not None:
-        # Delete existing equipment
-        db.query(UserGymEquipment).filter(
-            UserGymEquipment.user_id == current_user.user_id
-        ).delete()
-        
-        # Insert new equipment
-        if gym_equipment_ids:
-            for equipment_id in gym_equipment_ids:
-                new_equipment = UserGymEquipment(
-                    user_id=current_user.user_id,
-                    equipment_id=equipment_id
-                )
-                db.add(new_equipment)
+        gym_equipment = await set_user_equipment(
+            db, UserGymEquipment, current_user.user_id, gym_equipment, gym_equipment_ids
+        )
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    invalidate_user(current_user.user_id)
     
-    # Reload with equipment to include in response
-    user = db.query(User).options(
-        joinedload(User.home_equipment_rel).joinedload(UserHomeEquipment.equipment),
-        joinedload(User.gym_equipment_rel).joinedload(UserGymEquipment.equipment)
-    ).filter(User.user_id == current_user.user_id).first()
+    reference = await reference_data.get(db)
     
-    return UserResponse.model_validate(user)
+    return UserResponse.model_validate({
+        **{attr.key: getattr(current_user, attr.key) for attr in sa_inspect(User).column_attrs},
+        "id": current_user.user_id,
+        "workout_goal": reference.workout_goals.get(current_user.workout_goal_id),
+        "nutrition_goal": reference.nutrition_goals.get(current_user.nutrition_goal_id),
+        "home_equipment": home_equipment,
+        "gym_equipment": gym_equipment,
+    })
 
 
 @router.delete("/me", response_model=MessageResponse)
 async def delete_current_user_account(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Delete current user account
-    This will cascade delete all auth methods, plans, and logs
+    Sign-in is removed now; plans, feedback and logs are purged in the background
     """
-    db.delete(current_user)
-    db.commit()
+    telegram_id = current_user.telegram_id
+    
+    await db.execute(delete(UserAuthMethod).where(UserAuthMethod.user_id == current_user.user_id))
+    # Release the unique identifiers so they can sign up again right away
+    current_user.email = None
+    current_user.telegram_id = None
+    current_user.is_active = False
+    current_user.deleted_at = func.now()
+    await db.commit()
+    invalidate_user(current_user.user_id)
+    revoke_user_tokens(current_user.user_id)
+    forget_telegram_user(telegram_id)
+    account_purger.wake()
     
     return MessageResponse(message="Account deleted successfully")
 
@@ -121,8 +129,8 @@ async def delete_current_user_account(
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user_by_id(
     user_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get user by ID (only self or admin)
@@ -134,7 +142,7 @@ async def get_user_by_id(
             detail="Not authorized to access this user"
         )
     
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = await get_user_profile(db, user_id)
     
     if not user:
         raise HTTPException(
@@ -2,12 +2,18 @@
 Workout Plan endpoints (Phase 2)
 Uses AvalAI API to generate personalized workout plans in Farsi
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
 import random
 
 from app.database.session import get_db
+from app.database.replicas import get_read_db, read_session
+from app.core.pagination import paginate_keyset, estimate_count
+from app.core.projection import parse_fields, nested_load_options
+from app.core.idempotency import plan_idempotency
 from ai.workout_generator_farsi import generate_farsi_workout_plan
 from app.models.user import User
 from app.models.workout_plan import WorkoutPlan, WorkoutWeek, WorkoutDay, WorkoutDayExercise
@@ -20,13 +26,38 @@ from app.schemas.workout_plan import (
     WorkoutPlanListResponse,
     WeekCompletionRequest,
     WeekCompletionResponse,
-    WorkoutWeekResponse
+    WorkoutWeekResponse,
+    WorkoutDayResponse
 )
 from app.schemas.auth import MessageResponse
-from app.dependencies import get_current_user
+from app.dependencies import get_current_principal, get_current_user
+from app.core.principal import Principal
+from app.services.feedback_options import invalidate_week_options
+from app.services.reference_data import reference_data
 
 router = APIRouter()
 
+# Nested relationship levels selectable with ?fields= (outermost first)
+WORKOUT_PLAN_LEVELS = [
+    ("weeks", WorkoutPlan.weeks),
+    ("days", WorkoutWeek.days),
+    ("exercises", WorkoutDay.exercises),
+    ("exercise", WorkoutDayExercise.exercise),
+]
+WORKOUT_WEEK_LEVELS = WORKOUT_PLAN_LEVELS[1:]
+
+
+def resolve_load_options(fields: Optional[str], levels: list) -> list:
+    """Translate a fields parameter into loader options, 400 on unknown fields"""
+    try:
+        depth = parse_fields(fields, [name for name, _ in levels])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return nested_load_options(levels, depth)
+
 
 # ========== Mock AI Generation Functions ==========
 
@@ -40,11 +71,9 @@ def generate_mock_expectations(total_weeks: int) -> str:
     return "در پایان این برنامه، انتظار می‌رود که افزایش ۵-۸ کیلوگرم عضله خالص داشته باشید. همچنین قدرت شما در حرکات اصلی مانند اسکوات، بنچ پرس و ددلیفت به طور قابل توجهی افزایش خواهد یافت. در ۴ هفته اول تغییرات ظاهری محسوس نخواهد بود، اما از هفته ۵ به بعد تفاوت‌ها مشهود می‌شوند."
 
 
-def get_random_exercises(db: Session, count: int, user_location: str = None) -> List[int]:
+async def get_random_exercises(db: AsyncSession, count: int, user_location: str = None) -> List[int]:
     """Get random exercise IDs from database for mock generation"""
     # This is a simple mock - real AI will use semantic search and user preferences
-    from sqlalchemy import text
-    
     query = text("""
         SELECT e.exercise_id 
         FROM exercise e
@@ -54,12 +83,12 @@ def get_random_exercises(db: Session, count: int, user_location: str = None) ->
         LIMIT :count
     """)
     
-    result = db.execute(query, {"count": count})
+    result = await db.execute(query, {"count": count})
     return [row[0] for row in result.fetchall()]
 
 
-def generate_mock_workout_week(
-    db: Session, 
+async def generate_mock_workout_week(
+    db: AsyncSession, 
     plan: WorkoutPlan, 
     week_number: int,
     user: User
@@ -91,7 +120,7 @@ def generate_mock_workout_week(
         description=week_data["description"]
     )
     db.add(week)
-    db.flush()  # Get week_id
+    await db.flush()  # Get week_id
     
     # Generate workout days based on user's fitness_days
     training_days = user.fitness_days or 3
@@ -106,11 +135,11 @@ def generate_mock_workout_week(
             cooldown="5-10 minutes static stretching and foam rolling"
         )
         db.add(day)
-        db.flush()  # Get day_id
+        await db.flush()  # Get day_id
         
         # Add 4-6 exercises per day
         exercise_count = random.randint(4, 6)
-        exercise_ids = get_random_exercises(db, exercise_count, user.training_location)
+        exercise_ids = await get_random_exercises(db, exercise_count, user.training_location)
         
         for order, exercise_id in enumerate(exercise_ids, start=1):
             exercise = WorkoutDayExercise(
@@ -133,13 +162,34 @@ def generate_mock_workout_week(
 @router.post("", response_model=WorkoutPlanDetailResponse, status_code=status.HTTP_201_CREATED)
 async def create_workout_plan(
     plan_data: WorkoutPlanCreate,
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key return the first response"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new workout plan with AI-generated content using AvalAI API.
     Generates personalized workout plans in Farsi based on user profile.
+    With an Idempotency-Key header, duplicates of the request (retries, double
+    taps) return the first request's plan instead of generating another.
     """
+    if idempotency_key is None:
+        return await generate_workout_plan(plan_data, current_user, db)
+    return await plan_idempotency.response(
+        "workout_plans",
+        current_user.user_id,
+        idempotency_key,
+        plan_data,
+        lambda: generate_workout_plan(plan_data, current_user, db),
+        status_code=status.HTTP_201_CREATED
+    )
+
+
+async def generate_workout_plan(
+    plan_data: WorkoutPlanCreate,
+    current_user: User,
+    db: AsyncSession
+) -> WorkoutPlanDetailResponse:
+    """Validate the request, generate the plan and store it"""
     
     # Validate total_weeks (currently only supporting 1 week plans)
     if plan_data.total_weeks != 1:
@@ -151,9 +201,7 @@ async def create_workout_plan(
     # Get workout goal if provided
     workout_goal = None
     if plan_data.workout_goal_id:
-        workout_goal = db.query(WorkoutGoal).filter(
-            WorkoutGoal.workout_goal_id == plan_data.workout_goal_id
-        ).first()
+        workout_goal = (await reference_data.get(db)).workout_goals.get(plan_data.workout_goal_id)
         if not workout_goal:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -161,6 +209,7 @@ async def create_workout_plan(
             )
     
     # Get user's equipment IDs
+    await db.refresh(current_user, ["home_equipment_rel", "gym_equipment_rel"])
     equipment_ids = []
     if current_user.training_location == 'home':
         equipment_ids = current_user.home_equipment or [1]  # 1 = Bodyweight
@@ -187,7 +236,9 @@ async def create_workout_plan(
     
     # Generate AI workout plan
     try:
-        ai_plan = generate_farsi_workout_plan(db, user_profile)
+        # Exercise searches are read-only; let them run on a replica
+        async with read_session(db) as search_db:
+            ai_plan = await generate_farsi_workout_plan(search_db, user_profile)
     except Exception as e:
         print(f"Error generating AI plan: {e}")
         raise HTTPException(
@@ -207,7 +258,7 @@ async def create_workout_plan(
         expectations=ai_plan.get('expectations', '')
     )
     db.add(workout_plan)
-    db.flush()  # Get plan_id
+    await db.flush()  # Get plan_id
     
     # Create workout week
     week = WorkoutWeek(
@@ -217,7 +268,7 @@ async def create_workout_plan(
         description="برنامه تمرینی هفته اول"
     )
     db.add(week)
-    db.flush()
+    await db.flush()
     
     # Create workout days from AI plan
     for day_data in ai_plan.get('days', []):
@@ -229,7 +280,7 @@ async def create_workout_plan(
             cooldown=day_data.get('cooldown', '5-10 دقیقه کشش ایستا')
         )
         db.add(day)
-        db.flush()
+        await db.flush()
         
         # Add exercises for this day
         for exercise_data in day_data.get('exercises', []):
@@ -250,49 +301,67 @@ async def create_workout_plan(
             )
             db.add(exercise)
     
-    db.commit()
+    await db.commit()
+    invalidate_week_options(current_user.user_id, 'workout_weeks')
     
     # Reload with all relationships
-    plan = db.query(WorkoutPlan).options(
+    plan = await db.scalar(select(WorkoutPlan).options(
         joinedload(WorkoutPlan.weeks).joinedload(WorkoutWeek.days).joinedload(WorkoutDay.exercises).joinedload(WorkoutDayExercise.exercise)
-    ).filter(WorkoutPlan.plan_id == workout_plan.plan_id).first()
+    ).where(WorkoutPlan.plan_id == workout_plan.plan_id))
     
     return WorkoutPlanDetailResponse.model_validate(plan)
 
 
 @router.get("", response_model=WorkoutPlanListResponse)
 async def get_user_workout_plans(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100, description="Number of plans per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    include_total: bool = Query(False, description="Include an approximate total count"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get all workout plans for the current user
+    Get the current user's workout plans, newest first, one page at a time
     """
-    plans = db.query(WorkoutPlan).filter(
+    query = select(WorkoutPlan).where(
         WorkoutPlan.user_id == current_user.user_id
-    ).order_by(WorkoutPlan.created_at.desc()).all()
+    )
+    
+    try:
+        plans, next_cursor = await paginate_keyset(
+            db, query, WorkoutPlan.created_at, WorkoutPlan.plan_id, limit, cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     
     return WorkoutPlanListResponse(
         plans=[WorkoutPlanResponse.model_validate(p) for p in plans],
-        total=len(plans)
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None,
+        total=await estimate_count(db, query) if include_total else None
     )
 
 
 @router.get("/{plan_id}", response_model=WorkoutPlanDetailResponse)
 async def get_workout_plan(
     plan_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated levels to include: weeks, days, exercises, exercise (default: all)"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get a specific workout plan with all details
+    Get a specific workout plan with all details.
+    Use `fields` to load only some nested levels; omitted levels come back empty.
     """
-    plan = db.query(WorkoutPlan).options(
-        joinedload(WorkoutPlan.weeks).joinedload(WorkoutWeek.days).joinedload(WorkoutDay.exercises).joinedload(WorkoutDayExercise.exercise)
-    ).filter(
+    plan = await db.scalar(select(WorkoutPlan).options(
+        *resolve_load_options(fields, WORKOUT_PLAN_LEVELS)
+    ).where(
         WorkoutPlan.plan_id == plan_id,
         WorkoutPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -307,17 +376,21 @@ async def get_workout_plan(
 async def get_workout_week(
     plan_id: int,
     week_number: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated levels to include: days, exercises, exercise (default: all)"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get a specific week from a workout plan
+    Get a specific week from a workout plan.
+    Use `fields` to load only some nested levels; omitted levels come back empty.
     """
+    load_options = resolve_load_options(fields, WORKOUT_WEEK_LEVELS)
+    
     # Verify plan ownership
-    plan = db.query(WorkoutPlan).filter(
+    plan = await db.scalar(select(WorkoutPlan).where(
         WorkoutPlan.plan_id == plan_id,
         WorkoutPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -326,12 +399,10 @@ async def get_workout_week(
         )
     
     # Get the week
-    week = db.query(WorkoutWeek).options(
-        joinedload(WorkoutWeek.days).joinedload(WorkoutDay.exercises).joinedload(WorkoutDayExercise.exercise)
-    ).filter(
+    week = await db.scalar(select(WorkoutWeek).options(*load_options).where(
         WorkoutWeek.plan_id == plan_id,
         WorkoutWeek.week_number == week_number
-    ).first()
+    ))
     
     if not week:
         raise HTTPException(
@@ -342,20 +413,53 @@ async def get_workout_week(
     return WorkoutWeekResponse.model_validate(week)
 
 
+@router.get("/{plan_id}/week/{week_number}/day/{day_id}", response_model=WorkoutDayResponse)
+async def get_workout_day(
+    plan_id: int,
+    week_number: int,
+    day_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Get a single day from a workout plan week with its exercises
+    """
+    day = await db.scalar(select(WorkoutDay).join(
+        WorkoutDay.week
+    ).join(
+        WorkoutWeek.workout_plan
+    ).options(
+        joinedload(WorkoutDay.exercises).joinedload(WorkoutDayExercise.exercise)
+    ).where(
+        WorkoutDay.day_id == day_id,
+        WorkoutWeek.week_number == week_number,
+        WorkoutPlan.plan_id == plan_id,
+        WorkoutPlan.user_id == current_user.user_id
+    ))
+    
+    if not day:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workout day not found"
+        )
+    
+    return WorkoutDayResponse.model_validate(day)
+
+
 @router.put("/{plan_id}", response_model=WorkoutPlanResponse)
 async def update_workout_plan(
     plan_id: int,
     plan_update: WorkoutPlanUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update a workout plan (name, current_week)
     """
-    plan = db.query(WorkoutPlan).filter(
+    plan = await db.scalar(select(WorkoutPlan).where(
         WorkoutPlan.plan_id == plan_id,
         WorkoutPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -369,8 +473,8 @@ async def update_workout_plan(
     for field, value in update_data.items():
         setattr(plan, field, value)
     
-    db.commit()
-    db.refresh(plan)
+    await db.commit()
+    await db.refresh(plan)
     
     return WorkoutPlanResponse.model_validate(plan)
 
@@ -379,16 +483,16 @@ async def update_workout_plan(
 async def complete_workout_week(
     plan_id: int,
     completion: WeekCompletionRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Mark a week as completed and advance to the next week
     """
-    plan = db.query(WorkoutPlan).filter(
+    plan = await db.scalar(select(WorkoutPlan).where(
         WorkoutPlan.plan_id == plan_id,
         WorkoutPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -411,8 +515,8 @@ async def complete_workout_week(
     if completion.week_number == plan.current_week and plan.current_week < plan.total_weeks:
         plan.current_week += 1
     
-    db.commit()
-    db.refresh(plan)
+    await db.commit()
+    await db.refresh(plan)
     
     return WeekCompletionResponse(
         plan_id=plan.plan_id,
@@ -426,16 +530,16 @@ async def complete_workout_week(
 @router.delete("/{plan_id}", response_model=MessageResponse)
 async def delete_workout_plan(
     plan_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Delete a workout plan (cascades to all weeks, days, and exercises)
     """
-    plan = db.query(WorkoutPlan).filter(
+    plan = await db.scalar(select(WorkoutPlan).where(
         WorkoutPlan.plan_id == plan_id,
         WorkoutPlan.user_id == current_user.user_id
-    ).first()
+    ))
     
     if not plan:
         raise HTTPException(
@@ -443,7 +547,8 @@ async def delete_workout_plan(
             detail="Workout plan not found"
         )
     
-    db.delete(plan)
-    db.commit()
+    await db.delete(plan)
+    await db.commit()
+    invalidate_week_options(current_user.user_id, 'workout_weeks')
     
     return MessageResponse(message="Workout plan deleted successfully")
@@ -0,0 +1,119 @@
+"""
+In-process caches
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    """
+    Bounded LRU cache with a per-entry expiry (epoch seconds).
+    Expired entries are dropped when read; the size bound evicts the least
+    recently used entry.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None):
+        """Store a value until `expires_at`, or for `ttl` seconds, or until evicted"""
+        if expires_at is None and ttl is not None:
+            expires_at = time.time() + ttl
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class ExpiringMap:
+    """
+    Entries that live exactly until their expiry (epoch seconds) and are
+    never evicted before it; there is no size bound. For state that must
+    not be forgotten early, such as token revocations: its size is bounded
+    by how many entries can be live at once. Expired entries are dropped
+    as later ones are stored.
+    """
+
+    def __init__(self):
+        self._data: Dict[Hashable, Tuple[Any, float]] = {}
+        # (expires_at, key), soonest first; stale when the key was stored again
+        self._expiries: List[Tuple[float, Hashable]] = []
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.time():
+                return default
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, expires_at: float):
+        """Store a value until `expires_at`"""
+        with self._lock:
+            self._purge(time.time())
+            self._data[key] = (value, expires_at)
+            heapq.heappush(self._expiries, (expires_at, key))
+
+    def _purge(self, now: float):
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiries)
+            entry = self._data.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del self._data[key]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expiries.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data)}
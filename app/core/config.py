@@ -12,6 +12,19 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
     
+    # Connection pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800  # seconds; -1 keeps connections forever
+    DB_POOL_PRE_PING: bool = False  # ping on every checkout instead of relying on recycle
+    DB_PGBOUNCER_TRANSACTION_MODE: bool = False  # no server-side prepared statement reuse
+    
+    # Read replicas (comma-separated URLs; empty = all reads on the primary)
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_HEALTH_CHECK_INTERVAL_SECONDS: float = 10.0
+    
     # JWT
     JWT_SECRET_KEY: str
     JWT_REFRESH_SECRET_KEY: str
@@ -19,12 +32,29 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     
+    # Principal cache (verified tokens / user rows for authenticated requests)
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 30.0
+    PROFILE_CACHE_SIZE: int = 10000  # serialized /users/me bodies
+    PROFILE_CACHE_TTL_SECONDS: float = 30.0
+    
     # AvalAI (Workout Generator)
     AVALAI_API_KEY: Optional[str] = Field(None, alias="x-goog-api-key")
     
     # Telegram
     TELEGRAM_BOT_TOKEN: str
     TELEGRAM_BOT_USERNAME: str
+    TELEGRAM_SENDER_WORKERS: int = 4
+    TELEGRAM_QUEUE_SIZE: int = 10000
+    TELEGRAM_RATE_PER_SECOND: float = 25.0  # Bot API allows ~30 messages/s per bot
+    TELEGRAM_CHAT_RATE_PER_SECOND: float = 1.0  # and ~1 message/s per chat
+    TELEGRAM_MAX_ATTEMPTS: int = 5
+    TELEGRAM_WEBHOOK_SECRET: Optional[str] = None  # secret_token passed to setWebhook
+    TELEGRAM_UPDATE_WORKERS: int = 4
+    TELEGRAM_UPDATE_QUEUE_SIZE: int = 1000  # per worker
+    TELEGRAM_UPDATE_DEDUP_SIZE: int = 10000
+    TELEGRAM_USER_MAP_SIZE: int = 100000  # telegram_id -> user_id, for repeat logins
     
     # Twilio (SMS)
     TWILIO_ACCOUNT_SID: Optional[str] = None
@@ -36,10 +66,20 @@ class Settings(BaseSettings):
     EMAIL_FROM_ADDRESS: str = "noreply@movoai.com"
     EMAIL_FROM_NAME: str = "MovoAI"
     
+    # Outbound SMS/email queue
+    NOTIFICATION_QUEUE_SIZE: int = 10000  # per channel
+    NOTIFICATION_MAX_ATTEMPTS: int = 5
+    SMS_CONCURRENCY: int = 10  # requests in flight to the SMS provider
+    EMAIL_CONCURRENCY: int = 10
+    NOTIFICATION_MOCK: bool = False  # record instead of sending, even with credentials (load tests)
+    NOTIFICATION_MOCK_LATENCY_MS: int = 0
+    
     # Google OAuth
     GOOGLE_CLIENT_ID: Optional[str] = None
     GOOGLE_CLIENT_SECRET: Optional[str] = None
     GOOGLE_REDIRECT_URI: Optional[str] = None
+    GOOGLE_CERTS_URL: str = "https://www.googleapis.com/oauth2/v1/certs"
+    GOOGLE_CERTS_REFRESH_MARGIN_SECONDS: float = 300.0  # refetch this long before the cached set expires
     
     # Application
     APP_NAME: str = "MovoAI API"
@@ -48,12 +88,37 @@ class Settings(BaseSettings):
     FRONTEND_URL: str = "http://localhost:5173"
     
     # Security
-    RATE_LIMIT_PER_MINUTE: int = 5
+    RATE_LIMIT_PER_MINUTE: int = 5  # per client IP on code send; verify allows twice this
+    RATE_LIMIT_STORAGE_URI: str = "memory://"  # shared backend, e.g. redis://localhost:6379/0
+    RATE_LIMIT_STRATEGY: str = "moving-window"  # or sliding-window-counter, fixed-window
     CODE_EXPIRY_MINUTES_SMS: int = 5
     CODE_EXPIRY_MINUTES_EMAIL: int = 10
     MAX_CODE_ATTEMPTS: int = 3
     MAX_CODES_PER_HOUR: int = 3
     
+    # Verification code lifecycle
+    VERIFICATION_CODE_SWEEPER_ENABLED: bool = True
+    VERIFICATION_CODE_RETENTION_HOURS: int = 24  # kept this long after expiry
+    VERIFICATION_CODE_SWEEP_INTERVAL_SECONDS: float = 300.0
+    VERIFICATION_CODE_SWEEP_BATCH_SIZE: int = 5000
+    VERIFICATION_CODE_ARCHIVE: bool = False  # move swept rows to verification_codes_archive
+    VERIFICATION_CODE_PARTITION_DAYS_AHEAD: int = 3  # when the table is partitioned
+    
+    # Deleted accounts (purged in the background)
+    ACCOUNT_PURGE_INTERVAL_SECONDS: float = 300.0  # deletions also wake the purger
+    ACCOUNT_PURGE_BATCH_SIZE: int = 50  # plans or feedback rows per transaction
+    
+    # Idempotency-Key on plan creation (responses kept in process)
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0  # duplicates replay the first response this long
+    
+    # Feedback question catalog (held in memory, reloaded when the table changes)
+    FEEDBACK_CATALOG_CHECK_SECONDS: float = 60.0
+    REFERENCE_DATA_CHECK_SECONDS: float = 300.0  # goals and exercise lookups held in memory
+    FEEDBACK_OPTIONS_CACHE_SIZE: int = 10000  # (user, week) dynamic option lists
+    FEEDBACK_OPTIONS_CACHE_TTL_SECONDS: float = 300.0  # bounds staleness across workers
+    FEEDBACK_ANALYTICS_BATCH_SIZE: int = 5000  # feedback rows per rebuild batch
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,34 @@
+"""
+Pre-serialized JSON responses with ETags
+
+Read-mostly data (feedback questions, goals and lookups) is serialized once
+per load. Clients that send the ETag back in If-None-Match get a 304.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Response, status
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """A pre-serialized JSON response body"""
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, model) -> "CatalogEntry":
+        return cls.of_body(model.model_dump_json().encode())
+
+    @classmethod
+    def of_body(cls, body: bytes) -> "CatalogEntry":
+        return cls(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+def catalog_response(entry: CatalogEntry, if_none_match: Optional[str]) -> Response:
+    """Serve a pre-serialized catalog body, or 304 if the client has it"""
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and entry.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,152 @@
+"""
+Idempotency keys
+
+Clients send an `Idempotency-Key` header with POST /workout-plans and
+POST /nutrition-plans so that retries and double taps create one plan (and
+pay for one generation). Keys are scoped per user and endpoint:
+
+- the first request with a key runs the handler;
+- duplicates arriving while it runs wait for it and get the same response;
+- duplicates arriving later replay the stored response until
+  IDEMPOTENCY_TTL_SECONDS have passed.
+
+Only successful responses are stored: if the handler raises, waiting
+duplicates get the same error and the next retry runs the handler again.
+If the first request is cancelled (client gone), a waiting duplicate takes
+over. Reusing a key with a different request body is a 422.
+
+The store is in process, like the other caches, so duplicates are only
+coalesced when they reach the same worker.
+"""
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+
+MAX_KEY_LENGTH = 255
+
+
+@dataclass
+class IdempotentEntry:
+    fingerprint: str
+    future: asyncio.Future
+
+
+def request_fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def check_key(key: str):
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"
+        )
+
+
+class IdempotencyStore:
+    """Responses by (user, scope, key): in progress as futures, completed in an LRU with a TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.ttl = ttl
+        self.completed = LRUCache(maxsize)  # key -> (fingerprint, body)
+        self.in_flight: Dict[Hashable, IdempotentEntry] = {}
+        self.counters = {"executions": 0, "replays": 0, "waits": 0, "conflicts": 0}
+
+    def _conflict(self):
+        self.counters["conflicts"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request"
+        )
+
+    async def run(
+        self,
+        key: Hashable,
+        fingerprint: str,
+        produce: Callable[[], Awaitable[bytes]]
+    ) -> Tuple[bytes, bool]:
+        """The response body for `key` and whether it was replayed; runs `produce` at most once at a time"""
+        while True:
+            stored: Optional[tuple] = self.completed.get(key)
+            if stored is not None:
+                if stored[0] != fingerprint:
+                    self._conflict()
+                self.counters["replays"] += 1
+                return stored[1], True
+
+            pending = self.in_flight.get(key)
+            if pending is None:
+                break
+            if pending.fingerprint != fingerprint:
+                self._conflict()
+            self.counters["waits"] += 1
+            try:
+                # Shielded: a waiter going away must not cancel the first request
+                return await asyncio.shield(pending.future), True
+            except asyncio.CancelledError:
+                if not pending.future.cancelled():
+                    raise  # this waiter itself was cancelled
+                # The first request was cancelled; try again, possibly running it here
+
+        entry = IdempotentEntry(fingerprint, asyncio.get_running_loop().create_future())
+        self.in_flight[key] = entry
+        self.counters["executions"] += 1
+        try:
+            body = await produce()
+        except asyncio.CancelledError:
+            entry.future.cancel()
+            raise
+        except Exception as e:
+            entry.future.set_exception(e)
+            entry.future.exception()  # retrieved, even when nobody was waiting
+            raise
+        finally:
+            del self.in_flight[key]
+
+        self.completed.set(key, (fingerprint, body), ttl=self.ttl)
+        entry.future.set_result(body)
+        return body, False
+
+    async def response(
+        self,
+        scope: str,
+        user_id: int,
+        key: str,
+        request: BaseModel,
+        produce: Callable[[], Awaitable[BaseModel]],
+        status_code: int = status.HTTP_200_OK
+    ) -> Response:
+        """JSON response of `produce()` for this user's key, replayed for duplicates"""
+        check_key(key)
+
+        async def produce_body() -> bytes:
+            return (await produce()).model_dump_json().encode()
+
+        body, replayed = await self.run(
+            (scope, user_id, key),
+            request_fingerprint(request.model_dump_json().encode()),
+            produce_body
+        )
+        return Response(
+            content=body,
+            status_code=status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"} if replayed else None
+        )
+
+    def clear(self):
+        self.completed.clear()
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self.in_flight), "stored": len(self.completed)}
+
+
+plan_idempotency = IdempotencyStore(settings.IDEMPOTENCY_CACHE_SIZE, settings.IDEMPOTENCY_TTL_SECONDS)
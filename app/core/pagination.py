@@ -0,0 +1,89 @@
+"""
+Keyset (cursor) pagination helpers
+
+List endpoints page on a ``(timestamp, id)`` pair instead of OFFSET so that
+every page costs one index range scan regardless of how deep the client is.
+Cursors are opaque to clients: base64url-encoded JSON of the last row's key.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Encode the sort key of the last row on a page into an opaque cursor"""
+    raw = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor
+    Raises ValueError if the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+async def paginate_keyset(
+    db: AsyncSession,
+    statement: Select,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Apply newest-first keyset pagination to a select() statement.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        statement = statement.where(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    
+    # Fetch one extra row to know whether another page exists
+    result = await db.scalars(
+        statement.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)
+    )
+    rows = list(result.all())
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, sort_column.key),
+            getattr(last, id_column.key)
+        )
+    
+    return rows, next_cursor
+
+
+async def estimate_count(db: AsyncSession, statement: Select) -> int:
+    """
+    Approximate row count for a filtered select() statement.
+    On PostgreSQL this reads the planner's row estimate (no table scan);
+    other dialects fall back to an exact COUNT.
+    """
+    statement = statement.order_by(None)
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return await db.scalar(select(func.count()).select_from(statement.subquery()))
+    
+    compiled = statement.compile(
+        dialect=bind.dialect,
+        compile_kwargs={"literal_binds": True}
+    )
+    conn = await db.connection()
+    plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
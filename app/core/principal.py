@@ -0,0 +1,136 @@
+"""
+Authenticated principals
+
+`Principal` is the claims-only identity used by endpoints that need nothing
+but the caller's user_id (get_current_principal); no users row is loaded.
+
+Revocation is checked for every token, from in-memory sets: a single token
+by its `jti` (logout), or every token a user was issued before a cutoff
+(account deletion). Entries live exactly as long as the tokens they revoke:
+they are never evicted to make room, so a revoked token can't become valid
+again before its `exp`.
+
+Two caches sit in front of get_current_user / get_optional_user:
+
+- verified access token -> claims, kept until the token's `exp`, so repeat
+  requests with the same token skip the JWT signature check;
+- user_id -> users row, kept for USER_CACHE_TTL_SECONDS, so they also skip
+  the users lookup.
+
+Cached rows are plain column values. Each request gets its own instance
+attached to its session (no SELECT), so endpoints can modify and commit
+`current_user` as before.
+
+A third cache holds the serialized GET /users/me body (profile, goals,
+equipment ids, auth methods) per user for PROFILE_CACHE_TTL_SECONDS.
+
+Anything that changes a user's row, equipment or auth methods calls
+`invalidate_user`, which drops both; other workers see the change once the
+TTLs expire.
+"""
+import copy
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.cache import ExpiringMap, LRUCache
+from app.core.config import settings
+from app.core.security import decode_access_token
+from app.models.user import User
+
+
+token_cache = LRUCache(settings.PRINCIPAL_CACHE_SIZE)
+user_cache = LRUCache(settings.USER_CACHE_SIZE)
+profile_cache = LRUCache(settings.PROFILE_CACHE_SIZE)
+revoked_tokens = ExpiringMap()
+revoked_users = ExpiringMap()
+
+_USER_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated caller, built from access-token claims alone"""
+    user_id: int
+    token_id: Optional[str]
+    expires_at: int
+    
+    @property
+    def id(self):
+        return self.user_id
+
+
+def revoke_token(token_id: Optional[str], expires_at: int):
+    """Reject the access token with this jti from now until it expires"""
+    if token_id:
+        revoked_tokens.set(token_id, True, expires_at=expires_at)
+
+
+def revoke_user_tokens(user_id: int):
+    """Reject every access token issued to this user so far"""
+    now = time.time()
+    revoked_users.set(user_id, now, expires_at=now + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def is_revoked(payload: Dict[str, Any]) -> bool:
+    if payload.get("jti") and revoked_tokens.get(payload["jti"]):
+        return True
+    cutoff = revoked_users.get(payload.get("user_id"))
+    # iat has one-second resolution; a token from the same second is rejected too
+    return cutoff is not None and payload.get("iat", 0) <= int(cutoff)
+
+
+def verify_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """decode_access_token, cached per token until it expires; None if revoked"""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = decode_access_token(token)
+        if payload is None:
+            return None
+        if payload.get("exp"):
+            token_cache.set(token, payload, expires_at=payload["exp"])
+
+    if is_revoked(payload):
+        return None
+    return payload
+
+
+def principal_from_token(token: str) -> Optional[Principal]:
+    """Principal for a valid, unrevoked access token"""
+    payload = verify_access_token(token)
+    if payload is None or payload.get("user_id") is None:
+        return None
+    return Principal(
+        user_id=payload["user_id"],
+        token_id=payload.get("jti"),
+        expires_at=payload["exp"]
+    )
+
+
+async def load_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """Get the user row for a principal, attached to `db`"""
+    values = user_cache.get(user_id)
+    if values is None:
+        user = await db.scalar(select(User).where(User.user_id == user_id, User.deleted_at.is_(None)))
+        if user is not None:
+            user_cache.set(
+                user_id,
+                {key: getattr(user, key) for key in _USER_COLUMNS},
+                ttl=settings.USER_CACHE_TTL_SECONDS
+            )
+        return user
+
+    # Rebuild as a detached instance and attach it without a round trip
+    user = User(**copy.deepcopy(values))
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+def invalidate_user(user_id: int):
+    """Drop a cached user row and profile after it (or its auth methods) changed"""
+    user_cache.pop(user_id)
+    profile_cache.pop(user_id)
@@ -0,0 +1,47 @@
+"""
+Sparse-field projection for nested plan responses
+
+Plan responses nest relationships level by level (weeks -> days -> exercises
+-> exercise details). A ``fields=`` query parameter names the levels the
+client wants; only those relationships are joined, deeper ones are not loaded
+and come back empty.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import joinedload, noload
+
+
+def parse_fields(fields: Optional[str], levels: Sequence[str]) -> int:
+    """
+    Turn a comma-separated fields parameter into a load depth.
+    Requesting a level implies its parent levels. None means everything.
+    Raises ValueError for unknown field names.
+    """
+    if fields is None:
+        return len(levels)
+
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(levels)
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(levels)}"
+        )
+
+    return max((levels.index(f) + 1 for f in requested), default=0)
+
+
+def nested_load_options(relationships: Sequence[Tuple[str, object]], depth: int) -> List:
+    """
+    Build loader options for a chain of relationships.
+    The first `depth` relationships are joined; the next one is explicitly
+    not loaded so serialization doesn't trigger lazy loads for it.
+    """
+    loader = None
+    for name, relationship in relationships[:depth]:
+        loader = loader.joinedload(relationship) if loader is not None else joinedload(relationship)
+
+    if depth < len(relationships):
+        _, skipped = relationships[depth]
+        loader = loader.noload(skipped) if loader is not None else noload(skipped)
+
+    return [loader] if loader is not None else []
@@ -0,0 +1,109 @@
+"""
+Rate limiting
+
+Policies are declared once (limit string + scope) and enforced against a
+pluggable storage backend through the `limits` library:
+
+- RATE_LIMIT_STORAGE_URI="memory://" keeps counters in process (default,
+  single worker / local development);
+- a shared URI such as "redis://host:6379/0" makes limits hold across
+  workers and instances.
+
+RATE_LIMIT_STRATEGY picks the algorithm: "moving-window" (exact sliding
+log, default), "sliding-window-counter" (approximate, O(1) memory per key)
+or "fixed-window".
+
+Endpoints use `limit_by_ip(policy)` as a route dependency and
+`rate_limiter.hit(policy, identifier)` for per-identifier limits (phone,
+email, telegram id). A refused hit is not counted.
+"""
+import time
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, status
+from limits import RateLimitItem, parse
+from limits.aio.strategies import (
+    FixedWindowRateLimiter,
+    MovingWindowRateLimiter,
+    SlidingWindowCounterRateLimiter,
+)
+from limits.storage import storage_from_string
+
+from app.core.config import settings
+
+
+STRATEGIES = {
+    "moving-window": MovingWindowRateLimiter,
+    "sliding-window-counter": SlidingWindowCounterRateLimiter,
+    "fixed-window": FixedWindowRateLimiter,
+}
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """A named limit, e.g. RateLimitPolicy("send_code_ip", "5/minute")"""
+    name: str
+    limit: str
+    detail: str = "Too many requests, please try again later"
+
+    @property
+    def item(self) -> RateLimitItem:
+        return parse(self.limit)
+
+
+def _async_storage_uri(uri: str) -> str:
+    # The async strategies need the async flavour of each storage
+    return uri if uri.startswith("async+") else f"async+{uri}"
+
+
+class RateLimiter:
+    """Checks policies against one storage backend"""
+
+    def __init__(self, storage_uri: str, strategy: str):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown rate limit strategy: {strategy}. Allowed: {', '.join(STRATEGIES)}")
+        self.storage = storage_from_string(_async_storage_uri(storage_uri))
+        self.strategy = STRATEGIES[strategy](self.storage)
+
+    async def hit(self, policy: RateLimitPolicy, *identifiers: str):
+        """Count one hit for these identifiers, or raise 429 if over the limit"""
+        item = policy.item
+        if await self.strategy.hit(item, policy.name, *identifiers):
+            return
+
+        stats = await self.strategy.get_window_stats(item, policy.name, *identifiers)
+        retry_after = max(int(stats.reset_time - time.time()), 1)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=policy.detail,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    async def reset(self):
+        await self.storage.reset()
+
+
+def client_ip(request: Request) -> str:
+    """Caller address (run uvicorn with --proxy-headers behind a proxy)"""
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_ip(policy: RateLimitPolicy):
+    """Route dependency enforcing `policy` per client IP"""
+    async def dependency(request: Request):
+        await rate_limiter.hit(policy, client_ip(request))
+    return dependency
+
+
+rate_limiter = RateLimiter(settings.RATE_LIMIT_STORAGE_URI, settings.RATE_LIMIT_STRATEGY)
+
+
+# =============== Policies ===============
+SEND_CODE_PER_IP = RateLimitPolicy("send_code_ip", f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
+VERIFY_CODE_PER_IP = RateLimitPolicy("verify_code_ip", f"{settings.RATE_LIMIT_PER_MINUTE * 2}/minute")
+SEND_CODE_PER_IDENTIFIER = RateLimitPolicy(
+    "send_code",
+    f"{settings.MAX_CODES_PER_HOUR}/hour",
+    detail=f"Maximum {settings.MAX_CODES_PER_HOUR} codes per hour exceeded"
+)
+TELEGRAM_TOKEN_PER_USER = RateLimitPolicy("telegram_token", f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
@@ -0,0 +1,100 @@
+"""
+Referral code allocation
+
+Codes are derived from user_id instead of drawn at random and probed for
+uniqueness. An affine map `(user_id * MULTIPLIER + offset) mod 36^8` is a
+bijection on the 8-character base-36 space (MULTIPLIER is coprime to 36),
+so distinct users get distinct codes and no lookup is needed.
+
+users.referral_code is NOT NULL, so the code has to be in the INSERT: on
+PostgreSQL the user_id is drawn from the users sequence first.
+
+Codes issued before this scheme were random, so a derived code can in rare
+cases hit one of them. The unique constraint on users.referral_code catches
+that; the allocator then retries with the next offset.
+"""
+import string
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user import User
+
+
+ALPHABET = string.digits + string.ascii_uppercase
+CODE_LENGTH = 8
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+
+# Large odd multiplier not divisible by 3 (coprime to 36^8) spreads
+# consecutive user_ids across the code space
+MULTIPLIER = 1_679_616_011
+OFFSET = 911_862_841_283
+MAX_ATTEMPTS = 5
+
+
+def encode_referral_code(user_id: int, attempt: int = 0) -> str:
+    """Map a user_id (and retry attempt) to an 8-character code"""
+    n = (user_id * MULTIPLIER + OFFSET * (attempt + 1)) % CODE_SPACE
+    chars = []
+    for _ in range(CODE_LENGTH):
+        n, digit = divmod(n, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def referral_code_sql(user_id_sql: str) -> str:
+    """
+    PostgreSQL expression equal to encode_referral_code(user_id) (attempt 0),
+    for INSERTs that allocate user_id themselves.
+    """
+    n = f"((({user_id_sql})::bigint * {MULTIPLIER} + {OFFSET}) % {CODE_SPACE})"
+    return (
+        f"(SELECT string_agg(substr('{ALPHABET}', ({n} / power({len(ALPHABET)}, k)::bigint % {len(ALPHABET)})::int + 1, 1), '' ORDER BY k DESC) "
+        f"FROM generate_series(0, {CODE_LENGTH - 1}) AS k)"
+    )
+
+
+async def reserve_user_id(db: AsyncSession) -> Optional[int]:
+    """Next users.user_id from its sequence; None where there is none (SQLite)"""
+    conn = await db.connection()
+    if conn.dialect.name != "postgresql":
+        return None
+    return await db.scalar(text("SELECT nextval(pg_get_serial_sequence('users', 'user_id'))"))
+
+
+async def assign_referral_code(db: AsyncSession, user: User) -> str:
+    """
+    Set the referral code of a new user and insert it (flush).
+    Relies on the unique constraint; a conflict with a legacy code retries.
+    """
+    if user.user_id is None:
+        with db.no_autoflush:
+            user.user_id = await reserve_user_id(db)
+    if user.user_id is None:
+        # No sequence to draw from: insert first (referral_code is nullable in the model)
+        db.add(user)
+        await db.flush()
+    elif user in db.new:
+        # Keep begin_nested() from flushing it without a code
+        db.expunge(user)
+
+    user_id = user.user_id
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            # Set inside the savepoint: begin_nested() flushes pending changes first
+            async with db.begin_nested():
+                # A rolled-back savepoint expunges a row it inserted; add it back
+                db.add(user)
+                user.referral_code = encode_referral_code(user_id, attempt)
+                await db.flush()
+        except IntegrityError:
+            continue
+
+        if attempt:
+            # Savepoint rollback expired the instance
+            await db.refresh(user)
+        return user.referral_code
+
+    raise RuntimeError(f"Could not allocate a referral code for user {user_id}")
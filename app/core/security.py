@@ -35,7 +35,13 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire, "type": "access"})
+    # iat / jti let individual tokens, or all of a user's older tokens, be revoked
+    to_encode.update({
+        "exp": expire,
+        "iat": datetime.utcnow(),
+        "jti": secrets.token_hex(16),
+        "type": "access"
+    })
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
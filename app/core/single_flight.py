@@ -0,0 +1,58 @@
+"""
+Single-flight calls
+
+Identical expensive calls made at the same time (e.g. the same AvalAI
+prompt from users with the same profile) share one execution: the first
+caller starts it as a task, callers with the same key arriving before it
+finishes await that task, and the key is forgotten as soon as it is done,
+so later calls run again.
+
+Each caller waits with its own timeout. A caller timing out or being
+cancelled does not cancel the shared call, which still finishes for the
+others. Results are handed to every caller as is: share immutable values
+(the raw response text) and let each caller build its own objects from them.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one"""
+
+    def __init__(self):
+        self.in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.counters = {"calls": 0, "shared": 0, "timeouts": 0}
+
+    async def run(
+        self,
+        key: Hashable,
+        call: Callable[[], Awaitable[T]],
+        timeout: Optional[float] = None
+    ) -> T:
+        """Result of `call()`, or of the identical call already in flight"""
+        task = self.in_flight.get(key)
+        if task is None:
+            self.counters["calls"] += 1
+            task = asyncio.create_task(call())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.counters["shared"] += 1
+
+        try:
+            # Shielded: this caller giving up must not cancel the call for the others
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even when every caller has gone
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self.in_flight)}
@@ -0,0 +1,34 @@
+"""
+Eager-loading helpers for async sessions
+
+AsyncSession cannot lazy-load relationships on attribute access, so anything
+a response schema serializes has to be loaded up front.
+"""
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models.user import User
+
+
+def user_profile_options() -> list:
+    """Loader options for every relationship UserResponse reads"""
+    return [
+        joinedload(User.workout_goal),
+        joinedload(User.nutrition_goal),
+        selectinload(User.home_equipment_rel),
+        selectinload(User.gym_equipment_rel),
+    ]
+
+
+async def get_user_profile(db: AsyncSession, user_id: int, *extra_options) -> Optional[User]:
+    """Load a user with everything needed to build a UserResponse"""
+    result = await db.execute(
+        select(User)
+        .options(*user_profile_options(), *extra_options)
+        .where(User.user_id == user_id, User.deleted_at.is_(None))
+        .execution_options(populate_existing=True)
+    )
+    return result.unique().scalar_one_or_none()
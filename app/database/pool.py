@@ -0,0 +1,158 @@
+"""
+Connection pool configuration and instrumentation
+
+Pool sizing, liveness strategy and PgBouncer compatibility come from
+settings (DB_POOL_*). Every engine built with `engine_options` uses an
+instrumented pool that records checkout wait time, overflow usage and
+connection churn; `pool_metrics()` returns a snapshot for /metrics.
+
+Liveness: with DB_POOL_PRE_PING every checkout costs a round trip. The
+alternative is DB_POOL_RECYCLE, which retires connections older than the
+given number of seconds (set it below the server / PgBouncer idle timeout).
+A connection that still turns out to be dead invalidates the pool on the
+first error, so only that request fails.
+
+PgBouncer in transaction mode hands each transaction a possibly different
+server connection, so server-side prepared statements can't be reused across
+transactions. DB_PGBOUNCER_TRANSACTION_MODE turns off asyncpg's statement
+caches and gives every prepared statement a unique name.
+"""
+import time
+import uuid
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+
+
+class PoolStats:
+    """Counters for one engine's pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.checkout_timeouts = 0
+        self.overflow_peak = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+
+    def record_checkout(self, wait: float, overflow_in_use: int):
+        self.checkouts += 1
+        self.checkout_wait_total += wait
+        self.checkout_wait_max = max(self.checkout_wait_max, wait)
+        self.overflow_peak = max(self.overflow_peak, overflow_in_use)
+
+    def snapshot(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "checkout_wait_avg_ms": round(self.checkout_wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "checkout_wait_max_ms": round(self.checkout_wait_max * 1000, 3),
+            "checkout_timeouts": self.checkout_timeouts,
+            "overflow_peak": self.overflow_peak,
+            "connects": self.connects,
+            "closes": self.closes,
+            "invalidations": self.invalidations,
+        }
+
+
+class _InstrumentedPoolMixin:
+    """Times checkouts; stats survive pool recreation (engine.dispose())"""
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        # Kept for metrics (recreate() passes it back in by keyword)
+        self.max_overflow = max_overflow
+        self.stats = PoolStats()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.stats.checkout_timeouts += 1
+            raise
+        finally:
+            self.stats.record_checkout(time.perf_counter() - start, max(self.overflow(), 0))
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncPool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# name -> engine, for pool_metrics()
+_engines: Dict[str, Engine] = {}
+
+
+def engine_options(url: str, is_async: bool) -> dict:
+    """create_engine / create_async_engine keyword arguments from settings"""
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite engines (tests, local tools) keep SQLAlchemy's default pool
+        return {}
+
+    options = {
+        "poolclass": InstrumentedAsyncPool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+    if settings.DB_PGBOUNCER_TRANSACTION_MODE and is_async:
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
+    return options
+
+
+def instrument_engine(name: str, engine: Engine):
+    """Register an engine for metrics and count connection churn"""
+    if not isinstance(engine.pool, _InstrumentedPoolMixin):
+        return
+
+    _engines[name] = engine
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        engine.pool.stats.connects += 1
+
+    @event.listens_for(engine, "close")
+    def _on_close(dbapi_connection, connection_record):
+        engine.pool.stats.closes += 1
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        engine.pool.stats.invalidations += 1
+
+
+def pool_metrics() -> dict:
+    """Current pool state and counters for every instrumented engine"""
+    metrics = {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        metrics[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow_in_use": max(pool.overflow(), 0),
+            "max_overflow": pool.max_overflow,
+            **pool.stats.snapshot(),
+        }
+    return metrics
@@ -0,0 +1,230 @@
+"""
+Read-replica routing
+
+Read-only endpoints take their session from `get_read_db`, which hands out a
+session on a healthy replica and falls back to the primary session otherwise.
+
+A replica is used only while its last health check succeeded, reported
+replication lag under REPLICA_MAX_LAG_SECONDS, and is recent enough. Health
+checks run in the background (see `run_health_checks`, started from the app
+lifespan).
+
+Read-your-writes: when a request commits on the primary, the caller (keyed by
+its Authorization header) is pinned to the primary for REPLICA_MAX_LAG_SECONDS,
+so a GET right after creating a plan never sees a replica that hasn't caught up
+yet. Pins are per process, which is enough for the common case of a client
+talking to one worker over a kept-alive connection; the lag bound covers the
+rest.
+"""
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import Depends, Request
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.pool import engine_options, instrument_engine
+from app.database.session import PIN_KEY, get_db, to_async_url
+
+
+# Seconds of replay lag; 0 when everything received has been replayed (an idle
+# primary would otherwise look like growing lag)
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
+MAX_PINS = 10000
+
+
+class Replica:
+    """One read replica: its engine plus the result of the last health check"""
+
+    def __init__(self, url: str, metrics_name: str):
+        self.engine = create_async_engine(to_async_url(url), **engine_options(url, is_async=True))
+        self.sessionmaker = async_sessionmaker(
+            bind=self.engine,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+        self.name = self.engine.url.render_as_string(hide_password=True)
+        instrument_engine(metrics_name, self.engine.sync_engine)
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    async def measure_lag(self) -> float:
+        """Return replication lag in seconds (0 for non-PostgreSQL databases)"""
+        async with self.engine.connect() as conn:
+            if conn.dialect.name != "postgresql":
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+            return float(await conn.scalar(LAG_QUERY))
+
+    def mark_unhealthy(self, error: str):
+        self.healthy = False
+        self.last_error = error
+
+    def status(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "last_error": self.last_error,
+        }
+
+
+class ReplicaRouter:
+    """Round-robin over healthy replicas with primary fallback"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        max_lag_seconds: float,
+        check_interval_seconds: float
+    ):
+        self.replicas = [Replica(url, f"replica_{i}") for i, url in enumerate(urls)]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        self._pins: Dict[str, float] = {}
+
+    async def check(self, replica: Replica):
+        """Probe one replica and update its health"""
+        was_healthy = replica.healthy
+        try:
+            lag = await asyncio.wait_for(replica.measure_lag(), HEALTH_CHECK_TIMEOUT_SECONDS)
+        except Exception as e:
+            replica.mark_unhealthy(f"{type(e).__name__}: {e}")
+        else:
+            replica.lag_seconds = lag
+            replica.checked_at = time.monotonic()
+            if lag > self.max_lag_seconds:
+                replica.mark_unhealthy(f"Replication lag {lag:.1f}s exceeds {self.max_lag_seconds}s")
+            else:
+                replica.healthy = True
+                replica.last_error = None
+
+        if replica.healthy != was_healthy:
+            state = "healthy" if replica.healthy else f"unhealthy ({replica.last_error})"
+            print(f"Replica {replica.name} is {state}")
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def run_health_checks(self):
+        """Check replicas forever; cancelled on shutdown"""
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.check_interval_seconds)
+
+    def _is_usable(self, replica: Replica, now: float) -> bool:
+        # A health result older than a few intervals means the checker stalled
+        stale_after = self.check_interval_seconds * 3
+        return (
+            replica.healthy
+            and replica.checked_at is not None
+            and now - replica.checked_at <= stale_after
+        )
+
+    def pick(self, pin_key: Optional[str] = None) -> Optional[Replica]:
+        """Return a usable replica, or None to read from the primary"""
+        if self._cycle is None or self.is_pinned(pin_key):
+            return None
+
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if self._is_usable(replica, now):
+                return replica
+        return None
+
+    def pin_primary(self, pin_key: Optional[str]):
+        """Route this caller's reads to the primary until replicas catch up"""
+        if not pin_key or not self.replicas:
+            return
+        now = time.monotonic()
+        if len(self._pins) >= MAX_PINS:
+            self._pins = {k: v for k, v in self._pins.items() if v > now}
+        self._pins[pin_key] = now + self.max_lag_seconds
+
+    def is_pinned(self, pin_key: Optional[str]) -> bool:
+        if not pin_key:
+            return False
+        expires = self._pins.get(pin_key)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            self._pins.pop(pin_key, None)
+            return False
+        return True
+
+    def status(self) -> List[dict]:
+        return [replica.status() for replica in self.replicas]
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+replica_router = ReplicaRouter(
+    [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()],
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+    check_interval_seconds=settings.REPLICA_HEALTH_CHECK_INTERVAL_SECONDS
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_after_commit(session: Session):
+    """Pin the committing caller to the primary (read-your-writes)"""
+    replica_router.pin_primary(session.info.get(PIN_KEY))
+
+
+@asynccontextmanager
+async def read_session(primary: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Replica session for read-only work inside a write endpoint (e.g. exercise
+    searches during plan generation), or `primary` when none is usable.
+    """
+    replica = replica_router.pick()
+    if replica is None:
+        yield primary
+        return
+
+    async with replica.sessionmaker() as db:
+        yield db
+
+
+async def get_read_db(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+) -> AsyncIterator[AsyncSession]:
+    """
+    Dependency for read-only endpoints.
+    Yields a replica session when one is usable, otherwise the request's
+    primary session.
+    """
+    replica = replica_router.pick(request.headers.get("authorization"))
+    if replica is None:
+        yield db
+        return
+
+    async with replica.sessionmaker() as read_db:
+        try:
+            yield read_db
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                # Don't wait for the next health check to stop using it
+                replica.mark_unhealthy(f"{type(e).__name__}: {e}")
+            raise
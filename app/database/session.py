@@ -1,31 +1,64 @@
 """
 Database session management
+
+The API runs on an async engine (asyncpg) so queries never block the event
+loop. The synchronous engine is kept for Alembic, seed scripts and other
+standalone tools.
 """
+from typing import AsyncIterator
+
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.database.pool import engine_options, instrument_engine
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
-)
+
+def to_async_url(url: str) -> str:
+    """Swap a sync PostgreSQL driver for asyncpg, leaving other URLs untouched"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql" and parsed.get_driver_name() != "asyncpg":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+# Create database engine (sync - scripts and migrations)
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, is_async=False))
+instrument_engine("primary_sync", engine)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async database engine (API requests)
+async_engine = create_async_engine(
+    to_async_url(settings.DATABASE_URL),
+    **engine_options(settings.DATABASE_URL, is_async=True)
+)
+instrument_engine("primary", async_engine.sync_engine)
+
+# Objects stay usable after commit; responses are built from them
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session"""
-    db = SessionLocal()
-    try:
+# Session.info key identifying the caller, used to pin it to the primary after
+# a commit (see app.database.replicas)
+PIN_KEY = "replica_pin_key"
+
+
+async def get_db(request: Request) -> AsyncIterator[AsyncSession]:
+    """Dependency for getting an async (primary) database session"""
+    async with AsyncSessionLocal() as db:
+        db.sync_session.info[PIN_KEY] = request.headers.get("authorization")
         yield db
-    finally:
-        db.close()
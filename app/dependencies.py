@@ -4,10 +4,10 @@ Shared dependencies for FastAPI
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.session import get_db
-from app.core.security import decode_access_token
+from app.core.principal import Principal, load_user, principal_from_token, verify_access_token
 from app.models.user import User
 
 
@@ -17,7 +17,7 @@ security = HTTPBearer()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     Dependency to get current authenticated user from JWT token
@@ -25,7 +25,7 @@ async def get_current_user(
     token = credentials.credentials
     
     # Decode token
-    payload = decode_access_token(token)
+    payload = verify_access_token(token)
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -41,8 +41,8 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get user from database
-    user = db.query(User).filter(User.user_id == user_id).first()
+    # Get user (cached row, or database)
+    user = await load_user(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -53,6 +53,24 @@ async def get_current_user(
     return user
 
 
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> Principal:
+    """
+    Dependency for endpoints that only need the caller's user_id
+    Built from the JWT claims alone; the users row is not loaded
+    """
+    principal = principal_from_token(credentials.credentials)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    return principal
+
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -5,10 +5,11 @@ Allows endpoints to work with or without authentication
 from typing import Optional
 from fastapi import Depends, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.session import get_db
-from app.core.security import decode_access_token
+from app.core.principal import load_user, verify_access_token
 from app.models.user import User
 
 
@@ -18,7 +19,7 @@ security_optional = HTTPBearer(auto_error=False)
 
 async def get_optional_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     """
     Dependency to get current authenticated user from JWT token (OPTIONAL)
@@ -31,7 +32,7 @@ async def get_optional_user(
     token = credentials.credentials
     
     # Decode token
-    payload = decode_access_token(token)
+    payload = verify_access_token(token)
     if payload is None:
         return None
     
@@ -39,21 +40,21 @@ async def get_optional_user(
     if user_id is None:
         return None
     
-    # Get user from database
-    user = db.query(User).filter(User.user_id == user_id).first()
+    # Get user (cached row, or database)
+    user = await load_user(db, user_id)
     return user
 
 
 async def get_user_by_id_param(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     """
     Get user by user_id path parameter (no JWT validation)
     Used for Phase 2 endpoints that work with simple user_id
     WARNING: This provides NO security - Phase 4 will replace this
     """
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = await db.scalar(select(User).where(User.user_id == user_id, User.deleted_at.is_(None)))
     return user
 
 
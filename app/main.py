@@ -6,10 +6,57 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from contextlib import asynccontextmanager
+import asyncio
 import time
 
 from app.core.config import settings
+from app.core.idempotency import plan_idempotency
 from app.api.v1.api import api_router
+from ai.workout_generator_farsi import avalai_calls
+from app.database.pool import pool_metrics
+from app.database.replicas import replica_router
+from app.services.account_purge import account_purger
+from app.services.feedback_catalog import feedback_catalog
+from app.services.google_certs import google_cert_cache
+from app.services.notifications import notification_dispatcher
+from app.services.reference_data import reference_data
+from app.services.telegram import telegram_sender
+from app.services.telegram_updates import update_dispatcher
+from app.services.verification_codes import verification_code_sweeper
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start replica health checks and background workers; stop them on shutdown"""
+    health_task = None
+    if replica_router.replicas:
+        await replica_router.check_all()
+        health_task = asyncio.create_task(replica_router.run_health_checks())
+    telegram_sender.start()
+    update_dispatcher.start()
+    notification_dispatcher.start()
+    if settings.GOOGLE_CLIENT_ID:
+        google_cert_cache.start()
+    if settings.VERIFICATION_CODE_SWEEPER_ENABLED:
+        verification_code_sweeper.start()
+    feedback_catalog.start()
+    reference_data.start()
+    account_purger.start()
+    
+    yield
+    
+    await account_purger.stop()
+    await reference_data.stop()
+    await feedback_catalog.stop()
+    await verification_code_sweeper.stop()
+    await update_dispatcher.stop()
+    await telegram_sender.stop()
+    await notification_dispatcher.stop()
+    await google_cert_cache.stop()
+    if health_task:
+        health_task.cancel()
+    await replica_router.dispose()
 
 
 # Create FastAPI app
@@ -19,7 +66,8 @@ app = FastAPI(
     description="MovoAI Fitness API with multi-provider authentication",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
 
@@ -59,7 +107,8 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         content={
             "detail": exc.detail,
             "status_code": exc.status_code
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -99,7 +148,27 @@ async def health_check():
     return {
         "status": "healthy",
         "app": settings.APP_NAME,
-        "version": settings.APP_VERSION
+        "version": settings.APP_VERSION,
+        "replicas": replica_router.status()
+    }
+
+
+# Metrics endpoint
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """Connection pool, background worker and queue metrics"""
+    return {
+        "pools": pool_metrics(),
+        "telegram_outbound": telegram_sender.stats(),
+        "telegram_updates": update_dispatcher.stats(),
+        "notifications": notification_dispatcher.stats(),
+        "google_certs": google_cert_cache.stats(),
+        "verification_code_sweeper": verification_code_sweeper.stats(),
+        "feedback_catalog": feedback_catalog.stats(),
+        "reference_data": reference_data.stats(),
+        "account_purge": account_purger.stats(),
+        "plan_idempotency": plan_idempotency.stats(),
+        "avalai_single_flight": avalai_calls.stats()
     }
 
 
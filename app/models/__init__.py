@@ -3,19 +3,20 @@ Import all models here for Alembic to detect them
 """
 from app.models.user import User
 from app.models.auth_method import UserAuthMethod
-from app.models.verification_code import VerificationCode
+from app.models.verification_code import VerificationCode, VerificationCodeArchive
 from app.models.workout_goal import WorkoutGoal
 from app.models.nutrition_goal import NutritionGoal
 from app.models.exercise import Exercise
 from app.models.workout_plan import WorkoutPlan, WorkoutWeek, WorkoutDay, WorkoutDayExercise
 from app.models.nutrition_plan import NutritionPlan, NutritionWeek, NutritionDay, Meal
 from app.models.user_equipment import UserHomeEquipment, UserGymEquipment
-from app.models.feedback import Feedback, FeedbackQuestion
+from app.models.feedback import Feedback, FeedbackQuestion, FeedbackAnswerCount, FeedbackAnalyticsState
 
 __all__ = [
     "User",
     "UserAuthMethod",
     "VerificationCode",
+    "VerificationCodeArchive",
     "WorkoutGoal",
     "NutritionGoal",
     "Exercise",
@@ -31,4 +32,6 @@ __all__ = [
     "UserGymEquipment",
     "Feedback",
     "FeedbackQuestion",
+    "FeedbackAnswerCount",
+    "FeedbackAnalyticsState",
 ]
@@ -34,6 +34,24 @@ class Muscle(Base):
     name_fa = Column(String(100), nullable=False)
 
 
+class Style(Base):
+    """Exercise styles (Recovery, Stretches, Cardio, ...)"""
+    __tablename__ = "style"
+    
+    style_id = Column(Integer, primary_key=True)
+    name_en = Column(String(100), unique=True, nullable=False)
+    name_fa = Column(String(100), nullable=False)
+
+
+class TrainingPhase(Base):
+    """Workout phases (Warm-up, Main, Cool-down)"""
+    __tablename__ = "training_phase"
+    
+    phase_id = Column(Integer, primary_key=True)
+    name_en = Column(String(100), unique=True, nullable=False)
+    name_fa = Column(String(100), nullable=False)
+
+
 # Junction tables (existing in DB)
 exercise_equipment = Table(
     'exercise_equipment',
@@ -72,6 +90,6 @@ class Exercise(Base):
     female_image_urls = Column(ARRAY(Text))
     
     # Relationships
-    difficulty = relationship("Difficulty")
+    difficulty = relationship("Difficulty", lazy="joined")
     equipment = relationship("Equipment", secondary=exercise_equipment, lazy="joined")
     muscles = relationship("Muscle", secondary=exercise_muscle, lazy="joined")
@@ -1,9 +1,9 @@
 """
 Feedback models
 """
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, CheckConstraint, Boolean, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, CheckConstraint, Boolean, Text, Index, UniqueConstraint
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import backref, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 
 from app.database.base import Base
@@ -21,7 +21,7 @@ class Feedback(Base):
     submitted_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    user = relationship("User", backref="feedback_submissions")
+    user = relationship("User", backref=backref("feedback_submissions", passive_deletes=True))
     
     # Add constraint
     __table_args__ = (
@@ -29,6 +29,8 @@ class Feedback(Base):
             "week_table IN ('workout_weeks', 'nutrition_weeks')",
             name='check_week_table'
         ),
+        Index('ix_feedback_user_submitted_id', 'user_id', 'submitted_at', 'feedback_id'),  # Keyset pagination
+        UniqueConstraint('user_id', 'week_table', 'week_id', name='uq_feedback_user_week'),  # One submission per week
     )
 
 
@@ -67,3 +69,21 @@ class FeedbackQuestion(Base):
             name='check_dynamic_options'
         ),
     )
+
+
+class FeedbackAnswerCount(Base):
+    """How often each answer was given to a question, across all feedback"""
+    __tablename__ = "feedback_answer_counts"
+    
+    question_id = Column(Integer, primary_key=True, autoincrement=False)
+    answer = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class FeedbackAnalyticsState(Base):
+    """Single row (id=1) tracking a rebuild of feedback_answer_counts"""
+    __tablename__ = "feedback_analytics_state"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    # NULL: counts cover all feedback. Otherwise a rebuild has counted feedback_id <= rebuild_through
+    rebuild_through = Column(Integer, nullable=True)
@@ -1,7 +1,7 @@
 """
 SQLAlchemy models for Nutrition Plan System (Phase 3)
 """
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, CheckConstraint, UniqueConstraint, ARRAY, TIMESTAMP, Numeric
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, CheckConstraint, UniqueConstraint, Index, ARRAY, TIMESTAMP, Numeric
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -27,13 +27,14 @@ class NutritionPlan(Base):
     # Relationships
     user = relationship("User", back_populates="nutrition_plans")
     nutrition_goal = relationship("NutritionGoal")
-    weeks = relationship("NutritionWeek", back_populates="plan", cascade="all, delete-orphan")
+    weeks = relationship("NutritionWeek", back_populates="plan", cascade="all, delete-orphan", passive_deletes=True)
     
     # Constraints
     __table_args__ = (
         CheckConstraint("total_weeks IN (1, 4, 12)", name="chk_nutrition_total_weeks"),
         CheckConstraint("current_week >= 1", name="chk_nutrition_current_week_positive"),
         CheckConstraint("current_week <= total_weeks", name="chk_nutrition_current_week_range"),
+        Index("ix_nutrition_plans_user_created_id", "user_id", "created_at", "plan_id"),  # Keyset pagination
     )
 
 
@@ -50,7 +51,7 @@ class NutritionWeek(Base):
     
     # Relationships
     plan = relationship("NutritionPlan", back_populates="weeks")
-    days = relationship("NutritionDay", back_populates="week", cascade="all, delete-orphan")
+    days = relationship("NutritionDay", back_populates="week", cascade="all, delete-orphan", passive_deletes=True)
     
     # Constraints
     __table_args__ = (
@@ -71,7 +72,7 @@ class NutritionDay(Base):
     
     # Relationships
     week = relationship("NutritionWeek", back_populates="days")
-    meals = relationship("Meal", back_populates="day", cascade="all, delete-orphan")
+    meals = relationship("Meal", back_populates="day", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Meal(Base):
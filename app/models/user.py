@@ -1,7 +1,7 @@
 """
 User model
 """
-from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, ARRAY, DateTime, Text, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, ARRAY, DateTime, Text, Numeric, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from typing import TYPE_CHECKING
@@ -16,6 +16,9 @@ class User(Base):
     """User model - matches existing users table from database"""
     __tablename__ = "users"
     
+    # Fetch updated_at (onupdate) with RETURNING so updated users need no refresh
+    __mapper_args__ = {"eager_defaults": True}
+    
     # Primary key - database uses user_id
     user_id = Column(Integer, primary_key=True, index=True, name='user_id')
     
@@ -63,15 +66,16 @@ class User(Base):
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # account deleted, rows not yet purged
     
     # Relationships
-    auth_methods = relationship("UserAuthMethod", back_populates="user", cascade="all, delete-orphan", foreign_keys="[UserAuthMethod.user_id]")
+    auth_methods = relationship("UserAuthMethod", back_populates="user", cascade="all, delete-orphan", passive_deletes=True, foreign_keys="[UserAuthMethod.user_id]")
     workout_goal = relationship("WorkoutGoal", back_populates="users", foreign_keys=[workout_goal_id])
     nutrition_goal = relationship("NutritionGoal", back_populates="users", foreign_keys=[nutrition_goal_id])
-    workout_plans = relationship("WorkoutPlan", back_populates="user", cascade="all, delete-orphan")
-    nutrition_plans = relationship("NutritionPlan", back_populates="user", cascade="all, delete-orphan")
-    home_equipment_rel = relationship("UserHomeEquipment", back_populates="user", cascade="all, delete-orphan")
-    gym_equipment_rel = relationship("UserGymEquipment", back_populates="user", cascade="all, delete-orphan")
+    workout_plans = relationship("WorkoutPlan", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    nutrition_plans = relationship("NutritionPlan", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    home_equipment_rel = relationship("UserHomeEquipment", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    gym_equipment_rel = relationship("UserGymEquipment", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
     
     # Property for backward compatibility
     @property
@@ -89,3 +93,8 @@ class User(Base):
     def gym_equipment(self):
         """Return list of equipment IDs for serialization"""
         return [ue.equipment_id for ue in self.gym_equipment_rel] if self.gym_equipment_rel else []
+    
+    __table_args__ = (
+        # Accounts waiting for the background purge
+        Index('ix_users_deleted_at', 'deleted_at', postgresql_where=deleted_at.isnot(None)),
+    )
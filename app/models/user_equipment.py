@@ -1,7 +1,7 @@
 """
 User equipment models (home and gym)
 """
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -20,6 +20,10 @@ class UserHomeEquipment(Base):
     # Relationships
     user = relationship("User", back_populates="home_equipment_rel")
     equipment = relationship("Equipment")
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'equipment_id', name='user_home_equipment_user_id_equipment_id_key'),
+    )
 
 
 class UserGymEquipment(Base):
@@ -34,3 +38,7 @@ class UserGymEquipment(Base):
     # Relationships
     user = relationship("User", back_populates="gym_equipment_rel")
     equipment = relationship("Equipment")
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'equipment_id', name='user_gym_equipment_user_id_equipment_id_key'),
+    )
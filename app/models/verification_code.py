@@ -1,7 +1,7 @@
 """
 Verification codes model for SMS and Email authentication
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index
 from sqlalchemy.sql import func
 
 from app.database.base import Base
@@ -12,10 +12,34 @@ class VerificationCode(Base):
     __tablename__ = "verification_codes"
     
     id = Column(Integer, primary_key=True, index=True)
-    identifier = Column(String(255), nullable=False, index=True)  # phone number or email
+    identifier = Column(String(255), nullable=False)  # phone number or email
     code = Column(String(6), nullable=False)  # 6-digit code
     code_type = Column(String(10), nullable=False)  # 'sms' or 'email'
     expires_at = Column(DateTime(timezone=True), nullable=False)
     attempts = Column(Integer, default=0, nullable=False)
     verified = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # Verify: identifier + type, newest first
+        Index("ix_verification_codes_identifier_type_created", "identifier", "code_type", "created_at"),
+        # Telegram web login looks the token up by code alone
+        Index("ix_verification_codes_code_type", "code", "code_type"),
+        # Sweeper: expired rows
+        Index("ix_verification_codes_expires_at", "expires_at"),
+    )
+
+
+class VerificationCodeArchive(Base):
+    """Swept verification codes, kept when VERIFICATION_CODE_ARCHIVE is on"""
+    __tablename__ = "verification_codes_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id from verification_codes
+    identifier = Column(String(255), nullable=False)
+    code = Column(String(6), nullable=False)
+    code_type = Column(String(10), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    verified = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,7 +1,7 @@
 """
 SQLAlchemy models for Workout Plan System (Phase 2)
 """
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, CheckConstraint, UniqueConstraint, ARRAY, TIMESTAMP
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, CheckConstraint, UniqueConstraint, Index, ARRAY, TIMESTAMP
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -28,13 +28,14 @@ class WorkoutPlan(Base):
     # Relationships
     user = relationship("User", back_populates="workout_plans")
     workout_goal = relationship("WorkoutGoal")
-    weeks = relationship("WorkoutWeek", back_populates="workout_plan", cascade="all, delete-orphan")
+    weeks = relationship("WorkoutWeek", back_populates="workout_plan", cascade="all, delete-orphan", passive_deletes=True)
     
     # Constraints
     __table_args__ = (
         CheckConstraint("total_weeks IN (1, 4, 12)", name="chk_workout_total_weeks"),
         CheckConstraint("current_week >= 1", name="chk_workout_current_week_positive"),
         CheckConstraint("current_week <= total_weeks", name="chk_workout_current_week_range"),
+        Index("ix_workout_plans_user_created_id", "user_id", "created_at", "plan_id"),  # Keyset pagination
     )
 
 
@@ -52,7 +53,7 @@ class WorkoutWeek(Base):
     
     # Relationships
     workout_plan = relationship("WorkoutPlan", back_populates="weeks")
-    days = relationship("WorkoutDay", back_populates="week", cascade="all, delete-orphan")
+    days = relationship("WorkoutDay", back_populates="week", cascade="all, delete-orphan", passive_deletes=True)
     
     # Constraints
     __table_args__ = (
@@ -75,7 +76,7 @@ class WorkoutDay(Base):
     
     # Relationships
     week = relationship("WorkoutWeek", back_populates="days")
-    exercises = relationship("WorkoutDayExercise", back_populates="day", cascade="all, delete-orphan")
+    exercises = relationship("WorkoutDayExercise", back_populates="day", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class WorkoutDayExercise(Base):
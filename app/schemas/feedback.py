@@ -39,6 +39,27 @@ class FeedbackQuestionListResponse(BaseModel):
     total: int
 
 
+class AnswerCount(BaseModel):
+    """How many times an answer was given"""
+    answer: str
+    count: int
+
+
+class QuestionAnalytics(BaseModel):
+    """Answer distribution for one question"""
+    question_id: int
+    answers: List[AnswerCount]
+    total: int = Field(..., description="Answers counted (multi-select counts each option)")
+
+
+class FeedbackAnalyticsResponse(BaseModel):
+    """Answer distributions for the questions of a week and focus"""
+    week_table: str
+    week_number: int
+    focus: str
+    questions: List[QuestionAnalytics]
+
+
 # ========== Feedback Response Schemas ==========
 
 class FeedbackResponse(BaseModel):
@@ -75,6 +96,25 @@ class FeedbackCreate(BaseModel):
         return v
 
 
+class FeedbackBatchCreate(BaseModel):
+    """Several weeks of feedback submitted at once (offline sync)"""
+    items: List[FeedbackCreate] = Field(..., min_length=1, max_length=100, description="Feedback per week")
+
+
+class FeedbackBatchItemResult(BaseModel):
+    """Outcome for one item of a batch submission"""
+    week_table: str
+    week_id: int
+    status: Literal['created', 'exists', 'not_found'] = Field(..., description="'exists': feedback was already submitted for this week")
+    feedback_id: Optional[int] = Field(None, description="New or existing feedback, unless not_found")
+
+
+class FeedbackBatchResponse(BaseModel):
+    """Per-item results, in request order"""
+    results: List[FeedbackBatchItemResult]
+    created: int
+
+
 class FeedbackDetail(BaseModel):
     """Schema for feedback response"""
     feedback_id: int
@@ -100,6 +140,8 @@ class FeedbackSummary(BaseModel):
 
 
 class FeedbackListResponse(BaseModel):
-    """Response for listing feedback"""
+    """Response for listing feedback (newest first)"""
     feedback: List[FeedbackSummary]
-    total: int
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= to fetch the next page")
+    has_more: bool = False
+    total: Optional[int] = Field(None, description="Approximate total, only when include_total=true")
@@ -135,9 +135,11 @@ class NutritionPlanDetailResponse(NutritionPlanResponse):
 
 
 class NutritionPlanListResponse(BaseModel):
-    """Schema for list of nutrition plans"""
+    """Schema for a page of nutrition plans (newest first)"""
     plans: List[NutritionPlanResponse]
-    total: int
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to fetch the next page
+    has_more: bool = False
+    total: Optional[int] = None  # Approximate, only when include_total=true
 
 
 # ========== Week Completion Schemas ==========
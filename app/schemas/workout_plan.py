@@ -176,9 +176,11 @@ class WorkoutPlanDetailResponse(WorkoutPlanResponse):
 
 
 class WorkoutPlanListResponse(BaseModel):
-    """Schema for list of workout plans"""
+    """Schema for a page of workout plans (newest first)"""
     plans: List[WorkoutPlanResponse]
-    total: int
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to fetch the next page
+    has_more: bool = False
+    total: Optional[int] = None  # Approximate, only when include_total=true
 
 
 # ========== Week Completion Schemas ==========
@@ -0,0 +1,198 @@
+"""
+Account purge
+
+DELETE /users/me only detaches the account: auth methods are removed, the
+email and telegram_id are released, the user is marked deleted_at and its
+tokens are revoked. Everything the account owns (plans with their weeks,
+days, exercises and meals, feedback, equipment) is removed here, in the
+background, so the request returns right away however much history the
+user has.
+
+Each batch is one short transaction deleting up to ACCOUNT_PURGE_BATCH_SIZE
+top-level rows (plans or feedback); the ON DELETE CASCADE foreign keys
+remove their children in the database, so nothing is loaded into memory.
+Feedback answers are subtracted from the analytics counters as they go.
+The users row itself is deleted last.
+
+One-off run:
+    python -m app.services.account_purge
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal, async_engine
+from app.models.feedback import Feedback
+from app.models.nutrition_plan import NutritionPlan
+from app.models.user import User
+from app.models.workout_plan import WorkoutPlan
+from app.services.feedback_analytics import record_feedback_changes
+
+
+async def pending_accounts(db: AsyncSession, limit: int) -> List[int]:
+    """Deleted accounts still waiting to be purged, oldest first"""
+    return (await db.scalars(
+        select(User.user_id)
+        .where(User.deleted_at.isnot(None))
+        .order_by(User.deleted_at)
+        .limit(limit)
+    )).all()
+
+
+async def purge_plans_batch(db: AsyncSession, model, user_id: int, batch_size: int) -> int:
+    """Delete up to batch_size of the user's plans (children cascade); commits"""
+    ids = (await db.scalars(
+        select(model.plan_id)
+        .where(model.user_id == user_id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if ids:
+        await db.execute(delete(model).where(model.plan_id.in_(ids)))
+    await db.commit()
+    return len(ids)
+
+
+async def purge_feedback_batch(db: AsyncSession, user_id: int, batch_size: int) -> int:
+    """Delete up to batch_size of the user's feedback, keeping the answer counters right; commits"""
+    rows = (await db.execute(
+        select(Feedback.feedback_id, Feedback.responses)
+        .where(Feedback.user_id == user_id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if rows:
+        await record_feedback_changes(db, [(feedback_id, responses, None) for feedback_id, responses in rows])
+        await db.execute(delete(Feedback).where(Feedback.feedback_id.in_([row.feedback_id for row in rows])))
+    await db.commit()
+    return len(rows)
+
+
+async def purge_account(db: AsyncSession, user_id: int, batch_size: int) -> int:
+    """Remove a deleted account in batches; returns top-level rows removed"""
+    removed = 0
+    for purge_batch in (
+        lambda: purge_plans_batch(db, WorkoutPlan, user_id, batch_size),
+        lambda: purge_plans_batch(db, NutritionPlan, user_id, batch_size),
+        lambda: purge_feedback_batch(db, user_id, batch_size),
+    ):
+        while True:
+            purged = await purge_batch()
+            removed += purged
+            if purged < batch_size:
+                break
+            # Let requests in between batches
+            await asyncio.sleep(0)
+
+    # Auth methods, equipment and anything left cascade from the users row
+    await db.execute(delete(User).where(User.user_id == user_id, User.deleted_at.isnot(None)))
+    await db.commit()
+    return removed + 1
+
+
+class AccountPurger:
+    """Background task purging deleted accounts"""
+
+    def __init__(
+        self,
+        interval: float,
+        batch_size: int,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration = 0.0
+        self.counters = {
+            "runs": 0,
+            "failures": 0,
+            "accounts": 0,
+            "rows": 0,
+        }
+
+    def start(self):
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+        self.wakeup = None
+
+    def wake(self):
+        """Purge now instead of at the next interval (after an account deletion)"""
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def run(self):
+        while True:
+            # Accounts left over from before a restart are picked up too
+            try:
+                await self.purge_once()
+            except Exception as e:
+                self.counters["failures"] += 1
+                print(f"Account purge failed: {e}")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def purge_once(self) -> int:
+        """Purge every pending account; returns how many were removed"""
+        started = time.monotonic()
+        accounts = 0
+
+        async with self.session_factory() as db:
+            while True:
+                user_ids = await pending_accounts(db, limit=100)
+                await db.rollback()
+                if not user_ids:
+                    break
+                for user_id in user_ids:
+                    self.counters["rows"] += await purge_account(db, user_id, self.batch_size)
+                    accounts += 1
+
+        self.counters["runs"] += 1
+        self.counters["accounts"] += accounts
+        self.last_run_at = datetime.utcnow()
+        self.last_duration = time.monotonic() - started
+        if accounts:
+            print(f"Purged {accounts} deleted accounts in {self.last_duration:.2f}s")
+        return accounts
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "running": self.task is not None,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_duration_seconds": round(self.last_duration, 3),
+        }
+
+
+account_purger = AccountPurger(
+    interval=settings.ACCOUNT_PURGE_INTERVAL_SECONDS,
+    batch_size=settings.ACCOUNT_PURGE_BATCH_SIZE
+)
+
+
+async def _main():
+    accounts = await account_purger.purge_once()
+    print(f"Purged {accounts} deleted accounts")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -2,44 +2,17 @@
 Third-party service integrations
 """
 from typing import Optional
-from twilio.rest import Client as TwilioClient
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-
 from app.core.config import settings
+from app.services.google_certs import google_cert_cache
+from app.services.notifications import notification_dispatcher
 
 
 class SMSService:
-    """Service for sending SMS via Twilio"""
-    
-    def __init__(self):
-        if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
-            self.client = TwilioClient(
-                settings.TWILIO_ACCOUNT_SID,
-                settings.TWILIO_AUTH_TOKEN
-            )
-            self.from_number = settings.TWILIO_PHONE_NUMBER
-        else:
-            self.client = None
+    """Service for sending SMS (Twilio), queued through the notification dispatcher"""
     
     async def send_sms(self, to_number: str, message: str) -> bool:
-        """Send SMS to phone number"""
-        if not self.client:
-            print(f"[SMS MOCK] Would send to {to_number}: {message}")
-            return True
-        
-        try:
-            message = self.client.messages.create(
-                body=message,
-                from_=self.from_number,
-                to=to_number
-            )
-            return message.sid is not None
-        except Exception as e:
-            print(f"Error sending SMS: {e}")
-            return False
+        """Queue an SMS; False if it could not be queued"""
+        return notification_dispatcher.enqueue("sms", to_number, message)
     
     async def send_verification_code(self, phone_number: str, code: str) -> bool:
         """Send verification code via SMS"""
@@ -48,32 +21,11 @@ class SMSService:
 
 
 class EmailService:
-    """Service for sending emails via SendGrid"""
-    
-    def __init__(self):
-        if settings.SENDGRID_API_KEY:
-            self.client = SendGridAPIClient(settings.SENDGRID_API_KEY)
-        else:
-            self.client = None
+    """Service for sending emails (SendGrid), queued through the notification dispatcher"""
     
     async def send_email(self, to_email: str, subject: str, html_content: str) -> bool:
-        """Send email"""
-        if not self.client:
-            print(f"[EMAIL MOCK] Would send to {to_email}: {subject}")
-            return True
-        
-        try:
-            message = Mail(
-                from_email=(settings.EMAIL_FROM_ADDRESS, settings.EMAIL_FROM_NAME),
-                to_emails=to_email,
-                subject=subject,
-                html_content=html_content
-            )
-            response = self.client.send(message)
-            return response.status_code in [200, 201, 202]
-        except Exception as e:
-            print(f"Error sending email: {e}")
-            return False
+        """Queue an email; False if it could not be queued"""
+        return notification_dispatcher.enqueue("email", to_email, html_content, subject=subject)
     
     async def send_verification_code(self, email: str, code: str) -> bool:
         """Send verification code via email"""
@@ -102,15 +54,8 @@ class GoogleOAuthService:
             return None
         
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token,
-                google_requests.Request(),
-                settings.GOOGLE_CLIENT_ID
-            )
-            
-            # Verify issuer
-            if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-                return None
+            # Signing certs are cached; the signature is checked locally
+            idinfo = await google_cert_cache.verify(token, settings.GOOGLE_CLIENT_ID)
             
             return {
                 'google_id': idinfo['sub'],
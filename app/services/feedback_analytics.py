@@ -0,0 +1,217 @@
+"""
+Feedback answer rollups
+
+feedback_answer_counts holds one counter per (question_id, answer), so
+answer distributions per question, week or focus are read by primary key
+instead of scanning every feedback.responses document. Multi-select answers
+count once per selected option; free text (text_response) is not counted.
+
+Counters are maintained in the same transaction as the feedback write
+(`record_feedback_change`): a submission adds its answers, an edit applies
+the difference, a deletion subtracts them. Account purges subtract the
+feedback they remove through `record_feedback_changes`.
+
+`rebuild` recomputes every counter from the feedback table in batches of
+feedback_id (jsonb_array_elements on PostgreSQL). Run it once after the
+migration; later runs are only needed if feedback rows were changed outside
+these paths (e.g. by hand in SQL):
+
+    python -m app.services.feedback_analytics rebuild
+
+While a rebuild runs, feedback_analytics_state.rebuild_through marks how far
+it got. Writes to feedback beyond that point leave the counters alone (the
+rebuild will count them); batches and writes serialize on that row.
+"""
+import asyncio
+import json
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal, async_engine
+from app.models.feedback import Feedback, FeedbackAnalyticsState, FeedbackAnswerCount
+
+
+STATE_ID = 1
+MAX_ANSWER_LENGTH = 255
+
+# Same normalization as response_answers, done by PostgreSQL
+REBUILD_BATCH = text("""
+INSERT INTO feedback_answer_counts (question_id, answer, count)
+SELECT CAST(r.item->>'question_id' AS integer), left(v.value #>> '{}', 255), count(*)
+FROM feedback f
+CROSS JOIN LATERAL jsonb_array_elements(
+    CASE WHEN jsonb_typeof(f.responses) = 'array' THEN f.responses ELSE CAST('[]' AS jsonb) END
+) AS r(item)
+CROSS JOIN LATERAL jsonb_array_elements(
+    CASE WHEN jsonb_typeof(r.item->'answer') = 'array' THEN r.item->'answer' ELSE jsonb_build_array(r.item->'answer') END
+) AS v(value)
+WHERE f.feedback_id > :after AND f.feedback_id <= :upto
+  AND jsonb_typeof(r.item) = 'object'
+  AND r.item->>'question_id' ~ '^[0-9]{1,9}$'
+  AND jsonb_typeof(v.value) IN ('string', 'number', 'boolean')
+GROUP BY 1, 2
+ON CONFLICT (question_id, answer) DO UPDATE SET count = feedback_answer_counts.count + excluded.count
+""")
+
+
+def _question_id(value) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int) and 0 <= value < 10 ** 9:
+        return value
+    if isinstance(value, str) and value.isdigit() and len(value) <= 9:
+        return int(value)
+    return None
+
+
+def response_answers(responses) -> Counter:
+    """(question_id, answer) -> occurrences in one feedback document"""
+    counts = Counter()
+    if not isinstance(responses, list):
+        return counts
+    for item in responses:
+        if not isinstance(item, dict):
+            continue
+        question_id = _question_id(item.get("question_id"))
+        if question_id is None:
+            continue
+        answer = item.get("answer")
+        for value in answer if isinstance(answer, list) else [answer]:
+            if isinstance(value, (str, int, float, bool)):
+                value = value if isinstance(value, str) else json.dumps(value)
+                counts[(question_id, value[:MAX_ANSWER_LENGTH])] += 1
+    return counts
+
+
+async def apply_answer_deltas(db: AsyncSession, deltas: Counter):
+    """Add (or with negative values, subtract) occurrences in one upsert"""
+    rows = [
+        {"question_id": question_id, "answer": answer, "count": count}
+        for (question_id, answer), count in deltas.items() if count
+    ]
+    if not rows:
+        return
+    conn = await db.connection()
+    insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(FeedbackAnswerCount).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[FeedbackAnswerCount.question_id, FeedbackAnswerCount.answer],
+        set_={"count": FeedbackAnswerCount.count + stmt.excluded.count}
+    ))
+
+
+async def _lock_state(db: AsyncSession, exclusive: bool) -> Tuple[bool, Optional[int]]:
+    """(row exists, rebuild_through), locking the state row for the transaction"""
+    row = (await db.execute(
+        select(FeedbackAnalyticsState.rebuild_through)
+        .where(FeedbackAnalyticsState.id == STATE_ID)
+        .with_for_update(read=not exclusive)
+    )).first()
+    return row is not None, row.rebuild_through if row is not None else None
+
+
+async def _set_rebuild_through(db: AsyncSession, rebuild_through: Optional[int]):
+    await db.execute(
+        update(FeedbackAnalyticsState)
+        .where(FeedbackAnalyticsState.id == STATE_ID)
+        .values(rebuild_through=rebuild_through)
+    )
+
+
+async def record_feedback_changes(db: AsyncSession, changes: Iterable[Tuple[int, object, object]]):
+    """Update the counters for (feedback_id, old_responses, new_responses) writes; call before committing them"""
+    _, rebuild_through = await _lock_state(db, exclusive=False)
+    deltas = Counter()
+    for feedback_id, old_responses, new_responses in changes:
+        if rebuild_through is not None and feedback_id > rebuild_through:
+            # A running rebuild has not reached this row yet and will count it
+            continue
+        deltas.update(response_answers(new_responses))
+        deltas.subtract(response_answers(old_responses))
+    await apply_answer_deltas(db, deltas)
+
+
+async def record_feedback_change(db: AsyncSession, feedback_id: int, old_responses, new_responses):
+    """Update the counters for one feedback write; call before committing it"""
+    await record_feedback_changes(db, [(feedback_id, old_responses, new_responses)])
+
+
+async def _count_batch(db: AsyncSession, after: int, upto: int):
+    conn = await db.connection()
+    if conn.dialect.name == "postgresql":
+        await db.execute(REBUILD_BATCH, {"after": after, "upto": upto})
+        return
+    # Other databases (SQLite in tests)
+    deltas = Counter()
+    for responses in await db.scalars(
+        select(Feedback.responses).where(Feedback.feedback_id > after, Feedback.feedback_id <= upto)
+    ):
+        deltas.update(response_answers(responses))
+    await apply_answer_deltas(db, deltas)
+
+
+async def rebuild(session_factory=AsyncSessionLocal, batch_size: int = 5000) -> int:
+    """Recount every answer from the feedback table; returns feedback rows counted"""
+    async with session_factory() as db:
+        exists, _ = await _lock_state(db, exclusive=True)
+        if exists:
+            await _set_rebuild_through(db, 0)
+        else:
+            db.add(FeedbackAnalyticsState(id=STATE_ID, rebuild_through=0))
+        await db.execute(delete(FeedbackAnswerCount))
+        await db.commit()
+
+    counted = 0
+    while True:
+        async with session_factory() as db:
+            _, after = await _lock_state(db, exclusive=True)
+            ids = select(Feedback.feedback_id).where(
+                Feedback.feedback_id > after
+            ).order_by(Feedback.feedback_id).limit(batch_size).subquery()
+            upto, rows = (await db.execute(select(func.max(ids.c.feedback_id), func.count()).select_from(ids))).one()
+
+            if not rows:
+                # Caught up: counters are maintained by writes from here on
+                await _set_rebuild_through(db, None)
+                await db.commit()
+                return counted
+
+            await _count_batch(db, after, upto)
+            await _set_rebuild_through(db, upto)
+            await db.commit()
+            counted += rows
+
+
+async def answer_counts(db: AsyncSession, question_ids: Iterable[int]) -> Dict[int, List[Tuple[str, int]]]:
+    """question_id -> [(answer, count)], most common first"""
+    question_ids = list(question_ids)
+    counts: Dict[int, List[Tuple[str, int]]] = {question_id: [] for question_id in question_ids}
+    if not question_ids:
+        return counts
+    rows = await db.execute(
+        select(FeedbackAnswerCount.question_id, FeedbackAnswerCount.answer, FeedbackAnswerCount.count)
+        .where(FeedbackAnswerCount.question_id.in_(question_ids), FeedbackAnswerCount.count > 0)
+        .order_by(FeedbackAnswerCount.question_id, FeedbackAnswerCount.count.desc(), FeedbackAnswerCount.answer)
+    )
+    for question_id, answer, count in rows:
+        counts[question_id].append((answer, count))
+    return counts
+
+
+async def _main(command: str):
+    if command == "rebuild":
+        counted = await rebuild(batch_size=settings.FEEDBACK_ANALYTICS_BATCH_SIZE)
+        print(f"Counted answers from {counted} feedback submissions")
+    else:
+        raise SystemExit("Usage: python -m app.services.feedback_analytics rebuild")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else ""))
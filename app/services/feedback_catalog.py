@@ -0,0 +1,161 @@
+"""
+Feedback question catalog
+
+feedback_questions is a fixed, seeded set: 2 week tables x 12 weeks x 4
+focus values. Instead of querying and re-validating it on every request, the
+whole table is loaded once at startup and every response the question
+endpoints can return is serialized ahead of time:
+
+- one list body per (week_table, week_number, focus), including the empty
+  list for combinations without questions
+- one detail body per question_id
+
+Each body carries an ETag, so clients that send If-None-Match get a 304.
+
+A background task compares a version fingerprint of the table every
+FEEDBACK_CATALOG_CHECK_SECONDS and rebuilds the catalog when it changed (on
+PostgreSQL an md5 over all rows, so edits in place are picked up too). If
+the startup load fails, the first request loads it with its own session.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.etag import CatalogEntry
+from app.database.session import AsyncSessionLocal
+from app.models.feedback import FeedbackQuestion
+from app.schemas.feedback import FeedbackQuestionDetail, FeedbackQuestionListResponse
+
+
+WEEK_TABLES = ("workout_weeks", "nutrition_weeks")
+WEEK_NUMBERS = range(1, 13)
+FOCUS_VALUES = ("performance_enhancement", "body_recomposition", "efficiency", "rebuilding_rehab")
+
+POSTGRES_VERSION = text(
+    "SELECT md5(coalesce(string_agg(q::text, ',' ORDER BY q.question_id), '')) FROM feedback_questions q"
+)
+
+CatalogKey = Tuple[str, int, str]
+
+
+@dataclass(frozen=True)
+class Catalog:
+    lists: Dict[CatalogKey, CatalogEntry]
+    questions: Dict[int, CatalogEntry]
+    question_ids: Dict[CatalogKey, List[int]]  # in question_order
+    version: str
+
+
+def build_catalog(rows, version: str) -> Catalog:
+    """Serialize every list and detail response from the table's rows"""
+    details = [FeedbackQuestionDetail.model_validate(row) for row in rows]
+    details.sort(key=lambda q: (q.question_order, q.question_id))
+
+    grouped: Dict[CatalogKey, list] = {
+        (week_table, week_number, focus): []
+        for week_table in WEEK_TABLES for week_number in WEEK_NUMBERS for focus in FOCUS_VALUES
+    }
+    for detail in details:
+        grouped.setdefault((detail.week_table, detail.week_number, detail.focus), []).append(detail)
+
+    return Catalog(
+        lists={
+            key: CatalogEntry.of(FeedbackQuestionListResponse(questions=questions, total=len(questions)))
+            for key, questions in grouped.items()
+        },
+        questions={detail.question_id: CatalogEntry.of(detail) for detail in details},
+        question_ids={key: [q.question_id for q in questions] for key, questions in grouped.items()},
+        version=version
+    )
+
+
+async def table_version(db: AsyncSession) -> str:
+    """Fingerprint of feedback_questions that changes whenever its rows do"""
+    conn = await db.connection()
+    if conn.dialect.name == "postgresql":
+        return await db.scalar(POSTGRES_VERSION)
+    # Other databases (SQLite in tests): inserts and deletes only
+    row = (await db.execute(select(
+        func.count(FeedbackQuestion.question_id),
+        func.max(FeedbackQuestion.question_id),
+        func.max(FeedbackQuestion.created_at)
+    ))).one()
+    return ":".join(str(value) for value in row)
+
+
+class FeedbackQuestionCatalog:
+    """In-memory feedback questions, reloaded when the table changes"""
+
+    def __init__(self, check_interval: float, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.check_interval = check_interval
+        self.session_factory = session_factory
+        self.catalog: Optional[Catalog] = None
+        self.loaded_at = 0.0
+        self.lock: Optional[asyncio.Lock] = None
+        self.task: Optional[asyncio.Task] = None
+        self.counters = {"loads": 0, "checks": 0, "failures": 0}
+
+    def start(self):
+        """Load the catalog and keep checking its version (idempotent)"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+    async def load(self, db: AsyncSession, force: bool = False) -> Catalog:
+        """(Re)build the catalog if the table's version changed (one build at a time)"""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            version = await table_version(db)
+            if self.catalog is not None and self.catalog.version == version and not force:
+                return self.catalog
+            rows = (await db.scalars(select(FeedbackQuestion))).all()
+            self.catalog = build_catalog(rows, version)
+            self.loaded_at = time.time()
+            self.counters["loads"] += 1
+            return self.catalog
+
+    async def get(self, db: AsyncSession) -> Catalog:
+        """The current catalog, loading it with `db` if startup could not"""
+        if self.catalog is not None:
+            return self.catalog
+        return await self.load(db)
+
+    async def check(self):
+        """Reload if feedback_questions changed since the last load"""
+        self.counters["checks"] += 1
+        async with self.session_factory() as db:
+            await self.load(db)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                self.counters["failures"] += 1
+                print(f"Error loading feedback question catalog: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def clear(self):
+        self.catalog = None
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "questions": len(self.catalog.questions) if self.catalog else 0,
+            "loaded_seconds_ago": round(time.time() - self.loaded_at) if self.catalog else None,
+        }
+
+
+feedback_catalog = FeedbackQuestionCatalog(settings.FEEDBACK_CATALOG_CHECK_SECONDS)
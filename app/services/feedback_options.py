@@ -0,0 +1,100 @@
+"""
+Dynamic options for feedback questions
+
+Questions with dynamic_options set to 'exercises' or 'meals' offer the
+exercises or meals of one of the user's weeks as {label, value} pairs. Each
+list is built with a single projection query (ids and names only, no ORM
+objects or eager loads) and cached per (user, week) until one of the user's
+plans is created or deleted (`invalidate_week_options`). Other workers see
+plan changes once FEEDBACK_OPTIONS_CACHE_TTL_SECONDS has passed.
+
+When a user has several plans with the same week_number, the newest week
+is used.
+"""
+from typing import List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models.exercise import Exercise
+from app.models.nutrition_plan import Meal, NutritionDay, NutritionPlan, NutritionWeek
+from app.models.workout_plan import WorkoutDay, WorkoutDayExercise, WorkoutPlan, WorkoutWeek
+
+
+MAX_WEEK_NUMBER = 12
+
+# (user_id, week_table, week_number) -> options
+week_options = LRUCache(settings.FEEDBACK_OPTIONS_CACHE_SIZE)
+
+
+async def exercise_options(db: AsyncSession, user_id: int, week_number: int) -> Optional[List[dict]]:
+    """Distinct exercises of the user's workout week, or None if there is no such week"""
+    week_id = select(func.max(WorkoutWeek.week_id)).join(WorkoutWeek.workout_plan).where(
+        WorkoutPlan.user_id == user_id,
+        WorkoutWeek.week_number == week_number
+    ).scalar_subquery()
+
+    rows = (await db.execute(
+        select(Exercise.exercise_id, Exercise.name_fa, Exercise.name_en)
+        .select_from(WorkoutWeek)
+        .outerjoin(WorkoutDay, WorkoutDay.week_id == WorkoutWeek.week_id)
+        .outerjoin(WorkoutDayExercise, WorkoutDayExercise.day_id == WorkoutDay.day_id)
+        .outerjoin(Exercise, Exercise.exercise_id == WorkoutDayExercise.exercise_id)
+        .where(WorkoutWeek.week_id == week_id)
+        .distinct()
+        .order_by(Exercise.exercise_id)
+    )).all()
+
+    if not rows:
+        return None
+    return [
+        {"label": row.name_fa or row.name_en, "value": str(row.exercise_id)}
+        for row in rows if row.exercise_id is not None
+    ]
+
+
+async def meal_options(db: AsyncSession, user_id: int, week_number: int) -> Optional[List[dict]]:
+    """Distinct meal names of the user's nutrition week, or None if there is no such week"""
+    week_id = select(func.max(NutritionWeek.week_id)).join(NutritionWeek.plan).where(
+        NutritionPlan.user_id == user_id,
+        NutritionWeek.week_number == week_number
+    ).scalar_subquery()
+
+    names = (await db.scalars(
+        select(Meal.name)
+        .select_from(NutritionWeek)
+        .outerjoin(NutritionDay, NutritionDay.week_id == NutritionWeek.week_id)
+        .outerjoin(Meal, Meal.day_id == NutritionDay.day_id)
+        .where(NutritionWeek.week_id == week_id)
+        .distinct()
+        .order_by(Meal.name)
+    )).all()
+
+    if not names:
+        return None
+    return [{"label": name, "value": name} for name in names if name is not None]
+
+
+async def get_week_options(db: AsyncSession, user_id: int, week_table: str, week_number: int) -> Optional[List[dict]]:
+    """Cached options for a (user, week); None if the user has no such week"""
+    key = (user_id, week_table, week_number)
+    options = week_options.get(key)
+    if options is not None:
+        return options
+
+    if week_table == "workout_weeks":
+        options = await exercise_options(db, user_id, week_number)
+    else:
+        options = await meal_options(db, user_id, week_number)
+
+    if options is not None:
+        week_options.set(key, options, ttl=settings.FEEDBACK_OPTIONS_CACHE_TTL_SECONDS)
+    return options
+
+
+def invalidate_week_options(user_id: int, week_table: str):
+    """Drop a user's cached options after one of their plans changed"""
+    for week_number in range(1, MAX_WEEK_NUMBER + 1):
+        week_options.pop((user_id, week_table, week_number))
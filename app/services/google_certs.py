@@ -0,0 +1,145 @@
+"""
+Google ID token verification with cached signing certificates
+
+google.oauth2.id_token.verify_oauth2_token downloads Google's certificate
+set on every call. Here the set is fetched once over a pooled httpx client
+and kept for as long as the response's Cache-Control max-age allows (minus
+Age). A background task refetches it GOOGLE_CERTS_REFRESH_MARGIN_SECONDS
+before it expires, so logins never wait on the download. Signatures are
+then checked locally.
+
+A token signed with a key id missing from the cached set (Google rotated
+keys early) triggers one immediate refetch, at most once every
+MIN_FORCED_REFRESH_SECONDS.
+"""
+import asyncio
+import re
+import time
+from typing import Dict, Optional
+
+import httpx
+from google.auth import jwt
+
+from app.core.config import settings
+
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+DEFAULT_TTL_SECONDS = 3600  # when the response has no usable max-age
+MIN_FORCED_REFRESH_SECONDS = 60
+RETRY_SECONDS = 30
+
+
+def cache_ttl(response: httpx.Response) -> int:
+    """Seconds a certs response may be cached, from Cache-Control and Age"""
+    cache_control = response.headers.get("cache-control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    if not match:
+        return DEFAULT_TTL_SECONDS
+    age = response.headers.get("age", "0")
+    return max(int(match.group(1)) - (int(age) if age.isdigit() else 0), 0)
+
+
+class GoogleCertCache:
+    """Google's ID token signing certs, cached and refreshed in the background"""
+
+    def __init__(self, certs_url: str, refresh_margin: float):
+        self.certs_url = certs_url
+        self.refresh_margin = refresh_margin
+        # httpx transport override (tests)
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+
+        self.certs: Dict[str, str] = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self.client: Optional[httpx.AsyncClient] = None
+        self.lock: Optional[asyncio.Lock] = None
+        self.task: Optional[asyncio.Task] = None
+        self.counters = {"fetches": 0, "fetch_errors": 0, "forced_refreshes": 0, "verified": 0, "rejected": 0}
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=5.0), transport=self.transport)
+            self.lock = asyncio.Lock()
+        return self.client
+
+    def start(self):
+        """Fetch the certs now and keep them fresh (idempotent)"""
+        if self.task is None:
+            self._client()
+            self.task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def refresh(self) -> Dict[str, str]:
+        """Download the cert set (one download at a time)"""
+        client = self._client()
+        requested = time.time()
+        async with self.lock:
+            # Another caller refreshed while we waited
+            if self.fetched_at >= requested and self.certs:
+                return self.certs
+            try:
+                response = await client.get(self.certs_url)
+                response.raise_for_status()
+                certs = response.json()
+            except (httpx.HTTPError, ValueError):
+                self.counters["fetch_errors"] += 1
+                raise
+            self.certs = certs
+            self.fetched_at = time.time()
+            self.expires_at = self.fetched_at + cache_ttl(response)
+            self.counters["fetches"] += 1
+            return certs
+
+    async def get_certs(self) -> Dict[str, str]:
+        if self.certs and time.time() < self.expires_at:
+            return self.certs
+        return await self.refresh()
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+                delay = max(self.expires_at - time.time() - self.refresh_margin, RETRY_SECONDS)
+            except Exception as e:
+                print(f"Error fetching Google certs: {e}")
+                delay = RETRY_SECONDS
+            await asyncio.sleep(delay)
+
+    async def verify(self, token: str, audience: str) -> dict:
+        """Decode and verify a Google ID token; raises ValueError if invalid"""
+        certs = await self.get_certs()
+        kid = jwt.decode_header(token).get("kid")
+        if kid not in certs and time.time() - self.fetched_at > MIN_FORCED_REFRESH_SECONDS:
+            self.counters["forced_refreshes"] += 1
+            self.expires_at = 0
+            certs = await self.refresh()
+
+        try:
+            idinfo = jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=10)
+            if idinfo.get("iss") not in GOOGLE_ISSUERS:
+                raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+        except ValueError:
+            self.counters["rejected"] += 1
+            raise
+        self.counters["verified"] += 1
+        return idinfo
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "keys": len(self.certs),
+            "expires_in_seconds": round(max(self.expires_at - time.time(), 0)),
+        }
+
+
+google_cert_cache = GoogleCertCache(settings.GOOGLE_CERTS_URL, settings.GOOGLE_CERTS_REFRESH_MARGIN_SECONDS)
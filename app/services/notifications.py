@@ -0,0 +1,262 @@
+"""
+Outbound SMS and email
+
+Messages are queued and sent by background workers, so endpoints return as
+soon as a message is queued instead of waiting on Twilio or SendGrid. The
+verification code itself is committed to the database before its message
+is queued; if a message is lost (restart, provider failure) the user asks
+for a new code.
+
+Each provider has its own queue and `concurrency` workers, which caps the
+requests in flight per provider and keeps a slow SMS provider from holding
+up email. Both providers are called over their REST APIs with one pooled
+httpx client. 429/5xx responses and network errors are retried with
+exponential backoff up to NOTIFICATION_MAX_ATTEMPTS; other 4xx responses
+(bad number, bad address) are not.
+
+`MockProvider` stands in for a provider without credentials, or for both
+when NOTIFICATION_MOCK is set (load tests): it records messages and can
+simulate latency and failures.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+
+class DeliveryError(Exception):
+    """A provider refused or failed a message"""
+
+    def __init__(self, message: str, retryable: bool):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+@dataclass
+class Notification:
+    channel: str  # "sms" or "email"
+    to: str
+    body: str
+    subject: Optional[str] = None
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+def _raise_for_response(provider: str, response: httpx.Response):
+    if response.status_code < 300:
+        return
+    retryable = response.status_code == 429 or response.status_code >= 500
+    raise DeliveryError(f"{provider} HTTP {response.status_code}: {response.text[:200]}", retryable)
+
+
+class TwilioProvider:
+    """SMS through the Twilio Messages API"""
+    name = "twilio"
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, concurrency: int):
+        self.url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.auth = (account_sid, auth_token)
+        self.from_number = from_number
+        self.concurrency = concurrency
+
+    async def send(self, client: httpx.AsyncClient, notification: Notification):
+        response = await client.post(
+            self.url,
+            data={"To": notification.to, "From": self.from_number, "Body": notification.body},
+            auth=self.auth
+        )
+        _raise_for_response(self.name, response)
+
+
+class SendGridProvider:
+    """Email through the SendGrid v3 mail/send API"""
+    name = "sendgrid"
+    url = "https://api.sendgrid.com/v3/mail/send"
+
+    def __init__(self, api_key: str, from_address: str, from_name: str, concurrency: int):
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.sender = {"email": from_address, "name": from_name}
+        self.concurrency = concurrency
+
+    async def send(self, client: httpx.AsyncClient, notification: Notification):
+        response = await client.post(
+            self.url,
+            headers=self.headers,
+            json={
+                "personalizations": [{"to": [{"email": notification.to}]}],
+                "from": self.sender,
+                "subject": notification.subject,
+                "content": [{"type": "text/html", "value": notification.body}]
+            }
+        )
+        _raise_for_response(self.name, response)
+
+
+class MockProvider:
+    """Records messages instead of sending them"""
+
+    def __init__(self, name: str, concurrency: int, latency: float = 0.0, failure_rate: float = 0.0, log: bool = True):
+        self.name = name
+        self.concurrency = concurrency
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.log = log
+        self.sent = deque(maxlen=1000)
+
+    async def send(self, client: httpx.AsyncClient, notification: Notification):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise DeliveryError(f"{self.name} simulated failure", retryable=True)
+        self.sent.append(notification)
+        if self.log:
+            print(f"[{notification.channel.upper()} MOCK] Would send to {notification.to}: {notification.subject or notification.body}")
+
+
+class NotificationDispatcher:
+    """Per-provider queues and workers for outbound SMS/email"""
+
+    def __init__(self, providers: Dict[str, object], queue_size: int, max_attempts: int, retry_delay: float = 1.0):
+        self.providers = providers
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay  # doubled after every failed attempt
+        # httpx transport override (tests)
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+
+        # Created in start(), on the running event loop
+        self.client: Optional[httpx.AsyncClient] = None
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.workers = []
+        self.closed = False
+        self.counters = {
+            channel: {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "dropped": 0}
+            for channel in providers
+        }
+
+    def start(self):
+        """Create the client, queues and workers (idempotent)"""
+        if self.workers:
+            return
+        self.closed = False
+        connections = sum(provider.concurrency for provider in self.providers.values())
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(15.0, connect=5.0),
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            transport=self.transport
+        )
+        for channel, provider in self.providers.items():
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            self.queues[channel] = queue
+            self.workers += [
+                asyncio.create_task(self._worker(channel, queue))
+                for _ in range(provider.concurrency)
+            ]
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give queued messages a moment to go out, then shut down"""
+        if not self.workers:
+            return
+        self.closed = True
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.queues.values())), drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Notification dispatcher stopping with {self.queued()} unsent messages")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.queues = {}
+        await self.client.aclose()
+
+    def enqueue(self, channel: str, to: str, body: str, subject: Optional[str] = None) -> bool:
+        """Queue a message; False if the channel's queue is full"""
+        return self._put(Notification(channel=channel, to=to, body=body, subject=subject))
+
+    def _put(self, notification: Notification) -> bool:
+        counters = self.counters[notification.channel]
+        if self.closed:
+            counters["dropped"] += 1
+            return False
+        self.start()
+        try:
+            self.queues[notification.channel].put_nowait(notification)
+        except asyncio.QueueFull:
+            counters["dropped"] += 1
+            print(f"{notification.channel} queue full, dropping message to {notification.to}")
+            return False
+        counters["enqueued"] += 1
+        return True
+
+    async def _worker(self, channel: str, queue: asyncio.Queue):
+        provider = self.providers[channel]
+        counters = self.counters[channel]
+        while True:
+            notification = await queue.get()
+            try:
+                notification.attempts += 1
+                await provider.send(self.client, notification)
+                counters["sent"] += 1
+            except Exception as e:
+                retryable = isinstance(e, httpx.HTTPError) or getattr(e, "retryable", False)
+                if retryable and notification.attempts < self.max_attempts:
+                    counters["retried"] += 1
+                    delay = min(self.retry_delay * 2 ** (notification.attempts - 1), 60)
+                    asyncio.get_running_loop().call_later(delay, self._put, notification)
+                else:
+                    counters["failed"] += 1
+                    print(f"Error sending {channel} to {notification.to}: {e}")
+            finally:
+                queue.task_done()
+
+    def queued(self) -> int:
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    def stats(self) -> dict:
+        return {
+            channel: {
+                **self.counters[channel],
+                "provider": provider.name,
+                "queued": self.queues[channel].qsize() if channel in self.queues else 0,
+            }
+            for channel, provider in self.providers.items()
+        }
+
+
+def build_providers() -> Dict[str, object]:
+    """Real providers where credentials are configured, mocks otherwise"""
+    mock_latency = settings.NOTIFICATION_MOCK_LATENCY_MS / 1000
+    if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN and not settings.NOTIFICATION_MOCK:
+        sms = TwilioProvider(
+            settings.TWILIO_ACCOUNT_SID,
+            settings.TWILIO_AUTH_TOKEN,
+            settings.TWILIO_PHONE_NUMBER,
+            settings.SMS_CONCURRENCY
+        )
+    else:
+        sms = MockProvider("mock-sms", settings.SMS_CONCURRENCY, latency=mock_latency)
+
+    if settings.SENDGRID_API_KEY and not settings.NOTIFICATION_MOCK:
+        email = SendGridProvider(
+            settings.SENDGRID_API_KEY,
+            settings.EMAIL_FROM_ADDRESS,
+            settings.EMAIL_FROM_NAME,
+            settings.EMAIL_CONCURRENCY
+        )
+    else:
+        email = MockProvider("mock-email", settings.EMAIL_CONCURRENCY, latency=mock_latency)
+
+    return {"sms": sms, "email": email}
+
+
+notification_dispatcher = NotificationDispatcher(
+    build_providers(),
+    queue_size=settings.NOTIFICATION_QUEUE_SIZE,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS
+)
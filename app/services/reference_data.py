@@ -0,0 +1,237 @@
+"""
+Reference data
+
+Goals and the exercise lookup tables (difficulty, equipment, muscle, style,
+training_phase) are small seeded tables that almost never change. They are
+loaded once at startup and kept in memory:
+
+- the goal endpoints serve pre-serialized bodies with ETags (one list per
+  focus value plus the unfiltered list, one detail body per goal)
+- plan generation reads goal and equipment labels from memory instead of
+  querying them for every plan
+
+A background task compares a version fingerprint of the tables every
+REFERENCE_DATA_CHECK_SECONDS and reloads when it changed (on PostgreSQL an
+md5 over all rows, so edits in place are picked up too). `reload()` is the
+hook for forcing a reload in-process. To see what a load would contain:
+
+    python -m app.services.reference_data check
+"""
+import asyncio
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from pydantic import TypeAdapter
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.etag import CatalogEntry
+from app.database.session import AsyncSessionLocal, async_engine
+from app.models.exercise import Difficulty, Equipment, Muscle, Style, TrainingPhase
+from app.models.nutrition_goal import NutritionGoal
+from app.models.workout_goal import WorkoutGoal
+from app.schemas.goal import NutritionGoalResponse, WorkoutGoalResponse
+
+
+FOCUS_VALUES = ("performance_enhancement", "body_recomposition", "efficiency", "rebuilding_rehab")
+
+# (model, primary key column) for every table held in memory
+LOOKUPS = {
+    "difficulty": (Difficulty, Difficulty.difficulty_id),
+    "equipment": (Equipment, Equipment.equipment_id),
+    "muscle": (Muscle, Muscle.muscle_id),
+    "style": (Style, Style.style_id),
+    "training_phase": (TrainingPhase, TrainingPhase.phase_id),
+}
+GOALS = {
+    "workout": (WorkoutGoal, WorkoutGoal.workout_goal_id, WorkoutGoalResponse),
+    "nutrition": (NutritionGoal, NutritionGoal.nutrition_goal_id, NutritionGoalResponse),
+}
+
+TABLES = [(model.__tablename__, pk.name) for model, pk in LOOKUPS.values()] + [
+    (model.__tablename__, pk.name) for model, pk, _ in GOALS.values()
+]
+POSTGRES_VERSION = text("SELECT md5(concat_ws('|', " + ", ".join(
+    f"(SELECT coalesce(string_agg(t::text, ',' ORDER BY t.{pk}), '') FROM {table} t)"
+    for table, pk in TABLES
+) + "))")
+
+
+class Label(NamedTuple):
+    name_en: str
+    name_fa: str
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    lookups: Dict[str, Dict[int, Label]]  # table -> id -> names
+    goals: Dict[str, Dict[int, object]]  # "workout"/"nutrition" -> id -> response model
+    goal_lists: Dict[Tuple[str, Optional[str]], CatalogEntry]  # (kind, focus or None)
+    goal_details: Dict[Tuple[str, int], CatalogEntry]
+    version: str
+
+    @property
+    def workout_goals(self) -> Dict[int, WorkoutGoalResponse]:
+        return self.goals["workout"]
+
+    @property
+    def nutrition_goals(self) -> Dict[int, NutritionGoalResponse]:
+        return self.goals["nutrition"]
+
+    def names_fa(self, table: str, ids: List[int]) -> List[str]:
+        """Farsi names for the ids that exist, in the given order"""
+        labels = self.lookups[table]
+        return [labels[id_].name_fa for id_ in ids if id_ in labels]
+
+
+def build_reference_data(lookup_rows: Dict[str, list], goal_rows: Dict[str, list], version: str) -> ReferenceData:
+    """Index lookups by id and serialize every goal response"""
+    goals: Dict[str, Dict[int, object]] = {}
+    goal_lists: Dict[Tuple[str, Optional[str]], CatalogEntry] = {}
+    goal_details: Dict[Tuple[str, int], CatalogEntry] = {}
+    for kind, (_, pk, schema) in GOALS.items():
+        models = sorted(
+            (schema.model_validate(row) for row in goal_rows[kind]),
+            key=lambda goal: (goal.focus, goal.goal_key)
+        )
+        as_list = TypeAdapter(List[schema])
+        goals[kind] = {getattr(goal, pk.key): goal for goal in models}
+        goal_lists[(kind, None)] = CatalogEntry.of_body(as_list.dump_json(models))
+        for focus in FOCUS_VALUES:
+            goal_lists[(kind, focus)] = CatalogEntry.of_body(
+                as_list.dump_json([goal for goal in models if goal.focus == focus])
+            )
+        for goal_id, goal in goals[kind].items():
+            goal_details[(kind, goal_id)] = CatalogEntry.of(goal)
+
+    lookups: Dict[str, Dict[int, Label]] = {}
+    for table, rows in lookup_rows.items():
+        pk = LOOKUPS[table][1]
+        lookups[table] = {getattr(row, pk.key): Label(row.name_en, row.name_fa) for row in rows}
+
+    return ReferenceData(
+        lookups=lookups,
+        goals=goals,
+        goal_lists=goal_lists,
+        goal_details=goal_details,
+        version=version
+    )
+
+
+async def tables_version(db: AsyncSession) -> str:
+    """Fingerprint of the reference tables that changes whenever their rows do"""
+    conn = await db.connection()
+    if conn.dialect.name == "postgresql":
+        return await db.scalar(POSTGRES_VERSION)
+    # Other databases (SQLite in tests): inserts and deletes only
+    parts = []
+    for model, pk in LOOKUPS.values():
+        parts.extend((await db.execute(select(func.count(pk), func.max(pk)))).one())
+    for model, pk, _ in GOALS.values():
+        parts.extend((await db.execute(select(func.count(pk), func.max(pk), func.max(model.created_at)))).one())
+    return ":".join(str(value) for value in parts)
+
+
+class ReferenceDataCache:
+    """In-memory goals and lookups, reloaded when the tables change"""
+
+    def __init__(self, check_interval: float, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.check_interval = check_interval
+        self.session_factory = session_factory
+        self.data: Optional[ReferenceData] = None
+        self.loaded_at = 0.0
+        self.lock: Optional[asyncio.Lock] = None
+        self.task: Optional[asyncio.Task] = None
+        self.counters = {"loads": 0, "checks": 0, "failures": 0}
+
+    def start(self):
+        """Load the tables and keep checking their version (idempotent)"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+    async def load(self, db: AsyncSession, force: bool = False) -> ReferenceData:
+        """(Re)load if the tables' version changed (one load at a time)"""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            version = await tables_version(db)
+            if self.data is not None and self.data.version == version and not force:
+                return self.data
+            lookup_rows = {
+                table: (await db.scalars(select(model))).all()
+                for table, (model, _) in LOOKUPS.items()
+            }
+            goal_rows = {
+                kind: (await db.scalars(select(model))).all()
+                for kind, (model, _, _) in GOALS.items()
+            }
+            self.data = build_reference_data(lookup_rows, goal_rows, version)
+            self.loaded_at = time.time()
+            self.counters["loads"] += 1
+            return self.data
+
+    async def get(self, db: AsyncSession) -> ReferenceData:
+        """The current data, loading it with `db` if startup could not"""
+        if self.data is not None:
+            return self.data
+        return await self.load(db)
+
+    async def check(self):
+        """Reload if the reference tables changed since the last load"""
+        self.counters["checks"] += 1
+        async with self.session_factory() as db:
+            await self.load(db)
+
+    async def reload(self):
+        """Refresh hook: reload now, whatever the version says"""
+        async with self.session_factory() as db:
+            await self.load(db, force=True)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                self.counters["failures"] += 1
+                print(f"Error loading reference data: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def clear(self):
+        self.data = None
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "version": self.data.version if self.data else None,
+            "loaded_seconds_ago": round(time.time() - self.loaded_at) if self.data else None,
+        }
+
+
+reference_data = ReferenceDataCache(settings.REFERENCE_DATA_CHECK_SECONDS)
+
+
+async def _main(command: str):
+    if command == "check":
+        await reference_data.reload()
+        data = reference_data.data
+        print(f"Reference data version {data.version}: " + ", ".join(
+            [f"{len(rows)} {table}" for table, rows in data.lookups.items()]
+            + [f"{len(goals)} {kind} goals" for kind, goals in data.goals.items()]
+        ))
+    else:
+        raise SystemExit("Usage: python -m app.services.reference_data check")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else ""))
@@ -0,0 +1,299 @@
+"""
+Telegram Bot API sender
+
+Outbound messages go through a queue drained by a few worker tasks that
+share one pooled httpx client (no TLS handshake per message).
+
+Sending respects Telegram's limits with token buckets: one for the bot as a
+whole (TELEGRAM_RATE_PER_SECOND) and one per chat (TELEGRAM_CHAT_RATE_PER_SECOND).
+Workers never wait on a chat's bucket: a message for a chat that is out of
+tokens is parked in that chat's own line and put back on the queue when its
+token is due, so a burst to one chat doesn't hold up the others.
+
+A 429 response's `retry_after` pauses all workers until it elapses; the
+message goes back on the queue. Network errors and 5xx responses are retried
+with backoff up to TELEGRAM_MAX_ATTEMPTS.
+
+`enqueue()` returns immediately, so webhook handlers don't wait on Telegram.
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+import httpx
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def try_acquire(self) -> float:
+        """Take a token without waiting; 0 if taken, else seconds until one is available"""
+        self._refill()
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        return 0.0
+
+
+@dataclass
+class OutboundMessage:
+    chat_id: int
+    payload: dict
+    method: str = "sendMessage"
+    attempts: int = 0
+    # Already took its chat's token (put back from the chat's line)
+    chat_cleared: bool = False
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class TelegramSender:
+    """Queued, rate-limited sender for Telegram Bot API calls"""
+
+    def __init__(
+        self,
+        bot_token: str,
+        workers: int,
+        queue_size: int,
+        rate_per_second: float,
+        chat_rate_per_second: float,
+        max_attempts: int
+    ):
+        self.base_url = f"https://api.telegram.org/bot{bot_token}/"
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.rate_per_second = rate_per_second
+        self.chat_rate_per_second = chat_rate_per_second
+        self.max_attempts = max_attempts
+        self.paused_until = 0.0
+        # httpx transport override (tests)
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+
+        # Created in start(), on the running event loop
+        self.client: Optional[httpx.AsyncClient] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.bot_bucket: Optional[TokenBucket] = None
+        self.chat_buckets: Optional[LRUCache] = None
+        # Messages waiting on their chat's bucket, by chat, in send order
+        self.chat_pending: Dict[int, Deque[OutboundMessage]] = {}
+        self.workers = []
+        self.closed = False
+        self.counters = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "rate_limited": 0,
+            "dropped": 0,
+            "deferred": 0,
+        }
+
+    def start(self):
+        """Create the client, queue and workers (idempotent)"""
+        if self.workers:
+            return
+        self.closed = False
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=self.worker_count, max_keepalive_connections=self.worker_count),
+            transport=self.transport
+        )
+        self.bot_bucket = TokenBucket(self.rate_per_second, self.rate_per_second)
+        self.chat_buckets = LRUCache(10000)
+        self.chat_pending = {}
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give queued messages a moment to go out, then shut down"""
+        if not self.workers:
+            return
+        self.closed = True
+        try:
+            await asyncio.wait_for(self._drain(), drain_timeout)
+        except asyncio.TimeoutError:
+            unsent = self.queue.qsize() + sum(len(pending) for pending in self.chat_pending.values())
+            print(f"Telegram sender stopping with {unsent} unsent messages")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.chat_pending = {}
+        await self.client.aclose()
+
+    async def _drain(self):
+        """Wait until the queue and the per-chat lines are empty"""
+        while True:
+            await self.queue.join()
+            if not self.chat_pending:
+                return
+            await asyncio.sleep(0.05)
+
+    def enqueue(self, chat_id: int, text: str, reply_markup: dict = None, parse_mode: str = "Markdown") -> bool:
+        """Queue a text message; False if the queue is full"""
+        payload = {"chat_id": chat_id, "text": text, "parse_mode": parse_mode}
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+        return self._put(OutboundMessage(chat_id=chat_id, payload=payload))
+
+    def _put(self, message: OutboundMessage, draining: bool = False) -> bool:
+        if self.closed and not draining:
+            self.counters["dropped"] += 1
+            return False
+        self.start()
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+            print(f"Telegram queue full, dropping message to chat {message.chat_id}")
+            return False
+        self.counters["enqueued"] += 1
+        return True
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate_per_second, 1)
+            self.chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    def _defer_for_chat(self, message: OutboundMessage) -> bool:
+        """
+        Park the message if its chat is out of tokens (or already has
+        messages waiting, to keep the chat's order); True if parked
+        """
+        pending = self.chat_pending.get(message.chat_id)
+        if pending is None:
+            wait = self._chat_bucket(message.chat_id).try_acquire()
+            if not wait:
+                return False
+            pending = self.chat_pending[message.chat_id] = deque()
+            asyncio.get_running_loop().call_later(wait, self._release_chat, message.chat_id)
+        pending.append(message)
+        self.counters["deferred"] += 1
+        return True
+
+    def _release_chat(self, chat_id: int):
+        """Put the chat's next waiting message back on the queue once its token is available"""
+        pending = self.chat_pending.get(chat_id)
+        if pending is None:  # stopped meanwhile
+            return
+        loop = asyncio.get_running_loop()
+        wait = self._chat_bucket(chat_id).try_acquire()
+        if wait:
+            loop.call_later(wait, self._release_chat, chat_id)
+            return
+        message = pending.popleft()
+        if pending:
+            loop.call_later(1 / self.chat_rate_per_second, self._release_chat, chat_id)
+        else:
+            del self.chat_pending[chat_id]
+        message.chat_cleared = True
+        # Already accepted, so it still goes out while stop() drains
+        self._put(message, draining=True)
+
+    def _retry_later(self, message: OutboundMessage, delay: float):
+        self.counters["retried"] += 1
+        asyncio.get_running_loop().call_later(delay, self._put, message)
+
+    async def _worker(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                await self._deliver(message)
+            except Exception as e:
+                self.counters["failed"] += 1
+                print(f"Error sending Telegram message: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage):
+        # Per-chat first (keeps one chat's messages in order), then bot-wide
+        cleared, message.chat_cleared = message.chat_cleared, False
+        if not cleared and self._defer_for_chat(message):
+            return
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await self.bot_bucket.acquire()
+
+        message.attempts += 1
+        try:
+            response = await self.client.post(message.method, json=message.payload)
+        except httpx.HTTPError as e:
+            self._handle_failure(message, f"{type(e).__name__}: {e}")
+            return
+
+        if response.status_code == 200:
+            self.counters["sent"] += 1
+            return
+
+        if response.status_code == 429:
+            self.counters["rate_limited"] += 1
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+            except ValueError:
+                retry_after = 1
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self._retry_later(message, retry_after)
+            return
+
+        if response.status_code >= 500:
+            self._handle_failure(message, f"HTTP {response.status_code}")
+            return
+
+        # 4xx other than 429 (blocked bot, bad chat id, bad markup) won't succeed on retry
+        self.counters["failed"] += 1
+        print(f"Telegram rejected message to chat {message.chat_id}: {response.status_code} {response.text[:200]}")
+
+    def _handle_failure(self, message: OutboundMessage, error: str):
+        if message.attempts >= self.max_attempts:
+            self.counters["failed"] += 1
+            print(f"Giving up on Telegram message to chat {message.chat_id}: {error}")
+            return
+        self._retry_later(message, min(2 ** message.attempts, 30))
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "waiting_on_chat": sum(len(pending) for pending in self.chat_pending.values()),
+            "workers": len(self.workers),
+            "paused_for_seconds": round(max(self.paused_until - time.monotonic(), 0), 1),
+        }
+
+
+telegram_sender = TelegramSender(
+    settings.TELEGRAM_BOT_TOKEN,
+    workers=settings.TELEGRAM_SENDER_WORKERS,
+    queue_size=settings.TELEGRAM_QUEUE_SIZE,
+    rate_per_second=settings.TELEGRAM_RATE_PER_SECOND,
+    chat_rate_per_second=settings.TELEGRAM_CHAT_RATE_PER_SECOND,
+    max_attempts=settings.TELEGRAM_MAX_ATTEMPTS
+)
@@ -0,0 +1,163 @@
+"""
+Telegram identity resolution
+
+Mini-app opens, /login tokens and bot updates all start by mapping a
+telegram_id to a user, creating the user on first contact.
+
+- A bounded in-process map (telegram_id -> user_id) answers repeat logins
+  without touching the database. The mapping only changes when an account
+  is deleted; callers that load the user treat a missing row as a stale
+  entry (`forget_telegram_user`) and resolve again.
+- On a miss, PostgreSQL gets one statement: a CTE that returns the existing
+  user_id, or inserts the user (with its derived referral code) and the
+  telegram auth method and returns the new id. Two first contacts racing
+  are settled by ON CONFLICT (telegram_id).
+- Deleted accounts (deleted_at set, waiting to be purged) are never
+  resolved, even if their telegram_id hasn't been released.
+- Other databases (SQLite in tests), and the rare derived referral code
+  that collides with a legacy one, take the ORM path.
+
+`upsert_telegram_user` commits; call it before other writes in the session.
+"""
+import json
+from typing import Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.referral import assign_referral_code, referral_code_sql
+from app.database.loaders import get_user_profile, user_profile_options
+from app.models.auth_method import UserAuthMethod
+from app.models.user import User
+
+
+telegram_user_ids = LRUCache(settings.TELEGRAM_USER_MAP_SIZE)
+
+UPSERT_TELEGRAM_USER = text(f"""
+WITH existing AS (
+    SELECT user_id FROM users WHERE telegram_id = :telegram_id AND deleted_at IS NULL
+),
+new_user AS (
+    SELECT nextval(pg_get_serial_sequence('users', 'user_id')) AS user_id
+    WHERE NOT EXISTS (SELECT 1 FROM existing)
+),
+inserted AS (
+    INSERT INTO users (user_id, telegram_id, is_active, credits, has_used_referral, referral_code)
+    SELECT user_id, :telegram_id, true, 0, false, {referral_code_sql("new_user.user_id")}
+    FROM new_user
+    ON CONFLICT (telegram_id) DO NOTHING
+    RETURNING user_id
+),
+auth_method AS (
+    INSERT INTO user_auth_methods (user_id, auth_provider, auth_identifier, auth_data, is_verified, is_primary)
+    SELECT user_id, 'telegram', :auth_identifier, CAST(:auth_data AS json), true, true
+    FROM inserted
+    ON CONFLICT (auth_provider, auth_identifier) DO NOTHING
+)
+SELECT user_id, true AS created FROM inserted
+UNION ALL
+SELECT user_id, false AS created FROM existing
+""")
+
+
+async def _create_telegram_user(db: AsyncSession, telegram_id: int, auth_data: dict) -> Tuple[int, bool]:
+    """ORM path: look up, else create user + auth method"""
+    user_id = await db.scalar(select(User.user_id).where(User.telegram_id == telegram_id, User.deleted_at.is_(None)))
+    if user_id is not None:
+        return user_id, False
+
+    user = User(telegram_id=telegram_id, is_active=True)
+    db.add(user)
+    try:
+        await assign_referral_code(db, user)
+        db.add(UserAuthMethod(
+            user_id=user.user_id,
+            auth_provider="telegram",
+            auth_identifier=str(telegram_id),
+            auth_data=auth_data,
+            is_verified=True,
+            is_primary=True
+        ))
+        await db.commit()
+    except IntegrityError:
+        # Created concurrently by another request
+        await db.rollback()
+        user_id = await db.scalar(select(User.user_id).where(User.telegram_id == telegram_id, User.deleted_at.is_(None)))
+        if user_id is None:
+            # Some other conflict (e.g. a leftover telegram auth method); no user to return
+            raise
+        return user_id, False
+    return user.user_id, True
+
+
+async def upsert_telegram_user(db: AsyncSession, telegram_id: int, auth_data: dict) -> Tuple[int, bool]:
+    """(user_id, created) for a Telegram account, registering it if new"""
+    conn = await db.connection()
+    if conn.dialect.name == "postgresql":
+        try:
+            row = (await db.execute(UPSERT_TELEGRAM_USER, {
+                "telegram_id": telegram_id,
+                "auth_identifier": str(telegram_id),
+                "auth_data": json.dumps(auth_data)
+            })).first()
+        except IntegrityError:
+            # Derived referral code taken by a legacy code; the ORM path retries
+            await db.rollback()
+            row = None
+        if row is not None:
+            await db.commit()
+            return row.user_id, row.created
+        # Empty result: inserted concurrently after our snapshot
+
+    return await _create_telegram_user(db, telegram_id, auth_data)
+
+
+async def resolve_telegram_user(db: AsyncSession, telegram_id: int, auth_data: dict) -> Tuple[int, bool]:
+    """(user_id, created), from the in-memory map when possible"""
+    user_id = telegram_user_ids.get(telegram_id)
+    if user_id is not None:
+        return user_id, False
+
+    user_id, created = await upsert_telegram_user(db, telegram_id, auth_data)
+    telegram_user_ids.set(telegram_id, user_id)
+    return user_id, created
+
+
+async def load_telegram_user(db: AsyncSession, telegram_id: int, auth_data: dict) -> Tuple[User, bool]:
+    """Resolve, create if needed, and load the profile (goals, equipment)"""
+    user_id, created = await resolve_telegram_user(db, telegram_id, auth_data)
+    user = await get_user_profile(db, user_id)
+    if user is None:
+        # Account deleted since it was mapped
+        forget_telegram_user(telegram_id)
+        user_id, created = await resolve_telegram_user(db, telegram_id, auth_data)
+        user = await get_user_profile(db, user_id)
+    return user, created
+
+
+async def find_telegram_user(db: AsyncSession, telegram_id: int) -> Optional[User]:
+    """Existing user (with profile) for a telegram_id, or None"""
+    user_id = telegram_user_ids.get(telegram_id)
+    if user_id is not None:
+        user = await get_user_profile(db, user_id)
+        if user is not None:
+            return user
+        forget_telegram_user(telegram_id)
+
+    user = await db.scalar(
+        select(User).options(*user_profile_options()).where(
+            User.telegram_id == telegram_id, User.deleted_at.is_(None)
+        )
+    )
+    if user is not None:
+        telegram_user_ids.set(telegram_id, user.user_id)
+    return user
+
+
+def forget_telegram_user(telegram_id: Optional[int]):
+    """Drop a mapping (account deleted)"""
+    if telegram_id is not None:
+        telegram_user_ids.pop(telegram_id)
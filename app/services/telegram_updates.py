@@ -0,0 +1,196 @@
+"""
+Telegram webhook update processing
+
+The webhook only validates, de-duplicates and enqueues; updates are handled
+here by a pool of workers. Each chat is routed to one worker (chat_id modulo
+the pool size), so a chat's updates are processed in the order Telegram sent
+them while different chats proceed in parallel.
+
+Telegram re-delivers an update when the webhook is slow or fails, so recently
+seen update_ids are remembered (bounded) and repeats are dropped. The set is
+per process.
+"""
+import asyncio
+import secrets
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal
+from app.models.verification_code import VerificationCode
+from app.services.telegram import telegram_sender
+from app.services.telegram_identity import resolve_telegram_user
+
+
+async def handle_update(db: AsyncSession, update: dict):
+    """Handle one bot update (/start registers, /login issues a web login token)"""
+    message = update.get("message")
+    if not message:
+        return
+
+    telegram_user = message.get("from", {})
+    text = message.get("text", "")
+    chat_id = message.get("chat", {}).get("id")
+
+    telegram_id = str(telegram_user.get("id"))
+    username = telegram_user.get("username")
+    first_name = telegram_user.get("first_name", "User")
+
+    auth_data = {"username": username, "first_name": first_name}
+
+    # Handle /start command - register user
+    if text.startswith("/start"):
+        await resolve_telegram_user(db, int(telegram_id), auth_data)
+
+        # Send welcome message with web app button
+        telegram_sender.enqueue(
+            chat_id,
+            f"Welcome {first_name}! 🎉\n\n"
+            f"Choose how to access MovoAI:\n"
+            f"• Tap the button below to open the app directly\n"
+            f"• Or use /login to get a token for web browser",
+            reply_markup={
+                "inline_keyboard": [[
+                    {
+                        "text": "Open MovoAI App",
+                        "web_app": {"url": f"{settings.FRONTEND_URL}"}
+                    }
+                ]]
+            }
+        )
+
+    # Handle /login command - generate token
+    elif text.startswith("/login"):
+        await resolve_telegram_user(db, int(telegram_id), auth_data)
+
+        # Generate token
+        login_token = secrets.token_urlsafe(6)[:6].upper()
+
+        verification = VerificationCode(
+            identifier=telegram_id,
+            code=login_token,
+            code_type="telegram",
+            expires_at=datetime.utcnow() + timedelta(minutes=5)
+        )
+        db.add(verification)
+        await db.commit()
+
+        # Send token to user
+        telegram_sender.enqueue(
+            chat_id,
+            f"🔐 Your login token:\n\n"
+            f"`{login_token}`\n\n"
+            f"Enter this on {settings.FRONTEND_URL} within 5 minutes.\n"
+            f"This token can only be used once."
+        )
+
+
+def update_chat_id(update: dict) -> int:
+    """Chat an update belongs to (0 for updates without one)"""
+    for key in ("message", "edited_message", "callback_query", "my_chat_member"):
+        body = update.get(key)
+        if body:
+            chat = body.get("chat") or body.get("message", {}).get("chat") or {}
+            return chat.get("id") or 0
+    return 0
+
+
+class UpdateDispatcher:
+    """Per-chat ordered worker pool for webhook updates"""
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        dedup_size: int,
+        handler: Callable = handle_update,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ):
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.handler = handler
+        self.session_factory = session_factory
+        self.seen = LRUCache(dedup_size)
+        self.queues: List[asyncio.Queue] = []
+        self.workers: List[asyncio.Task] = []
+        self.counters = {
+            "accepted": 0,
+            "duplicates": 0,
+            "rejected": 0,
+            "processed": 0,
+            "failed": 0,
+        }
+
+    def start(self):
+        """Create queues and workers on the running loop (idempotent)"""
+        if self.workers:
+            return
+        self.queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.worker_count)]
+        self.workers = [asyncio.create_task(self._worker(queue)) for queue in self.queues]
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Finish queued updates (up to drain_timeout), then stop the workers"""
+        if not self.workers:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.queues)), drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Update dispatcher stopping with {self.queued()} unprocessed updates")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.queues = []
+
+    def submit(self, update: dict) -> Optional[bool]:
+        """
+        Queue an update for processing.
+        Returns True if queued, None if it is a duplicate, False if the
+        chat's queue is full (the caller should let Telegram retry).
+        """
+        update_id = update["update_id"]
+        if self.seen.get(update_id):
+            self.counters["duplicates"] += 1
+            return None
+
+        self.start()
+        queue = self.queues[update_chat_id(update) % self.worker_count]
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            return False
+
+        # Remember only accepted updates so a rejected one can be redelivered
+        self.seen.set(update_id, True)
+        self.counters["accepted"] += 1
+        return True
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                async with self.session_factory() as db:
+                    await self.handler(db, update)
+                self.counters["processed"] += 1
+            except Exception as e:
+                self.counters["failed"] += 1
+                print(f"Webhook error: {e}")
+            finally:
+                queue.task_done()
+
+    def queued(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def stats(self) -> dict:
+        return {**self.counters, "queued": self.queued(), "workers": len(self.workers)}
+
+
+update_dispatcher = UpdateDispatcher(
+    workers=settings.TELEGRAM_UPDATE_WORKERS,
+    queue_size=settings.TELEGRAM_UPDATE_QUEUE_SIZE,
+    dedup_size=settings.TELEGRAM_UPDATE_DEDUP_SIZE
+)
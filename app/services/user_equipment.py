@@ -0,0 +1,51 @@
+"""
+User home/gym equipment lists
+
+PUT /users/me replaces a user's equipment list. Instead of deleting every
+row and re-adding the list, the stored ids are diffed against the new list:
+removed ids go in one DELETE, added ids in one multi-row INSERT ... ON
+CONFLICT DO NOTHING (user_id, equipment_id is unique), and unchanged rows
+are left alone.
+"""
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import delete, literal_column, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user_equipment import UserGymEquipment, UserHomeEquipment
+
+
+async def user_equipment_ids(db: AsyncSession, user_id: int) -> Tuple[List[int], List[int]]:
+    """(home, gym) equipment ids for a user, in one query"""
+    rows = await db.execute(union_all(*[
+        select(literal_column(f"'{kind}'").label("kind"), model.equipment_id, model.user_equipment_id)
+        .where(model.user_id == user_id)
+        for kind, model in (("home", UserHomeEquipment), ("gym", UserGymEquipment))
+    ]).order_by(literal_column("user_equipment_id")))
+    ids = {"home": [], "gym": []}
+    for kind, equipment_id, _ in rows:
+        ids[kind].append(equipment_id)
+    return ids["home"], ids["gym"]
+
+
+async def set_user_equipment(db: AsyncSession, model, user_id: int, current: Iterable[int], equipment_ids: Iterable[int]) -> List[int]:
+    """Make `model` rows for the user match `equipment_ids`; returns the new list"""
+    wanted = list(dict.fromkeys(equipment_ids))
+    current = set(current)
+    removed = current.difference(wanted)
+    added = [equipment_id for equipment_id in wanted if equipment_id not in current]
+
+    if removed:
+        await db.execute(
+            delete(model).where(model.user_id == user_id, model.equipment_id.in_(removed))
+        )
+    if added:
+        conn = await db.connection()
+        insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+        await db.execute(
+            insert(model)
+            .values([{"user_id": user_id, "equipment_id": equipment_id} for equipment_id in added])
+            .on_conflict_do_nothing(index_elements=[model.user_id, model.equipment_id])
+        )
+    return wanted
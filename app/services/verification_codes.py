@@ -0,0 +1,356 @@
+"""
+Verification code lifecycle
+
+Every SMS/email code and Telegram /login token is a row in
+verification_codes, and nothing else ever removes them. The sweeper runs in
+the background and removes rows that expired more than
+VERIFICATION_CODE_RETENTION_HOURS ago, or moves them to
+verification_codes_archive when VERIFICATION_CODE_ARCHIVE is on.
+
+- Plain table: rows are deleted in batches of VERIFICATION_CODE_SWEEP_BATCH_SIZE,
+  one short transaction each, claimed with SKIP LOCKED so several workers
+  can sweep at once.
+- Partitioned table (daily ranges on created_at, see `partition_table`):
+  the next VERIFICATION_CODE_PARTITION_DAYS_AHEAD days of partitions are
+  created ahead of time, and a day's partition is dropped as a whole once
+  all of its codes are past retention. Only rows that landed in the default
+  partition (inserted while the sweeper was behind) are deleted row by row,
+  with the same SKIP LOCKED batches; when the day's partition is created
+  they are moved into it first, since PostgreSQL refuses to create a
+  partition whose range has rows in the default one.
+
+One-off runs:
+    python -m app.services.verification_codes sweep
+    python -m app.services.verification_codes partition   # convert once, in a quiet window
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import TableClause, column, delete, insert, select, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal, async_engine
+from app.models.verification_code import VerificationCode, VerificationCodeArchive
+
+
+TABLE = VerificationCode.__tablename__
+PARTITION_PREFIX = f"{TABLE}_p"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+# Telegram login tokens live 5 minutes; SMS/email use the configured expiry
+MAX_CODE_LIFETIME = timedelta(minutes=max(5, settings.CODE_EXPIRY_MINUTES_SMS, settings.CODE_EXPIRY_MINUTES_EMAIL))
+
+_COLUMNS = [column.name for column in VerificationCode.__table__.columns]
+
+# The default partition, for sweep_batch
+default_partition = table(DEFAULT_PARTITION, *[column(name) for name in _COLUMNS])
+
+
+def sweep_cutoff(retention_hours: int) -> datetime:
+    """Codes that expired before this are swept"""
+    return datetime.utcnow() - timedelta(hours=retention_hours)
+
+
+async def sweep_batch(
+    db: AsyncSession,
+    cutoff: datetime,
+    batch_size: int,
+    archive: bool = False,
+    source: Optional[TableClause] = None
+) -> int:
+    """
+    Remove (or archive) up to batch_size codes that expired before cutoff
+    from `source` (verification_codes, or one partition of it); commits
+    """
+    source = VerificationCode.__table__ if source is None else source
+    ids = (await db.scalars(
+        select(source.c.id)
+        .where(source.c.expires_at < cutoff)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if not ids:
+        await db.rollback()
+        return 0
+
+    if archive:
+        await db.execute(
+            insert(VerificationCodeArchive).from_select(
+                _COLUMNS,
+                select(*[source.c[name] for name in _COLUMNS]).where(source.c.id.in_(ids))
+            )
+        )
+    await db.execute(delete(source).where(source.c.id.in_(ids)))
+    await db.commit()
+    return len(ids)
+
+
+# =============== Partitioning (PostgreSQL) ===============
+def partition_name(day: datetime) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(await conn.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :table)"
+    ), {"table": TABLE}))
+
+
+async def list_partitions(conn: AsyncConnection) -> List[str]:
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table ORDER BY c.relname"
+    ), {"table": TABLE})
+    return [row[0] for row in result]
+
+
+async def ensure_partitions(conn: AsyncConnection, start: datetime, days_ahead: int) -> int:
+    """Create daily partitions from `start` through today + days_ahead; returns how many were new"""
+    existing = set(await list_partitions(conn))
+    day = datetime(start.year, start.month, start.day)
+    last = datetime.utcnow() + timedelta(days=days_ahead)
+    created = 0
+    while day <= last:
+        name = partition_name(day)
+        if name not in existing:
+            await create_partition(conn, name, day, DEFAULT_PARTITION in existing)
+            created += 1
+        day += timedelta(days=1)
+    return created
+
+
+async def create_partition(conn: AsyncConnection, name: str, day: datetime, has_default: bool):
+    """
+    Create one day's partition. Rows for that day sitting in the default
+    partition are moved into the new table before it is attached.
+    """
+    start, end = f"{day:%Y-%m-%d}", f"{day + timedelta(days=1):%Y-%m-%d}"
+    bounds = f"FROM ('{start}') TO ('{end}')"
+    # Same literals as the bounds, so both read them in the same time zone
+    in_range = f"created_at >= '{start}' AND created_at < '{end}'"
+
+    if not has_default or not await conn.scalar(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})")
+    ):
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES {bounds}"))
+        return
+
+    columns = ", ".join(_COLUMNS)
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING {columns}) "
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+    ))
+    # Attaching creates the parent's indexes on the new partition
+    await conn.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+
+
+async def drop_expired_partitions(conn: AsyncConnection, cutoff: datetime, archive: bool = False) -> int:
+    """Drop daily partitions whose codes all expired before cutoff; returns rows removed"""
+    removed = 0
+    for name in await list_partitions(conn):
+        if not name.startswith(PARTITION_PREFIX):
+            continue
+        day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d")
+        # Latest code in the partition was created before the next day starts
+        if day + timedelta(days=1) + MAX_CODE_LIFETIME >= cutoff:
+            continue
+
+        count = await conn.scalar(text(f"SELECT count(*) FROM {name}"))
+        if archive and count:
+            columns = ", ".join(_COLUMNS)
+            await conn.execute(text(
+                f"INSERT INTO {VerificationCodeArchive.__tablename__} ({columns}) "
+                f"SELECT {columns} FROM {name} ON CONFLICT (id) DO NOTHING"
+            ))
+        await conn.execute(text(f"DROP TABLE {name}"))
+        removed += count
+    return removed
+
+
+async def partition_table(conn: AsyncConnection, retention_hours: int, days_ahead: int, archive: bool = False):
+    """
+    Convert verification_codes into a table range-partitioned by day on created_at.
+    Only rows still within retention are copied (the rest are dropped or
+    archived), so this is quick however large the table has grown. Takes an
+    exclusive lock for the duration; run in one transaction.
+    """
+    if await is_partitioned(conn):
+        print(f"{TABLE} is already partitioned")
+        return
+
+    old = f"{TABLE}_unpartitioned"
+    cutoff = sweep_cutoff(retention_hours)
+    columns = ", ".join(_COLUMNS)
+
+    await conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+    await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+    # Keep the id sequence when the old table goes away
+    await conn.execute(text(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE"))
+    await conn.execute(text(
+        f"CREATE TABLE {TABLE} ("
+        f"id integer NOT NULL DEFAULT nextval('{TABLE}_id_seq'::regclass), "
+        "identifier character varying(255) NOT NULL, "
+        "code character varying(6) NOT NULL, "
+        "code_type character varying(10) NOT NULL, "
+        "expires_at timestamp with time zone NOT NULL, "
+        "attempts integer DEFAULT 0 NOT NULL, "
+        "verified boolean DEFAULT false NOT NULL, "
+        "created_at timestamp with time zone DEFAULT now() NOT NULL, "
+        "PRIMARY KEY (id, created_at)"
+        ") PARTITION BY RANGE (created_at)"
+    ))
+    await conn.execute(text(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id"))
+    # Catches inserts if the sweeper ever falls behind on creating partitions
+    await conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+
+    oldest = await conn.scalar(text(f"SELECT min(created_at) FROM {old} WHERE expires_at >= :cutoff"), {"cutoff": cutoff})
+    await ensure_partitions(conn, (oldest or datetime.utcnow()).replace(tzinfo=None), days_ahead)
+
+    await conn.execute(text(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {old} WHERE expires_at >= :cutoff"), {"cutoff": cutoff})
+    if archive:
+        await conn.execute(text(
+            f"INSERT INTO {VerificationCodeArchive.__tablename__} ({columns}) "
+            f"SELECT {columns} FROM {old} WHERE expires_at < :cutoff ON CONFLICT (id) DO NOTHING"
+        ), {"cutoff": cutoff})
+    await conn.execute(text(f"DROP TABLE {old}"))
+
+    # Indexes declared on the model, created on the parent (and so on every partition)
+    for index in VerificationCode.__table__.indexes:
+        await conn.run_sync(index.create)
+    print(f"{TABLE} is now partitioned by day")
+
+
+# =============== Sweeper ===============
+class VerificationCodeSweeper:
+    """Background task removing expired verification codes"""
+
+    def __init__(
+        self,
+        interval: float,
+        batch_size: int,
+        retention_hours: int,
+        archive: bool = False,
+        partition_days_ahead: int = 3,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retention_hours = retention_hours
+        self.archive = archive
+        self.partition_days_ahead = partition_days_ahead
+        self.session_factory = session_factory
+        self.task: Optional[asyncio.Task] = None
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration = 0.0
+        self.counters = {
+            "runs": 0,
+            "failures": 0,
+            "swept": 0,
+            "partitions_created": 0,
+        }
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+    async def run(self):
+        while True:
+            # First sweep one interval after startup, not during it
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                self.counters["failures"] += 1
+                print(f"Verification code sweep failed: {e}")
+
+    async def sweep_once(self) -> int:
+        """One full pass; returns how many codes were removed"""
+        started = time.monotonic()
+        cutoff = sweep_cutoff(self.retention_hours)
+        removed = 0
+
+        async with self.session_factory() as db:
+            conn = await db.connection()
+            if await is_partitioned(conn):
+                self.counters["partitions_created"] += await ensure_partitions(
+                    conn, datetime.utcnow(), self.partition_days_ahead
+                )
+                removed = await drop_expired_partitions(conn, cutoff, self.archive)
+                await db.commit()
+                removed += await self.sweep_batches(db, cutoff, default_partition)
+            else:
+                removed = await self.sweep_batches(db, cutoff)
+
+        self.counters["runs"] += 1
+        self.counters["swept"] += removed
+        self.last_run_at = datetime.utcnow()
+        self.last_duration = time.monotonic() - started
+        if removed:
+            print(f"Swept {removed} expired verification codes in {self.last_duration:.2f}s")
+        return removed
+
+    async def sweep_batches(self, db: AsyncSession, cutoff: datetime, source: Optional[TableClause] = None) -> int:
+        """sweep_batch until a batch comes back short; returns how many codes were removed"""
+        removed = 0
+        while True:
+            swept = await sweep_batch(db, cutoff, self.batch_size, self.archive, source)
+            removed += swept
+            if swept < self.batch_size:
+                return removed
+            # Let requests in between batches
+            await asyncio.sleep(0)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "running": self.task is not None,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_duration_seconds": round(self.last_duration, 3),
+        }
+
+
+verification_code_sweeper = VerificationCodeSweeper(
+    interval=settings.VERIFICATION_CODE_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.VERIFICATION_CODE_SWEEP_BATCH_SIZE,
+    retention_hours=settings.VERIFICATION_CODE_RETENTION_HOURS,
+    archive=settings.VERIFICATION_CODE_ARCHIVE,
+    partition_days_ahead=settings.VERIFICATION_CODE_PARTITION_DAYS_AHEAD
+)
+
+
+async def _main(command: str):
+    if command == "sweep":
+        removed = await verification_code_sweeper.sweep_once()
+        print(f"Removed {removed} expired verification codes")
+    elif command == "partition":
+        async with async_engine.begin() as conn:
+            await partition_table(
+                conn,
+                settings.VERIFICATION_CODE_RETENTION_HOURS,
+                settings.VERIFICATION_CODE_PARTITION_DAYS_AHEAD,
+                settings.VERIFICATION_CODE_ARCHIVE
+            )
+    else:
+        raise SystemExit("Usage: python -m app.services.verification_codes [sweep|partition]")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else ""))
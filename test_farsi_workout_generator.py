@@ -6,13 +6,19 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from sqlalchemy.orm import Session
-from app.database.session import SessionLocal
+import asyncio
+from app.database.session import AsyncSessionLocal
 from ai.workout_strategist import generate_workout_strategy
 from ai.workout_generator_farsi import generate_farsi_workout_plan
 import json
 
 
+async def run_plan_generator(profile):
+    """Run the async plan generator with its own database session"""
+    async with AsyncSessionLocal() as db:
+        return await generate_farsi_workout_plan(db, profile)
+
+
 def test_strategist_agent():
     """Test the Strategist Agent (12-week strategy generation)"""
     
@@ -111,9 +117,6 @@ def test_plan_generator(strategy_data):
     print(f"   روزهای تمرین: {test_profile['fitness_days']}")
     print("\n" + "-" * 80 + "\n")
     
-    # Create database session
-    db = SessionLocal()
-    
     try:
         # Generate week 1 plan
         print("🤖 در حال تولید برنامه هفته اول...")
@@ -127,7 +130,7 @@ def test_plan_generator(strategy_data):
         # - previous_week_plan (None for week 1)
         # - feedback (None for week 1)
         
-        result = generate_farsi_workout_plan(db, test_profile)
+        result = asyncio.run(run_plan_generator(test_profile))
         
         # Save to file
         output_file = "test_week1_plan_output.json"
@@ -184,8 +187,6 @@ def test_plan_generator(strategy_data):
         print(f"\n❌ خطا: {e}")
         import traceback
         traceback.print_exc()
-    finally:
-        db.close()
 
 
 def test_complete_workflow():
@@ -1,54 +1,178 @@
 """
 Test configuration and fixtures
 """
+import asyncio
+from typing import Dict, Iterable
+
 import pytest
+import pytest_asyncio
+from fastapi import Depends
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import (
+    JSON, Column, ForeignKey, Index, MetaData, Table, UniqueConstraint, create_engine, event
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.sqlite import JSON as SQLiteJSON
+from sqlalchemy.dialects.sqlite.pysqlite import SQLiteDialect_pysqlite
+from sqlalchemy.types import ARRAY
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from app.main import app
 from app.database.base import Base
+from app.database.replicas import get_read_db
 from app.database.session import get_db
+from app.dependencies import get_current_principal, get_current_user
+from app.core import principal
+from app.core.idempotency import plan_idempotency
+from app.core.principal import Principal
+from app.services import telegram_identity
+from app.services.feedback_catalog import feedback_catalog
+from app.services.feedback_options import week_options
+from app.services.reference_data import reference_data
 from app.models import *  # Import all models
+from app.models.user import User
 
 
-# Create in-memory SQLite database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# The test schema stores ARRAY columns as JSON (see sqlite_tables); have the
+# models' ARRAY columns read and write JSON there too (pysqlite and aiosqlite)
+SQLiteDialect_pysqlite.colspecs = {**SQLiteDialect_pysqlite.colspecs, ARRAY: SQLiteJSON}
+
+
+def sqlite_tables() -> Dict[type, Table]:
+    """
+    The whole schema as SQLite can create it, by model: ARRAY/JSONB columns
+    become JSON; server defaults, foreign keys, unique constraints and plain
+    unique indexes are kept (ON CONFLICT needs them). PostgreSQL-only check
+    constraints and partial indexes are left out.
+    """
+    metadata = MetaData()
+
+    def copy(column):
+        return Column(
+            column.name,
+            JSON() if isinstance(column.type, (ARRAY, JSONB)) else column.type,
+            *[ForeignKey(fk.target_fullname, ondelete=fk.ondelete) for fk in column.foreign_keys],
+            primary_key=column.primary_key,
+            nullable=column.nullable,
+            server_default=column.server_default.arg if column.server_default else None
+        )
+
+    def copy_table(table):
+        uniques = [
+            UniqueConstraint(*[column.name for column in constraint.columns], name=constraint.name)
+            for constraint in table.constraints if isinstance(constraint, UniqueConstraint)
+        ]
+        indexes = [
+            Index(index.name, *[column.name for column in index.columns], unique=True)
+            for index in table.indexes
+            if index.unique and not index.dialect_options["postgresql"].get("where")
+        ]
+        return Table(table.name, metadata, *[copy(column) for column in table.columns], *uniques, *indexes)
+
+    tables = {table.name: copy_table(table) for table in Base.metadata.sorted_tables}
+    return {mapper.class_: tables[mapper.local_table.name] for mapper in Base.registry.mappers}
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class SqliteDatabase:
+    """
+    A SQLite file with the whole schema. Seed it through `tables` (sync
+    engine); the app reaches it through `session_factory` (aiosqlite).
+    """
+
+    def __init__(self, path):
+        self.tables = sqlite_tables()
+        self.sync_engine = create_engine(f"sqlite:///{path}")
+        next(iter(self.tables.values())).metadata.create_all(self.sync_engine)
+
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        self.session_factory = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+    def enforce_foreign_keys(self):
+        """Make the app's connections enforce foreign keys (and ON DELETE CASCADE); call before using them"""
+        @event.listens_for(self.engine.sync_engine, "connect")
+        def _foreign_keys(dbapi_connection, _):
+            dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    def seed(self, model, rows: Iterable[dict]):
+        """Insert rows into a model's table (every row needs the same keys)"""
+        with self.sync_engine.begin() as conn:
+            conn.execute(self.tables[model].insert(), list(rows))
 
 
 @pytest.fixture
-def db_session():
-    """Create a fresh database for each test"""
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
+def sqlite_db(tmp_path):
+    """SQLite database for sync tests (TestClient)"""
+    db = SqliteDatabase(tmp_path / "test.db")
+    try:
+        yield db
+    finally:
+        db.sync_engine.dispose()
+        asyncio.run(db.engine.dispose())
+
+
+@pytest_asyncio.fixture
+async def async_sqlite_db(tmp_path):
+    """SQLite database for async tests"""
+    db = SqliteDatabase(tmp_path / "test.db")
     try:
         yield db
     finally:
-        db.close()
-        Base.metadata.drop_all(bind=engine)
+        db.sync_engine.dispose()
+        await db.engine.dispose()
+
+
+@pytest.fixture
+def db_session(sqlite_db):
+    """Async session factory bound to a fresh test database"""
+    return sqlite_db.session_factory
 
 
 @pytest.fixture
-def client(db_session):
-    """Create a test client with database override"""
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            pass
-    
+def api(db_session):
+    """
+    Test client whose get_db/get_read_db use the test database.
+    The app's lifespan (background workers) is not started.
+    """
+    async def override_get_db():
+        async with db_session() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
-    with TestClient(app) as test_client:
+    app.dependency_overrides[get_read_db] = override_get_db
+    # User ids repeat across per-test databases
+    for cache in (
+        principal.token_cache, principal.user_cache, principal.profile_cache,
+        principal.revoked_tokens, principal.revoked_users,
+        telegram_identity.telegram_user_ids, week_options
+    ):
+        cache.clear()
+    feedback_catalog.clear()
+    reference_data.clear()
+    plan_idempotency.clear()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def client(api):
+    """Test client with database override, running the app's lifespan"""
+    with api as test_client:
         yield test_client
-    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def login():
+    """login(user_id) authenticates later requests as that user, without tokens"""
+    def login_as(user_id: int):
+        async def current_user(db=Depends(get_db)):
+            return await db.get(User, user_id)
+
+        app.dependency_overrides[get_current_principal] = lambda: Principal(user_id=user_id, token_id=None, expires_at=0)
+        app.dependency_overrides[get_current_user] = current_user
+
+    return login_as
 
 
 @pytest.fixture
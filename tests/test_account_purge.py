@@ -0,0 +1,114 @@
+"""
+Tests for passive cascading deletes and the background account purge
+"""
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.principal import load_user
+from app.models.auth_method import UserAuthMethod
+from app.models.feedback import Feedback, FeedbackAnswerCount
+from app.models.nutrition_plan import NutritionPlan, NutritionWeek
+from app.models.user import User
+from app.models.user_equipment import UserHomeEquipment
+from app.models.workout_plan import WorkoutDay, WorkoutPlan, WorkoutWeek
+from app.services.account_purge import AccountPurger, purge_account
+
+
+@pytest_asyncio.fixture
+async def engine(async_sqlite_db):
+    async_sqlite_db.enforce_foreign_keys()
+    seed(async_sqlite_db)
+    return async_sqlite_db.engine
+
+
+def seed(db):
+    user = {"is_active": True, "credits": 0, "has_used_referral": False}
+    db.seed(User, [
+        {"user_id": 7, **user, "deleted_at": datetime.now(timezone.utc)},
+        {"user_id": 8, **user, "deleted_at": None},
+    ])
+    db.seed(UserAuthMethod, [
+        {"id": 1, "user_id": 8, "auth_provider": "sms", "auth_identifier": "+98", "is_verified": True, "is_primary": True},
+    ])
+    db.seed(UserHomeEquipment, [
+        {"user_equipment_id": 1, "user_id": 7, "equipment_id": 1},
+    ])
+    db.seed(WorkoutPlan, [
+        {"plan_id": plan_id, "user_id": 7 if plan_id <= 5 else 8, "name": "p", "total_weeks": 1}
+        for plan_id in range(1, 7)
+    ])
+    db.seed(WorkoutWeek, [
+        {"week_id": plan_id, "plan_id": plan_id, "week_number": 1} for plan_id in range(1, 7)
+    ])
+    db.seed(WorkoutDay, [
+        {"day_id": plan_id, "week_id": plan_id, "day_name": "d1"} for plan_id in range(1, 7)
+    ])
+    db.seed(NutritionPlan, [{"plan_id": 1, "user_id": 7, "name": "n", "total_weeks": 1}])
+    db.seed(NutritionWeek, [{"week_id": 1, "plan_id": 1, "week_number": 1}])
+    db.seed(Feedback, [
+        {"feedback_id": 1, "user_id": 7, "week_table": "workout_weeks", "week_id": 1, "responses": [{"question_id": 1, "answer": "good"}]},
+        {"feedback_id": 2, "user_id": 8, "week_table": "workout_weeks", "week_id": 6, "responses": [{"question_id": 1, "answer": "good"}]},
+    ])
+    db.seed(FeedbackAnswerCount, [{"question_id": 1, "answer": "good", "count": 2}])
+
+
+async def count(db, model, **filters) -> int:
+    query = select(func.count()).select_from(model)
+    for key, value in filters.items():
+        query = query.where(getattr(model, key) == value)
+    return await db.scalar(query)
+
+
+@pytest.mark.asyncio
+async def test_plan_delete_does_not_load_children(engine):
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    async with factory() as db:
+        plan = await db.get(WorkoutPlan, 6)
+        statements.clear()
+        await db.delete(plan)
+        await db.commit()
+
+        assert not any("workout_weeks" in statement or "workout_days" in statement for statement in statements)
+        assert await count(db, WorkoutWeek, plan_id=6) == 0
+        assert await count(db, WorkoutDay, week_id=6) == 0
+
+
+@pytest.mark.asyncio
+async def test_purge_account_in_batches(engine):
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with factory() as db:
+        # 5 workout plans in batches of 2, 1 nutrition plan, 1 feedback, the user
+        assert await purge_account(db, 7, batch_size=2) == 8
+
+    async with factory() as db:
+        assert await db.get(User, 7) is None
+        for model in (WorkoutPlan, NutritionPlan, Feedback, UserHomeEquipment):
+            assert await count(db, model, user_id=7) == 0
+        assert await count(db, WorkoutWeek) == 1
+        assert await count(db, NutritionWeek) == 0
+        assert await count(db, WorkoutPlan, user_id=8) == 1
+        assert await db.scalar(select(FeedbackAnswerCount.count)) == 1
+
+
+@pytest.mark.asyncio
+async def test_purger_pass_and_deleted_users_not_loaded(engine):
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with factory() as db:
+        assert await load_user(db, 7) is None
+        assert (await load_user(db, 8)).user_id == 8
+
+    purger = AccountPurger(interval=60, batch_size=50, session_factory=factory)
+    assert await purger.purge_once() == 1
+    assert await purger.purge_once() == 0
+    assert purger.stats()["accounts"] == 1
+
+    async with factory() as db:
+        assert await count(db, User) == 1
+        assert await count(db, UserAuthMethod) == 1
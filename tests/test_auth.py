@@ -17,7 +17,8 @@ def test_telegram_login_invalid_hash(client, sample_user_data):
         "hash": "invalid_hash"
     }
     
-    response = client.post("/api/v1/auth/telegram/login", json=telegram_data)
+    # Two body parameters (auth_request, user_data), so the body is embedded
+    response = client.post("/api/v1/auth/telegram/login", json={"auth_request": telegram_data})
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
@@ -0,0 +1,115 @@
+"""
+Tests for feedback answer rollups
+"""
+from collections import Counter
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.models.feedback import Feedback, FeedbackAnalyticsState, FeedbackAnswerCount
+from app.services.feedback_analytics import (
+    REBUILD_BATCH, answer_counts, rebuild, record_feedback_change, response_answers,
+)
+
+
+@pytest.fixture
+def session_factory(async_sqlite_db):
+    return async_sqlite_db.session_factory
+
+
+async def counts(session_factory) -> dict:
+    async with session_factory() as db:
+        rows = await db.execute(select(FeedbackAnswerCount))
+        return {
+            (row.question_id, row.answer): row.count
+            for row in rows.scalars() if row.count
+        }
+
+
+async def submit(session_factory, feedback_id, responses):
+    async with session_factory() as db:
+        db.add(Feedback(feedback_id=feedback_id, user_id=1, week_table="workout_weeks", week_id=feedback_id, responses=responses))
+        await db.flush()
+        await record_feedback_change(db, feedback_id, None, responses)
+        await db.commit()
+
+
+def test_response_answers_normalization():
+    responses = [
+        {"question_id": 1, "answer": "good", "text_response": "free text is not counted"},
+        {"question_id": "2", "answer": ["squat", "row", "squat"]},
+        {"question_id": 3, "answer": 4},
+        {"question_id": 3, "answer": True},
+        {"question_id": 4, "answer": None},
+        {"question_id": 5, "answer": {"nested": 1}},
+        {"question_id": "x", "answer": "ignored"},
+        "not an object",
+    ]
+    assert response_answers(responses) == Counter({
+        (1, "good"): 1,
+        (2, "squat"): 2,
+        (2, "row"): 1,
+        (3, "4"): 1,
+        (3, "true"): 1,
+    })
+    assert response_answers(None) == Counter()
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_submit_update_delete(session_factory):
+    await submit(session_factory, 1, [{"question_id": 1, "answer": "good"}, {"question_id": 2, "answer": ["a", "b"]}])
+    await submit(session_factory, 2, [{"question_id": 1, "answer": "good"}])
+    assert await counts(session_factory) == {(1, "good"): 2, (2, "a"): 1, (2, "b"): 1}
+
+    async with session_factory() as db:
+        feedback = await db.get(Feedback, 1)
+        new_responses = [{"question_id": 1, "answer": "bad"}, {"question_id": 2, "answer": ["b"]}]
+        await record_feedback_change(db, 1, feedback.responses, new_responses)
+        feedback.responses = new_responses
+        await db.commit()
+    assert await counts(session_factory) == {(1, "good"): 1, (1, "bad"): 1, (2, "b"): 1}
+
+    async with session_factory() as db:
+        feedback = await db.get(Feedback, 2)
+        await record_feedback_change(db, 2, feedback.responses, None)
+        await db.delete(feedback)
+        await db.commit()
+    assert await counts(session_factory) == {(1, "bad"): 1, (2, "b"): 1}
+
+    async with session_factory() as db:
+        distribution = await answer_counts(db, [1, 2, 3])
+    assert distribution == {1: [("bad", 1)], 2: [("b", 1)], 3: []}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_incremental_counts(session_factory):
+    for feedback_id in range(1, 6):
+        await submit(session_factory, feedback_id, [
+            {"question_id": 1, "answer": "good" if feedback_id % 2 else "bad"},
+            {"question_id": 2, "answer": ["a", str(feedback_id)]},
+        ])
+    maintained = await counts(session_factory)
+
+    assert await rebuild(session_factory, batch_size=2) == 5
+    assert await counts(session_factory) == maintained
+    async with session_factory() as db:
+        state = await db.get(FeedbackAnalyticsState, 1)
+    assert state.rebuild_through is None
+
+
+@pytest.mark.asyncio
+async def test_writes_ahead_of_a_rebuild_are_left_to_it(session_factory):
+    async with session_factory() as db:
+        db.add(FeedbackAnalyticsState(id=1, rebuild_through=1))
+        await db.commit()
+
+    await submit(session_factory, 1, [{"question_id": 1, "answer": "counted"}])
+    await submit(session_factory, 2, [{"question_id": 1, "answer": "skipped"}])
+    assert await counts(session_factory) == {(1, "counted"): 1}
+
+
+def test_rebuild_batch_compiles_for_postgresql():
+    sql = str(REBUILD_BATCH.compile(dialect=postgresql.dialect()))
+    assert "jsonb_array_elements" in sql
+    assert "%(after)s" in sql and "%(upto)s" in sql
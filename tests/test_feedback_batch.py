@@ -0,0 +1,71 @@
+"""
+Tests for batch feedback submission
+"""
+import asyncio
+
+from sqlalchemy import select
+
+from app.models.feedback import Feedback, FeedbackAnswerCount
+from app.models.nutrition_plan import NutritionPlan, NutritionWeek
+from app.models.workout_plan import WorkoutPlan, WorkoutWeek
+
+
+def test_batch_submission(api, sqlite_db, login):
+    sqlite_db.seed(WorkoutPlan, [
+        {"plan_id": 1, "user_id": 7, "name": "mine", "total_weeks": 1},
+        {"plan_id": 2, "user_id": 8, "name": "theirs", "total_weeks": 1},
+    ])
+    sqlite_db.seed(WorkoutWeek, [
+        {"week_id": 1, "plan_id": 1, "week_number": 1},
+        {"week_id": 2, "plan_id": 2, "week_number": 1},
+    ])
+    sqlite_db.seed(NutritionPlan, [{"plan_id": 1, "user_id": 7, "name": "mine", "total_weeks": 1}])
+    sqlite_db.seed(NutritionWeek, [{"week_id": 1, "plan_id": 1, "week_number": 1}])
+    sqlite_db.seed(Feedback, [
+        {"feedback_id": 50, "user_id": 7, "week_table": "nutrition_weeks", "week_id": 1, "responses": []}
+    ])
+    login(7)
+
+    responses = [{"question_id": 1, "answer": "good"}]
+    response = api.post("/api/v1/feedback/batch", json={"items": [
+        {"week_table": "workout_weeks", "week_id": 1, "responses": responses},
+        {"week_table": "workout_weeks", "week_id": 2, "responses": responses},
+        {"week_table": "nutrition_weeks", "week_id": 1, "responses": responses},
+        {"week_table": "workout_weeks", "week_id": 1, "responses": responses},
+        {"week_table": "nutrition_weeks", "week_id": 99, "responses": responses},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    created_id = body["results"][0]["feedback_id"]
+    assert [(r["status"], r["feedback_id"]) for r in body["results"]] == [
+        ("created", created_id),
+        ("not_found", None),
+        ("exists", 50),
+        ("exists", created_id),
+        ("not_found", None),
+    ]
+    assert body["created"] == 1
+
+    # Resubmitting is harmless
+    response = api.post("/api/v1/feedback/batch", json={"items": [
+        {"week_table": "workout_weeks", "week_id": 1, "responses": [{"question_id": 1, "answer": "bad"}]},
+    ]})
+    assert response.json()["results"][0] == {
+        "week_table": "workout_weeks", "week_id": 1, "status": "exists", "feedback_id": created_id
+    }
+
+    response = api.post("/api/v1/feedback", json={"week_table": "workout_weeks", "week_id": 1, "responses": responses})
+    assert response.status_code == 409
+
+    async def stored():
+        async with sqlite_db.session_factory() as db:
+            feedback = (await db.scalars(select(Feedback).order_by(Feedback.feedback_id))).all()
+            counts = (await db.execute(select(FeedbackAnswerCount.question_id, FeedbackAnswerCount.answer, FeedbackAnswerCount.count))).all()
+        return feedback, counts
+
+    feedback, counts = asyncio.run(stored())
+    assert [(f.feedback_id, f.week_table, f.week_id) for f in feedback] == [
+        (50, "nutrition_weeks", 1), (created_id, "workout_weeks", 1)
+    ]
+    assert feedback[1].responses == responses
+    assert counts == [(1, "good", 1)]
@@ -0,0 +1,118 @@
+"""
+Tests for the in-memory feedback question catalog
+"""
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete
+
+from app.models.feedback import FeedbackQuestion
+from app.schemas.feedback import FeedbackQuestionDetail
+from app.services.feedback_catalog import FeedbackQuestionCatalog
+
+
+def question(question_id, order, week_table="workout_weeks", week_number=1, focus="efficiency", **fields):
+    return FeedbackQuestion(
+        question_id=question_id,
+        week_table=week_table,
+        week_number=week_number,
+        focus=focus,
+        question_text=fields.get("question_text", f"Question {question_id}"),
+        question_type="radio",
+        options=[{"value": "yes", "label": "Yes"}],
+        allow_text=False,
+        question_order=order
+    )
+
+
+@pytest_asyncio.fixture
+async def session_factory(async_sqlite_db):
+    factory = async_sqlite_db.session_factory
+    async with factory() as db:
+        db.add_all([
+            question(1, order=2),
+            question(2, order=1),
+            question(3, order=1, week_table="nutrition_weeks", week_number=12, focus="rebuilding_rehab"),
+        ])
+        await db.commit()
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_catalog_serializes_every_combination(session_factory):
+    catalog = FeedbackQuestionCatalog(check_interval=60, session_factory=session_factory)
+    await catalog.check()
+
+    lists = catalog.catalog.lists
+    assert len(lists) == 2 * 12 * 4
+    body = json.loads(lists[("workout_weeks", 1, "efficiency")].body)
+    assert body["total"] == 2
+    assert [q["question_id"] for q in body["questions"]] == [2, 1]  # question_order
+    assert json.loads(lists[("workout_weeks", 2, "efficiency")].body) == {"questions": [], "total": 0}
+
+    async with session_factory() as db:
+        row = await db.get(FeedbackQuestion, 3)
+    detail = catalog.catalog.questions[3]
+    assert detail.body == FeedbackQuestionDetail.model_validate(row).model_dump_json().encode()
+    assert detail.etag != catalog.catalog.questions[1].etag
+
+
+@pytest.mark.asyncio
+async def test_check_reloads_only_when_table_changes(session_factory):
+    catalog = FeedbackQuestionCatalog(check_interval=60, session_factory=session_factory)
+    await catalog.check()
+    await catalog.check()
+    assert catalog.counters["loads"] == 1
+    etag = catalog.catalog.lists[("workout_weeks", 1, "efficiency")].etag
+
+    async with session_factory() as db:
+        db.add(question(4, order=3))
+        await db.commit()
+    await catalog.check()
+    assert catalog.counters["loads"] == 2
+    entry = catalog.catalog.lists[("workout_weeks", 1, "efficiency")]
+    assert json.loads(entry.body)["total"] == 3
+    assert entry.etag != etag
+
+    async with session_factory() as db:
+        await db.execute(delete(FeedbackQuestion).where(FeedbackQuestion.question_id == 4))
+        await db.commit()
+    await catalog.check()
+    assert 4 not in catalog.catalog.questions
+
+
+def test_endpoints_serve_catalog_with_etags(api, db_session, login, monkeypatch):
+    async def seed():
+        async with db_session() as db:
+            db.add_all([question(1, order=2), question(2, order=1), question(3, order=1, focus="rebuilding_rehab")])
+            await db.commit()
+
+    asyncio.run(seed())
+    catalog = FeedbackQuestionCatalog(check_interval=60, session_factory=db_session)
+    monkeypatch.setattr("app.api.v1.endpoints.feedback.feedback_catalog", catalog)
+    login(1)
+
+    params = {"week_table": "workout_weeks", "week_number": 1, "focus": "efficiency"}
+
+    response = api.get("/api/v1/feedback/questions", params=params)
+    assert response.status_code == 200
+    assert response.json()["total"] == 2
+    etag = response.headers["etag"]
+
+    response = api.get("/api/v1/feedback/questions", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = api.get("/api/v1/feedback/questions", params={**params, "week_number": 13})
+    assert response.status_code == 400
+
+    response = api.get("/api/v1/feedback/questions/3")
+    assert response.status_code == 200
+    assert response.json()["focus"] == "rebuilding_rehab"
+    assert response.headers["etag"] == catalog.catalog.questions[3].etag
+
+    assert api.get("/api/v1/feedback/questions/99").status_code == 404
+    # Loaded once, by the first request
+    assert catalog.counters["loads"] == 1
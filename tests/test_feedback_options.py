@@ -0,0 +1,106 @@
+"""
+Tests for feedback dynamic options (projection queries + per-week cache)
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete
+
+from app.models.exercise import Exercise
+from app.models.nutrition_plan import Meal, NutritionDay, NutritionPlan, NutritionWeek
+from app.models.workout_plan import WorkoutDay, WorkoutDayExercise, WorkoutPlan, WorkoutWeek
+from app.services import feedback_options
+from app.services.feedback_options import get_week_options, invalidate_week_options
+
+
+@pytest_asyncio.fixture
+async def session_factory(async_sqlite_db):
+    seed = async_sqlite_db.seed
+    seed(Exercise, [
+        {"exercise_id": 1, "name_en": "Squat", "name_fa": "اسکوات"},
+        {"exercise_id": 2, "name_en": "Plank", "name_fa": ""},
+        {"exercise_id": 3, "name_en": "Row", "name_fa": "زیربغل"},
+    ])
+    seed(WorkoutPlan, [
+        {"plan_id": 1, "user_id": 7, "name": "old", "total_weeks": 1},
+        {"plan_id": 2, "user_id": 7, "name": "new", "total_weeks": 1},
+        {"plan_id": 3, "user_id": 8, "name": "other", "total_weeks": 1},
+    ])
+    seed(WorkoutWeek, [
+        {"week_id": 1, "plan_id": 1, "week_number": 1},
+        {"week_id": 2, "plan_id": 2, "week_number": 1},
+        {"week_id": 3, "plan_id": 3, "week_number": 1},
+        {"week_id": 4, "plan_id": 2, "week_number": 2},
+    ])
+    seed(WorkoutDay, [
+        {"day_id": 1, "week_id": 1, "day_name": "d1"},
+        {"day_id": 2, "week_id": 2, "day_name": "d1"},
+        {"day_id": 3, "week_id": 2, "day_name": "d2"},
+        {"day_id": 4, "week_id": 3, "day_name": "d1"},
+    ])
+    seed(WorkoutDayExercise, [
+        {"workout_day_exercise_id": 1, "day_id": 1, "exercise_id": 3, "exercise_order": 1},
+        {"workout_day_exercise_id": 2, "day_id": 2, "exercise_id": 2, "exercise_order": 1},
+        {"workout_day_exercise_id": 3, "day_id": 2, "exercise_id": 1, "exercise_order": 2},
+        {"workout_day_exercise_id": 4, "day_id": 3, "exercise_id": 1, "exercise_order": 1},
+        {"workout_day_exercise_id": 5, "day_id": 4, "exercise_id": 3, "exercise_order": 1},
+    ])
+    seed(NutritionPlan, [
+        {"plan_id": 1, "user_id": 7, "name": "n", "total_weeks": 1},
+    ])
+    seed(NutritionWeek, [
+        {"week_id": 1, "plan_id": 1, "week_number": 1},
+    ])
+    seed(NutritionDay, [
+        {"day_id": 1, "week_id": 1, "day_name": "d1"},
+        {"day_id": 2, "week_id": 1, "day_name": "d2"},
+    ])
+    seed(Meal, [
+        {"meal_id": 1, "day_id": 1, "meal_type": "lunch", "name": "Salad"},
+        {"meal_id": 2, "day_id": 1, "meal_type": "dinner", "name": "Chicken"},
+        {"meal_id": 3, "day_id": 2, "meal_type": "lunch", "name": "Salad"},
+    ])
+    feedback_options.week_options.clear()
+    try:
+        yield async_sqlite_db.session_factory
+    finally:
+        feedback_options.week_options.clear()
+
+
+@pytest.mark.asyncio
+async def test_exercise_options_from_newest_week(session_factory):
+    async with session_factory() as db:
+        options = await get_week_options(db, 7, "workout_weeks", 1)
+    assert options == [
+        {"label": "اسکوات", "value": "1"},
+        {"label": "Plank", "value": "2"},  # no Farsi name
+    ]
+
+
+@pytest.mark.asyncio
+async def test_missing_and_empty_weeks(session_factory):
+    async with session_factory() as db:
+        assert await get_week_options(db, 7, "workout_weeks", 3) is None
+        assert await get_week_options(db, 9, "workout_weeks", 1) is None
+        assert await get_week_options(db, 7, "workout_weeks", 2) == []  # week without days
+        assert await get_week_options(db, 8, "nutrition_weeks", 1) is None
+
+
+@pytest.mark.asyncio
+async def test_meal_options_distinct_and_sorted(session_factory):
+    async with session_factory() as db:
+        options = await get_week_options(db, 7, "nutrition_weeks", 1)
+    assert options == [{"label": "Chicken", "value": "Chicken"}, {"label": "Salad", "value": "Salad"}]
+
+
+@pytest.mark.asyncio
+async def test_options_cached_until_plan_changes(session_factory):
+    async with session_factory() as db:
+        first = await get_week_options(db, 7, "nutrition_weeks", 1)
+        await db.execute(delete(Meal).where(Meal.name == "Chicken"))
+        await db.commit()
+
+        # Served from the cache
+        assert await get_week_options(db, 7, "nutrition_weeks", 1) == first
+
+        invalidate_week_options(7, "nutrition_weeks")
+        assert await get_week_options(db, 7, "nutrition_weeks", 1) == [{"label": "Salad", "value": "Salad"}]
@@ -0,0 +1,196 @@
+"""
+Tests for cached Google ID token verification, against a local cert server
+"""
+import asyncio
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import httpx
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+from app.services.google_certs import GoogleCertCache, cache_ttl
+
+
+CLIENT_ID = "client.apps.googleusercontent.com"
+
+
+def make_key(kid):
+    """RSA key, its self-signed cert (PEM) and a signer, like one entry of Google's cert set"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return cert.public_bytes(serialization.Encoding.PEM).decode(), crypt.RSASigner.from_string(private_pem, key_id=kid)
+
+
+class CertServer:
+    """Serves a cert set the way www.googleapis.com/oauth2/v1/certs does"""
+
+    def __init__(self):
+        self.certs = {}
+        self.cache_control = "public, max-age=3600, must-revalidate, no-transform"
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.certs).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", server.cache_control)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/oauth2/v1/certs"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def cert_server():
+    server = CertServer()
+    try:
+        yield server
+    finally:
+        server.close()
+
+
+def make_token(signer, **claims):
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "user@example.com",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    payload.update(claims)
+    return jwt.encode(signer, payload).decode()
+
+
+def test_cache_ttl_honours_max_age_and_age():
+    assert cache_ttl(httpx.Response(200, headers={"Cache-Control": "public, max-age=19845"})) == 19845
+    assert cache_ttl(httpx.Response(200, headers={"Cache-Control": "max-age=600", "Age": "100"})) == 500
+    assert cache_ttl(httpx.Response(200, headers={"Cache-Control": "no-store"})) == 0
+
+
+@pytest.mark.asyncio
+async def test_certs_are_fetched_once_and_verified_locally(cert_server):
+    pem, signer = make_key("key1")
+    cert_server.certs = {"key1": pem}
+    cache = GoogleCertCache(cert_server.url, refresh_margin=60)
+    try:
+        for _ in range(20):
+            idinfo = await cache.verify(make_token(signer), CLIENT_ID)
+            assert idinfo["sub"] == "1234567890"
+    finally:
+        await cache.stop()
+
+    assert cert_server.requests == 1
+    assert cache.stats()["verified"] == 20
+    assert 3500 < cache.stats()["expires_in_seconds"] <= 3600
+
+
+@pytest.mark.asyncio
+async def test_invalid_tokens_are_rejected(cert_server):
+    pem, signer = make_key("key1")
+    _, other_signer = make_key("key1")
+    cert_server.certs = {"key1": pem}
+    cache = GoogleCertCache(cert_server.url, refresh_margin=60)
+    try:
+        with pytest.raises(ValueError):
+            await cache.verify(make_token(other_signer), CLIENT_ID)  # wrong key
+        with pytest.raises(ValueError):
+            await cache.verify(make_token(signer, aud="someone-else"), CLIENT_ID)
+        with pytest.raises(ValueError):
+            await cache.verify(make_token(signer, iss="https://evil.example.com"), CLIENT_ID)
+        with pytest.raises(ValueError):
+            await cache.verify(make_token(signer, exp=int(time.time()) - 600), CLIENT_ID)
+    finally:
+        await cache.stop()
+
+    assert cache.stats()["rejected"] == 4
+
+
+@pytest.mark.asyncio
+async def test_expired_cert_set_is_refetched(cert_server):
+    pem, signer = make_key("key1")
+    cert_server.certs = {"key1": pem}
+    cert_server.cache_control = "max-age=0"
+    cache = GoogleCertCache(cert_server.url, refresh_margin=60)
+    try:
+        await cache.verify(make_token(signer), CLIENT_ID)
+        await cache.verify(make_token(signer), CLIENT_ID)
+    finally:
+        await cache.stop()
+
+    assert cert_server.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_key_id_forces_one_refresh(cert_server, monkeypatch):
+    old_pem, _ = make_key("old")
+    new_pem, new_signer = make_key("new")
+    cert_server.certs = {"old": old_pem}
+    cache = GoogleCertCache(cert_server.url, refresh_margin=60)
+    try:
+        await cache.refresh()
+        # Google rotated keys before our cached set expired
+        cert_server.certs = {"old": old_pem, "new": new_pem}
+        cache.fetched_at -= 3600
+        idinfo = await cache.verify(make_token(new_signer), CLIENT_ID)
+    finally:
+        await cache.stop()
+
+    assert idinfo["email"] == "user@example.com"
+    assert cert_server.requests == 2
+    assert cache.stats()["forced_refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_prefetches(cert_server):
+    pem, signer = make_key("key1")
+    cert_server.certs = {"key1": pem}
+    cache = GoogleCertCache(cert_server.url, refresh_margin=60)
+    cache.start()
+    try:
+        for _ in range(100):
+            if cache.certs:
+                break
+            await asyncio.sleep(0.01)
+        assert cache.certs == {"key1": pem}
+        requests = cert_server.requests
+        await cache.verify(make_token(signer), CLIENT_ID)
+        assert cert_server.requests == requests
+    finally:
+        await cache.stop()
@@ -0,0 +1,168 @@
+"""
+Tests for Idempotency-Key handling on plan creation
+"""
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.idempotency import IdempotencyStore
+from app.database.session import get_db
+from app.dependencies import get_current_user
+from app.main import app
+from app.models.user import User
+from app.schemas.workout_plan import WorkoutPlanDetailResponse
+
+
+class Producer:
+    """Counts calls; each call waits for `release` and returns its call number"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        return str(call).encode()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_share_one_execution():
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    produce = Producer()
+    first = asyncio.create_task(store.run("k", "f", produce))
+    await asyncio.sleep(0)
+    duplicates = [asyncio.create_task(store.run("k", "f", produce)) for _ in range(3)]
+    await asyncio.sleep(0)
+    produce.release.set()
+
+    assert await first == (b"1", False)
+    assert await asyncio.gather(*duplicates) == [(b"1", True)] * 3
+    assert await store.run("k", "f", produce) == (b"1", True)
+    assert produce.calls == 1
+    assert store.stats() == {"executions": 1, "replays": 1, "waits": 3, "conflicts": 0, "in_flight": 0, "stored": 1}
+
+
+@pytest.mark.asyncio
+async def test_key_reused_with_other_request_is_rejected():
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    produce = Producer()
+    produce.release.set()
+    await store.run("k", "f", produce)
+    with pytest.raises(HTTPException) as exc:
+        await store.run("k", "other", produce)
+    assert exc.value.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_failures_are_shared_but_not_stored():
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    release = asyncio.Event()
+
+    async def fail() -> bytes:
+        await release.wait()
+        raise HTTPException(status_code=500, detail="generation failed")
+
+    first = asyncio.create_task(store.run("k", "f", fail))
+    await asyncio.sleep(0)
+    duplicate = asyncio.create_task(store.run("k", "f", fail))
+    await asyncio.sleep(0)
+    release.set()
+    for task in (first, duplicate):
+        with pytest.raises(HTTPException):
+            await task
+
+    produce = Producer()
+    produce.release.set()
+    assert await store.run("k", "f", produce) == (b"1", False)
+
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_first_request_is_cancelled():
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    produce = Producer()
+    first = asyncio.create_task(store.run("k", "f", produce))
+    await asyncio.sleep(0)
+    duplicate = asyncio.create_task(store.run("k", "f", produce))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    produce.release.set()
+    assert await duplicate == (b"2", False)
+    assert store.in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_first_request_running():
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    produce = Producer()
+    first = asyncio.create_task(store.run("k", "f", produce))
+    await asyncio.sleep(0)
+    duplicate = asyncio.create_task(store.run("k", "f", produce))
+    await asyncio.sleep(0)
+
+    duplicate.cancel()
+    await asyncio.sleep(0)
+    produce.release.set()
+    assert await first == (b"1", False)
+
+
+@pytest.mark.asyncio
+async def test_stored_responses_expire(monkeypatch):
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    produce = Producer()
+    produce.release.set()
+    await store.run("k", "f", produce)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert await store.run("k", "f", produce) == (b"2", False)
+
+
+def test_plan_creation_replays_with_idempotency_key(monkeypatch):
+    store = IdempotencyStore(maxsize=10, ttl=60)
+    monkeypatch.setattr("app.api.v1.endpoints.workout_plans.plan_idempotency", store)
+    created = []
+
+    async def generate_workout_plan(plan_data, current_user, db):
+        created.append(plan_data.name)
+        now = datetime(2024, 1, 1)
+        return WorkoutPlanDetailResponse(
+            plan_id=len(created), user_id=current_user.user_id, name=plan_data.name,
+            total_weeks=plan_data.total_weeks, current_week=1, created_at=now, updated_at=now
+        )
+
+    async def override_get_db():
+        yield None
+
+    async def override_get_current_user():
+        return User(user_id=7)
+
+    monkeypatch.setattr("app.api.v1.endpoints.workout_plans.generate_workout_plan", generate_workout_plan)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    try:
+        client = TestClient(app)
+        body = {"name": "Plan", "total_weeks": 1}
+
+        first = client.post("/api/v1/workout-plans", json=body, headers={"Idempotency-Key": "tap-1"})
+        assert first.status_code == 201
+        assert "idempotent-replayed" not in first.headers
+
+        retry = client.post("/api/v1/workout-plans", json=body, headers={"Idempotency-Key": "tap-1"})
+        assert retry.status_code == 201
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert retry.json() == first.json()
+
+        assert client.post("/api/v1/workout-plans", json={**body, "name": "Other"}, headers={"Idempotency-Key": "tap-1"}).status_code == 422
+        assert client.post("/api/v1/workout-plans", json=body, headers={"Idempotency-Key": "tap-2"}).json()["plan_id"] == 2
+        assert client.post("/api/v1/workout-plans", json=body).json()["plan_id"] == 3
+        assert created == ["Plan", "Plan", "Plan"]
+    finally:
+        app.dependency_overrides.clear()
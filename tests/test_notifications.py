@@ -0,0 +1,138 @@
+"""
+Tests for the outbound SMS/email dispatcher
+"""
+import asyncio
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+from app.services.notifications import MockProvider, NotificationDispatcher, SendGridProvider, TwilioProvider
+
+
+def make_dispatcher(providers, handler=None, **kwargs):
+    options = dict(queue_size=100, max_attempts=3, retry_delay=0.01)
+    options.update(kwargs)
+    dispatcher = NotificationDispatcher(providers, **options)
+    if handler:
+        dispatcher.transport = httpx.MockTransport(handler)
+    return dispatcher
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_returns_before_the_provider_answers():
+    sms = MockProvider("mock-sms", concurrency=2, latency=0.2, log=False)
+    dispatcher = make_dispatcher({"sms": sms})
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i in range(4):
+        assert dispatcher.enqueue("sms", f"+1555000{i}", "code 123456")
+    assert loop.time() - start < 0.05
+
+    await wait_for(lambda: dispatcher.counters["sms"]["sent"] == 4)
+    # Two at a time: two rounds of 0.2s
+    assert loop.time() - start >= 0.4
+    await dispatcher.stop()
+    assert {n.to for n in sms.sent} == {f"+1555000{i}" for i in range(4)}
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited_per_provider():
+    in_flight = {"now": 0, "max": 0}
+
+    class SlowProvider(MockProvider):
+        async def send(self, client, notification):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.05)
+            in_flight["now"] -= 1
+
+    email = MockProvider("mock-email", concurrency=5, log=False)
+    dispatcher = make_dispatcher({"sms": SlowProvider("slow", concurrency=3), "email": email})
+    for i in range(12):
+        dispatcher.enqueue("sms", str(i), "body")
+    dispatcher.enqueue("email", "a@example.com", "<p>hi</p>", subject="Hi")
+
+    # Email isn't held up behind the SMS backlog
+    await wait_for(lambda: dispatcher.counters["email"]["sent"] == 1)
+    assert dispatcher.counters["sms"]["sent"] < 12
+    await wait_for(lambda: dispatcher.counters["sms"]["sent"] == 12)
+    await dispatcher.stop()
+    assert in_flight["max"] == 3
+
+
+@pytest.mark.asyncio
+async def test_twilio_errors_are_retried_with_backoff():
+    calls = []
+
+    def handler(request):
+        calls.append(parse_qs(request.read().decode()))
+        if len(calls) < 3:
+            return httpx.Response(503 if len(calls) == 1 else 429)
+        return httpx.Response(201, json={"sid": "SM1"})
+
+    twilio = TwilioProvider("AC1", "token", "+15550000000", concurrency=1)
+    dispatcher = make_dispatcher({"sms": twilio}, handler)
+    dispatcher.enqueue("sms", "+15551234567", "code 123456")
+
+    await wait_for(lambda: dispatcher.counters["sms"]["sent"] == 1)
+    await dispatcher.stop()
+    assert len(calls) == 3
+    assert calls[-1]["To"] == ["+15551234567"]
+    assert dispatcher.counters["sms"]["retried"] == 2
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"errors": [{"message": "invalid email"}]})
+
+    sendgrid = SendGridProvider("SG.key", "noreply@movoai.com", "MovoAI", concurrency=1)
+    dispatcher = make_dispatcher({"email": sendgrid}, handler)
+    dispatcher.enqueue("email", "not-an-address", "<p>hi</p>", subject="Hi")
+
+    await wait_for(lambda: dispatcher.counters["email"]["failed"] == 1)
+    await dispatcher.stop()
+    assert len(calls) == 1
+    assert calls[0].headers["authorization"] == "Bearer SG.key"
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts():
+    sms = MockProvider("flaky", concurrency=1, failure_rate=1.0, log=False)
+    dispatcher = make_dispatcher({"sms": sms}, max_attempts=3)
+    dispatcher.enqueue("sms", "+1", "body")
+
+    await wait_for(lambda: dispatcher.counters["sms"]["failed"] == 1)
+    await dispatcher.stop()
+    assert dispatcher.counters["sms"]["retried"] == 2
+
+
+@pytest.mark.asyncio
+async def test_full_queue_refuses_messages():
+    release = asyncio.Event()
+
+    class BlockedProvider(MockProvider):
+        async def send(self, client, notification):
+            await release.wait()
+
+    dispatcher = make_dispatcher({"sms": BlockedProvider("blocked", concurrency=1)}, queue_size=1)
+    assert dispatcher.enqueue("sms", "+1", "a")
+    await asyncio.sleep(0)
+    assert dispatcher.enqueue("sms", "+2", "b")
+    assert not dispatcher.enqueue("sms", "+3", "c")
+    assert dispatcher.stats()["sms"]["dropped"] == 1
+
+    release.set()
+    await dispatcher.stop()
@@ -0,0 +1,75 @@
+"""
+Tests for keyset pagination helpers
+"""
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Integer, DateTime, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
+
+from app.core.pagination import encode_cursor, decode_cursor, paginate_keyset, estimate_count
+
+
+PageBase = declarative_base()
+
+
+class Item(PageBase):
+    __tablename__ = "items"
+    
+    item_id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+@pytest_asyncio.fixture
+async def item_session():
+    """SQLite session with 25 items, several sharing a timestamp"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(PageBase.metadata.create_all)
+    session = async_sessionmaker(bind=engine, expire_on_commit=False)()
+    base = datetime(2025, 1, 1)
+    for i in range(1, 26):
+        session.add(Item(item_id=i, created_at=base + timedelta(minutes=i // 3)))
+    await session.commit()
+    try:
+        yield session
+    finally:
+        await session.close()
+        await engine.dispose()
+
+
+def test_cursor_round_trip():
+    """Test that a cursor decodes to the key it was built from"""
+    ts = datetime(2025, 5, 4, 3, 2, 1)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+
+
+def test_decode_invalid_cursor():
+    """Test that garbage cursors are rejected"""
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_paginate_keyset_walks_all_rows(item_session):
+    """Test that following next_cursor visits every row exactly once, newest first"""
+    statement = select(Item)
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = await paginate_keyset(
+            item_session, statement, Item.created_at, Item.item_id, 10, cursor
+        )
+        seen.extend(r.item_id for r in rows)
+        if cursor is None:
+            break
+    
+    assert seen == list(range(25, 0, -1))
+
+
+@pytest.mark.asyncio
+async def test_estimate_count_falls_back_to_exact_count(item_session):
+    """Test that non-PostgreSQL dialects get an exact COUNT"""
+    statement = select(Item).where(Item.item_id > 5).order_by(Item.item_id)
+    assert await estimate_count(item_session, statement) == 20
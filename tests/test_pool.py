@@ -0,0 +1,90 @@
+"""
+Tests for connection pool configuration and instrumentation
+"""
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app.core.config import settings
+from app.database.pool import (
+    InstrumentedAsyncPool,
+    InstrumentedQueuePool,
+    engine_options,
+    instrument_engine,
+    pool_metrics,
+)
+
+
+@pytest.fixture
+def small_engine(tmp_path):
+    """Instrumented engine with one pooled connection and one overflow slot"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.05
+    )
+    instrument_engine("test_pool", engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def test_pool_records_overflow_timeouts_and_churn(small_engine):
+    first = small_engine.connect()
+    second = small_engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        small_engine.connect()
+
+    metrics = pool_metrics()["test_pool"]
+    assert metrics["checked_out"] == 2
+    assert metrics["overflow_in_use"] == 1
+    assert metrics["overflow_peak"] == 1
+    assert metrics["checkout_timeouts"] == 1
+    assert metrics["connects"] == 2
+    assert metrics["checkout_wait_max_ms"] >= 50
+
+    second.close()  # overflow connection is discarded, not pooled
+    first.close()
+    metrics = pool_metrics()["test_pool"]
+    assert metrics["closes"] == 1
+    assert metrics["idle"] == 1
+
+
+def test_pool_stats_survive_dispose(small_engine):
+    with small_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    small_engine.dispose()
+
+    with small_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    metrics = pool_metrics()["test_pool"]
+    assert metrics["checkouts"] == 2
+    assert metrics["connects"] == 2
+    assert metrics["max_overflow"] == 1
+
+
+def test_engine_options_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 4)
+    monkeypatch.setattr(settings, "DB_POOL_PRE_PING", False)
+    monkeypatch.setattr(settings, "DB_POOL_RECYCLE", 300)
+    monkeypatch.setattr(settings, "DB_PGBOUNCER_TRANSACTION_MODE", True)
+
+    options = engine_options("postgresql://u:p@db/movoai", is_async=True)
+
+    assert options["poolclass"] is InstrumentedAsyncPool
+    assert options["pool_size"] == 4
+    assert options["pool_pre_ping"] is False
+    assert options["pool_recycle"] == 300
+    assert options["connect_args"]["statement_cache_size"] == 0
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+    name_func = options["connect_args"]["prepared_statement_name_func"]
+    assert name_func() != name_func()
+
+    sync_options = engine_options("postgresql://u:p@db/movoai", is_async=False)
+    assert sync_options["poolclass"] is InstrumentedQueuePool
+    assert "connect_args" not in sync_options
+
+    assert engine_options("sqlite:///local.db", is_async=False) == {}
@@ -0,0 +1,126 @@
+"""
+Tests for the principal cache
+"""
+import time
+from datetime import timedelta
+
+import pytest
+
+from app.core import principal
+from app.core.cache import ExpiringMap, LRUCache
+from app.core.security import create_access_token, create_refresh_token
+
+
+CACHES = (principal.token_cache, principal.user_cache, principal.revoked_tokens, principal.revoked_users)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in CACHES:
+        cache.clear()
+    yield
+    for cache in CACHES:
+        cache.clear()
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_drops_expired_entries():
+    cache = LRUCache(maxsize=10)
+    cache.set("ttl", 1, ttl=-1)
+    cache.set("deadline", 2, expires_at=time.time() - 1)
+    cache.set("fresh", 3, ttl=60)
+
+    assert cache.get("ttl") is None
+    assert cache.get("deadline") is None
+    assert cache.get("fresh") == 3
+    assert len(cache) == 1
+
+
+def test_expiring_map_keeps_entries_until_they_expire(monkeypatch):
+    entries = ExpiringMap()
+    now = time.time()
+    entries.set("revoked", True, expires_at=now + 60)
+    for i in range(1000):
+        entries.set(i, True, expires_at=now + 1)
+    assert entries.get("revoked") is True
+    assert len(entries) == 1001
+
+    # Expired entries read as missing and are dropped by the next store
+    monkeypatch.setattr(time, "time", lambda: now + 2)
+    assert entries.get(0) is None
+    entries.set("later", True, expires_at=now + 60)
+    assert len(entries) == 2
+    assert entries.get("revoked") is True
+
+
+def test_verified_token_is_cached_until_exp(monkeypatch):
+    token = create_access_token({"user_id": 7})
+    payload = principal.verify_access_token(token)
+    assert payload["user_id"] == 7
+
+    def fail(token):
+        raise AssertionError("signature checked again")
+
+    monkeypatch.setattr(principal, "decode_access_token", fail)
+    assert principal.verify_access_token(token) == payload
+
+
+def test_invalid_tokens_are_not_cached():
+    refresh = create_refresh_token({"user_id": 7})
+    expired = create_access_token({"user_id": 7}, expires_delta=timedelta(seconds=-5))
+
+    assert principal.verify_access_token(refresh) is None
+    assert principal.verify_access_token(expired) is None
+    assert principal.verify_access_token("not-a-jwt") is None
+    assert len(principal.token_cache) == 0
+
+
+def test_invalidate_user_drops_cached_row():
+    principal.user_cache.set(7, {"user_id": 7}, ttl=60)
+    principal.invalidate_user(7)
+    assert principal.user_cache.get(7) is None
+
+
+def test_principal_from_claims():
+    token = create_access_token({"user_id": 7})
+    p = principal.principal_from_token(token)
+
+    assert p.user_id == 7
+    assert p.id == 7
+    assert p.token_id
+    with pytest.raises(AttributeError):
+        p.user_id = 8
+    assert principal.principal_from_token(create_access_token({"sub": "x"})) is None
+
+
+def test_revoked_token_is_rejected_even_when_cached():
+    token = create_access_token({"user_id": 7})
+    other = create_access_token({"user_id": 7})
+    p = principal.principal_from_token(token)
+
+    principal.revoke_token(p.token_id, p.expires_at)
+
+    assert principal.principal_from_token(token) is None
+    assert principal.verify_access_token(token) is None
+    assert principal.principal_from_token(other) is not None
+
+
+def test_revoke_user_tokens_rejects_earlier_tokens():
+    token = create_access_token({"user_id": 7})
+    someone_else = create_access_token({"user_id": 8})
+
+    principal.revoke_user_tokens(7)
+
+    assert principal.principal_from_token(token) is None
+    assert principal.principal_from_token(someone_else) is not None
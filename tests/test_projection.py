@@ -0,0 +1,151 @@
+"""
+Tests for sparse-field projection helpers and the plan endpoints using them
+"""
+import pytest
+
+from app.core.projection import parse_fields
+from app.models.exercise import Exercise
+from app.models.nutrition_plan import Meal, NutritionDay, NutritionPlan, NutritionWeek
+from app.models.user import User
+from app.models.workout_plan import WorkoutDay, WorkoutDayExercise, WorkoutPlan, WorkoutWeek
+
+
+LEVELS = ["weeks", "days", "exercises", "exercise"]
+
+
+def test_parse_fields_default_is_everything():
+    """No fields parameter loads every level"""
+    assert parse_fields(None, LEVELS) == len(LEVELS)
+
+
+def test_parse_fields_implies_parent_levels():
+    """Requesting a deep level loads everything above it"""
+    assert parse_fields("weeks", LEVELS) == 1
+    assert parse_fields("exercises", LEVELS) == 3
+    assert parse_fields("days, weeks", LEVELS) == 2
+
+
+def test_parse_fields_empty_loads_nothing():
+    """An empty fields parameter returns only top-level columns"""
+    assert parse_fields("", LEVELS) == 0
+
+
+def test_parse_fields_rejects_unknown():
+    """Unknown field names are reported"""
+    with pytest.raises(ValueError, match="meals"):
+        parse_fields("weeks,meals", LEVELS)
+
+
+
+@pytest.fixture
+def plans(api, sqlite_db, login):
+    """User 7 owns workout and nutrition plan 1 (one week, one day, one item); user 8 owns nothing"""
+    sqlite_db.seed(User, [
+        {"user_id": user_id, "is_active": True, "credits": 0, "has_used_referral": False}
+        for user_id in (7, 8)
+    ])
+    sqlite_db.seed(Exercise, [{"exercise_id": 1, "name_en": "Squat", "name_fa": "اسکات"}])
+    sqlite_db.seed(WorkoutPlan, [{"plan_id": 1, "user_id": 7, "name": "Plan", "total_weeks": 1, "current_week": 1, "completed_weeks": []}])
+    sqlite_db.seed(WorkoutWeek, [{"week_id": 1, "plan_id": 1, "week_number": 1}])
+    sqlite_db.seed(WorkoutDay, [{"day_id": 1, "week_id": 1, "day_name": "Saturday"}])
+    sqlite_db.seed(WorkoutDayExercise, [{"workout_day_exercise_id": 1, "day_id": 1, "exercise_id": 1, "exercise_order": 1}])
+    sqlite_db.seed(NutritionPlan, [{"plan_id": 1, "user_id": 7, "name": "Plan", "total_weeks": 1, "current_week": 1, "completed_weeks": []}])
+    sqlite_db.seed(NutritionWeek, [{"week_id": 1, "plan_id": 1, "week_number": 1}])
+    sqlite_db.seed(NutritionDay, [{"day_id": 1, "week_id": 1, "day_name": "Saturday"}])
+    sqlite_db.seed(Meal, [{"meal_id": 1, "day_id": 1, "meal_type": "breakfast", "name": "Oats"}])
+    login(7)
+    return api
+
+
+def workout_depth(plan: dict) -> int:
+    """How many nested levels of a workout plan response were loaded"""
+    if not plan["weeks"]:
+        return 0
+    day_list = plan["weeks"][0]["days"]
+    if not day_list:
+        return 1
+    exercises = day_list[0]["exercises"]
+    if not exercises:
+        return 2
+    return 4 if exercises[0]["exercise"] else 3
+
+
+@pytest.mark.parametrize("fields, depth", [
+    (None, 4), ("", 0), ("weeks", 1), ("days", 2), ("exercises", 3), ("exercise,weeks", 4)
+])
+def test_workout_plan_fields_set_the_depth(plans, fields, depth):
+    params = {} if fields is None else {"fields": fields}
+    response = plans.get("/api/v1/workout-plans/1", params=params)
+    assert response.status_code == 200
+    assert workout_depth(response.json()) == depth
+
+
+def test_workout_plan_exercise_details_when_requested(plans):
+    plan = plans.get("/api/v1/workout-plans/1").json()
+    assert plan["weeks"][0]["days"][0]["exercises"][0]["exercise"]["name_en"] == "Squat"
+
+
+def test_workout_week_fields_set_the_depth(plans):
+    week = plans.get("/api/v1/workout-plans/1/week/1", params={"fields": "days"}).json()
+    assert week["days"][0]["day_name"] == "Saturday"
+    assert week["days"][0]["exercises"] == []
+
+    week = plans.get("/api/v1/workout-plans/1/week/1", params={"fields": ""}).json()
+    assert week["week_number"] == 1
+    assert week["days"] == []
+
+
+def test_workout_day_returns_exercises(plans):
+    response = plans.get("/api/v1/workout-plans/1/week/1/day/1")
+    assert response.status_code == 200
+    day = response.json()
+    assert day["day_id"] == 1
+    assert day["exercises"][0]["exercise"]["exercise_id"] == 1
+
+    assert plans.get("/api/v1/workout-plans/1/week/2/day/1").status_code == 404
+
+
+@pytest.mark.parametrize("fields, depth", [(None, 3), ("", 0), ("weeks", 1), ("days", 2), ("meals", 3)])
+def test_nutrition_plan_fields_set_the_depth(plans, fields, depth):
+    params = {} if fields is None else {"fields": fields}
+    plan = plans.get("/api/v1/nutrition-plans/1", params=params).json()
+    loaded = [
+        bool(plan["weeks"]),
+        bool(plan["weeks"] and plan["weeks"][0]["days"]),
+        bool(plan["weeks"] and plan["weeks"][0]["days"] and plan["weeks"][0]["days"][0]["meals"]),
+    ]
+    assert loaded == [level < depth for level in range(3)]
+
+
+def test_nutrition_week_and_day(plans):
+    week = plans.get("/api/v1/nutrition-plans/1/week/1", params={"fields": "days"}).json()
+    assert week["days"][0]["meals"] == []
+
+    response = plans.get("/api/v1/nutrition-plans/1/week/1/day/1")
+    assert response.status_code == 200
+    assert response.json()["meals"][0]["name"] == "Oats"
+
+
+@pytest.mark.parametrize("path", [
+    "/api/v1/workout-plans/1",
+    "/api/v1/workout-plans/1/week/1",
+    "/api/v1/workout-plans/1/week/1/day/1",
+    "/api/v1/nutrition-plans/1",
+    "/api/v1/nutrition-plans/1/week/1",
+    "/api/v1/nutrition-plans/1/week/1/day/1",
+])
+def test_other_users_plans_are_not_found(plans, login, path):
+    login(8)
+    assert plans.get(path).status_code == 404
+
+
+@pytest.mark.parametrize("path, fields", [
+    ("/api/v1/workout-plans/1", "weeks,meals"),
+    ("/api/v1/workout-plans/1/week/1", "weeks"),
+    ("/api/v1/nutrition-plans/1", "exercises"),
+    ("/api/v1/nutrition-plans/1/week/1", "weeks"),
+])
+def test_unknown_fields_are_rejected(plans, path, fields):
+    response = plans.get(path, params={"fields": fields})
+    assert response.status_code == 400
+    assert "Unknown fields" in response.json()["detail"]
@@ -0,0 +1,53 @@
+"""
+Tests for the rate limiter
+"""
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.core import rate_limit
+from app.core.rate_limit import RateLimiter, RateLimitPolicy, limit_by_ip
+
+
+POLICY = RateLimitPolicy("test", "2/minute", detail="Slow down")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", ["moving-window", "sliding-window-counter", "fixed-window"])
+async def test_limit_per_identifier(strategy):
+    limiter = RateLimiter("memory://", strategy)
+
+    await limiter.hit(POLICY, "a@example.com")
+    await limiter.hit(POLICY, "a@example.com")
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.hit(POLICY, "a@example.com")
+
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.detail == "Slow down"
+    assert int(exc_info.value.headers["Retry-After"]) >= 1
+
+    # Other identifiers and policies have their own windows
+    await limiter.hit(POLICY, "b@example.com")
+    await limiter.hit(RateLimitPolicy("other", "1/minute"), "a@example.com")
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        RateLimiter("memory://", "token-bucket")
+
+
+def test_limit_by_ip_dependency(monkeypatch):
+    monkeypatch.setattr(rate_limit, "rate_limiter", RateLimiter("memory://", "moving-window"))
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(limit_by_ip(POLICY))])
+    async def limited():
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.get("/limited").status_code == 200
+    assert client.get("/limited").status_code == 200
+
+    response = client.get("/limited")
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
@@ -0,0 +1,110 @@
+"""
+Tests for the in-memory reference data (goals and exercise lookups)
+"""
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql
+
+from app.models.exercise import Difficulty, Equipment, Muscle, Style, TrainingPhase
+from app.models.nutrition_goal import NutritionGoal
+from app.models.workout_goal import WorkoutGoal
+from app.services.reference_data import POSTGRES_VERSION, ReferenceDataCache
+
+MODELS = [Difficulty, Equipment, Muscle, Style, TrainingPhase, WorkoutGoal, NutritionGoal]
+
+
+def rows():
+    return [
+        Equipment(equipment_id=1, name_en="Bodyweight", name_fa="وزن بدن"),
+        Equipment(equipment_id=2, name_en="Dumbbell", name_fa="دمبل"),
+        Difficulty(difficulty_id=1, name_en="Beginner", name_fa="مبتدی"),
+        Style(style_id=1, name_en="Stretches", name_fa="کششی"),
+        TrainingPhase(phase_id=1, name_en="Warm-up", name_fa="گرم کردن"),
+        WorkoutGoal(workout_goal_id=1, focus="efficiency", goal_key="b_fast", goal_label_en="Fast", goal_label_fa="سریع"),
+        WorkoutGoal(workout_goal_id=2, focus="efficiency", goal_key="a_short", goal_label_en="Short"),
+        WorkoutGoal(workout_goal_id=3, focus="body_recomposition", goal_key="lean", goal_label_en="Lean"),
+        NutritionGoal(nutrition_goal_id=1, focus="efficiency", goal_key="simple", goal_label_en="Simple"),
+    ]
+
+
+@pytest_asyncio.fixture
+async def session_factory(async_sqlite_db):
+    factory = async_sqlite_db.session_factory
+    async with factory() as db:
+        db.add_all(rows())
+        await db.commit()
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_load_indexes_lookups_and_goals(session_factory):
+    cache = ReferenceDataCache(check_interval=60, session_factory=session_factory)
+    await cache.check()
+    data = cache.data
+
+    assert data.names_fa("equipment", [2, 99, 1]) == ["دمبل", "وزن بدن"]
+    assert data.lookups["style"][1].name_en == "Stretches"
+    assert data.lookups["muscle"] == {}
+    assert data.workout_goals[1].goal_label_fa == "سریع"
+
+    unfiltered = json.loads(data.goal_lists[("workout", None)].body)
+    assert [goal["workout_goal_id"] for goal in unfiltered] == [3, 2, 1]  # focus, goal_key
+    efficiency = json.loads(data.goal_lists[("workout", "efficiency")].body)
+    assert [goal["goal_key"] for goal in efficiency] == ["a_short", "b_fast"]
+    assert json.loads(data.goal_lists[("nutrition", "rebuilding_rehab")].body) == []
+    assert json.loads(data.goal_details[("nutrition", 1)].body)["goal_key"] == "simple"
+
+
+@pytest.mark.asyncio
+async def test_check_reloads_only_when_tables_change(session_factory):
+    cache = ReferenceDataCache(check_interval=60, session_factory=session_factory)
+    await cache.check()
+    await cache.check()
+    assert cache.counters["loads"] == 1
+
+    async with session_factory() as db:
+        await db.execute(delete(Equipment).where(Equipment.equipment_id == 2))
+        await db.commit()
+    await cache.check()
+    assert cache.counters["loads"] == 2
+    assert 2 not in cache.data.lookups["equipment"]
+
+    await cache.reload()
+    assert cache.counters["loads"] == 3
+
+
+def test_postgres_version_covers_every_table():
+    sql = str(POSTGRES_VERSION.compile(dialect=postgresql.dialect()))
+    for model in MODELS:
+        assert f"FROM {model.__tablename__} t" in sql
+
+
+def test_goal_endpoints_with_etags(api, db_session, monkeypatch):
+    async def seed():
+        async with db_session() as db:
+            db.add_all(rows())
+            await db.commit()
+
+    asyncio.run(seed())
+    cache = ReferenceDataCache(check_interval=60, session_factory=db_session)
+    monkeypatch.setattr("app.api.v1.endpoints.goals.reference_data", cache)
+
+    response = api.get("/api/v1/goals/workout", params={"focus": "efficiency"})
+    assert response.status_code == 200
+    assert [goal["workout_goal_id"] for goal in response.json()] == [2, 1]
+    etag = response.headers["etag"]
+
+    response = api.get("/api/v1/goals/workout", params={"focus": "efficiency"}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    assert len(api.get("/api/v1/goals/workout").json()) == 3
+    assert api.get("/api/v1/goals/workout", params={"focus": "bulk"}).status_code == 400
+    assert api.get("/api/v1/goals/nutrition/1").json()["goal_label_en"] == "Simple"
+    assert api.get("/api/v1/goals/nutrition/9").status_code == 404
+    assert api.get("/api/v1/goals/workout/3").json()["focus"] == "body_recomposition"
+    # Loaded once, by the first request
+    assert cache.counters["loads"] == 1
@@ -0,0 +1,102 @@
+"""
+Tests for referral code allocation
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import Column, Integer, String, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from app.core.referral import ALPHABET, CODE_LENGTH, assign_referral_code, encode_referral_code
+
+
+RefBase = declarative_base()
+
+
+class Member(RefBase):
+    """Stand-in with the same columns the allocator touches"""
+    __tablename__ = "members"
+    
+    user_id = Column(Integer, primary_key=True)
+    name = Column(String(20))
+    referral_code = Column(String(20), unique=True)
+
+
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    # pysqlite's own transaction handling breaks SAVEPOINT; let SQLAlchemy emit BEGIN
+    @event.listens_for(engine.sync_engine, "connect")
+    def _no_driver_transactions(dbapi_connection, _):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(RefBase.metadata.create_all)
+    db = async_sessionmaker(bind=engine, expire_on_commit=False)()
+    try:
+        yield db
+    finally:
+        await db.close()
+        await engine.dispose()
+
+
+def test_codes_are_unique_and_well_formed():
+    codes = [encode_referral_code(user_id) for user_id in range(1, 20001)]
+
+    assert len(set(codes)) == len(codes)
+    assert all(len(code) == CODE_LENGTH and set(code) <= set(ALPHABET) for code in codes)
+
+
+def test_retry_attempts_give_different_codes():
+    assert len({encode_referral_code(42, attempt) for attempt in range(5)}) == 5
+
+
+@pytest.mark.asyncio
+async def test_assign_without_conflict(session):
+    member = Member(name="a")
+    session.add(member)
+    await session.flush()
+
+    code = await assign_referral_code(session, member)
+    await session.commit()
+
+    assert code == encode_referral_code(member.user_id)
+
+
+@pytest.mark.asyncio
+async def test_assign_retries_on_legacy_conflict(session):
+    # A legacy random code that happens to equal user 2's derived code
+    session.add(Member(user_id=1, name="legacy", referral_code=encode_referral_code(2)))
+    await session.commit()
+
+    member = Member(user_id=2, name="new")
+    session.add(member)
+    await session.flush()
+
+    code = await assign_referral_code(session, member)
+    await session.commit()
+
+    assert code == encode_referral_code(2, attempt=1)
+    assert member.name == "new"
+
+
+@pytest.mark.asyncio
+async def test_new_row_is_inserted_with_its_code(session):
+    # PostgreSQL path: user_id reserved up front, row inserted together with the code
+    session.add(Member(user_id=1, name="legacy", referral_code=encode_referral_code(7)))
+    await session.commit()
+
+    member = Member(user_id=7, name="new")
+    session.add(member)
+
+    code = await assign_referral_code(session, member)
+    await session.commit()
+
+    assert code == encode_referral_code(7, attempt=1)
+    assert member in session
+    assert member.name == "new"
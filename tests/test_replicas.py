@@ -0,0 +1,87 @@
+"""
+Tests for read-replica routing
+"""
+import time
+
+import pytest
+import pytest_asyncio
+
+from app.database.replicas import ReplicaRouter
+
+
+@pytest_asyncio.fixture
+async def router(tmp_path):
+    """Router over one reachable SQLite replica and one unreachable one"""
+    router = ReplicaRouter(
+        [
+            f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}",
+            f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}",
+        ],
+        max_lag_seconds=5,
+        check_interval_seconds=10
+    )
+    try:
+        yield router
+    finally:
+        await router.dispose()
+
+
+@pytest.mark.asyncio
+async def test_no_replicas_reads_from_primary():
+    router = ReplicaRouter([], max_lag_seconds=5, check_interval_seconds=10)
+    await router.check_all()
+    assert router.pick() is None
+
+
+@pytest.mark.asyncio
+async def test_unchecked_replicas_are_not_used(router):
+    assert router.pick() is None
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_is_skipped(router):
+    reachable, unreachable = router.replicas
+    await router.check_all()
+
+    assert reachable.healthy
+    assert not unreachable.healthy
+    assert unreachable.last_error
+    assert all(router.pick() is reachable for _ in range(4))
+
+
+@pytest.mark.asyncio
+async def test_lagging_replica_falls_back_to_primary(router):
+    reachable, _ = router.replicas
+
+    async def lagging():
+        return 30.0
+
+    reachable.measure_lag = lagging
+    await router.check_all()
+
+    assert not reachable.healthy
+    assert reachable.lag_seconds == 30.0
+    assert router.pick() is None
+
+
+@pytest.mark.asyncio
+async def test_stale_health_result_is_not_trusted(router):
+    reachable, _ = router.replicas
+    await router.check_all()
+    reachable.checked_at = time.monotonic() - 60
+
+    assert router.pick() is None
+
+
+@pytest.mark.asyncio
+async def test_pinned_caller_reads_from_primary(router):
+    reachable, _ = router.replicas
+    await router.check_all()
+
+    router.pin_primary("Bearer writer")
+
+    assert router.pick("Bearer writer") is None
+    assert router.pick("Bearer reader") is reachable
+
+    router._pins["Bearer writer"] = time.monotonic() - 1
+    assert router.pick("Bearer writer") is reachable
@@ -0,0 +1,115 @@
+"""
+Tests for single-flight coalescing of identical AvalAI calls
+"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from ai import workout_generator_farsi
+from ai.workout_generator_farsi import FarsiExerciseSearchEngine, FarsiWorkoutPlanGenerator
+from app.core.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_with_same_key_share_one_execution():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        return "result"
+
+    callers = [asyncio.create_task(flight.run("prompt", call)) for _ in range(3)]
+    other = asyncio.create_task(flight.run("other prompt", call))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*callers, other) == ["result"] * 4
+    assert len(calls) == 2
+    assert flight.stats() == {"calls": 2, "shared": 2, "timeouts": 0, "in_flight": 0}
+
+    # Finished calls are not cached
+    assert await flight.run("prompt", call) == "result"
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_caller_timeout_and_cancellation_leave_the_call_running():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def call():
+        await release.wait()
+        return "result"
+
+    patient = asyncio.create_task(flight.run("prompt", call, timeout=5))
+    cancelled = asyncio.create_task(flight.run("prompt", call))
+    await asyncio.sleep(0)
+    with pytest.raises(asyncio.TimeoutError):
+        await flight.run("prompt", call, timeout=0.01)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+
+    release.set()
+    assert await patient == "result"
+    assert flight.counters["timeouts"] == 1
+    assert flight.in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller_and_are_not_kept():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fail():
+        await release.wait()
+        raise ValueError("Invalid response format from AvalAI API")
+
+    callers = [asyncio.create_task(flight.run("prompt", fail)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_identical_prompts_make_one_avalai_request(monkeypatch):
+    monkeypatch.setattr(workout_generator_farsi, "avalai_calls", SingleFlight())
+    generator = FarsiWorkoutPlanGenerator(FarsiExerciseSearchEngine())
+    started = threading.Event()
+    release = threading.Event()
+    requests_made = []
+    response = {
+        "strategy": "s", "expectations": "e",
+        "days": [{"day_name": "شنبه", "exercises": [{"exercise_id": 1, "tempo": "2-0-2-0"}]}]
+    }
+
+    def call_avalai_api(system_instructions, user_message):
+        requests_made.append(user_message)
+        started.set()
+        release.wait(5)
+        return json.dumps(response)
+
+    monkeypatch.setattr(generator, "_call_avalai_api", call_avalai_api)
+    daily_exercises = [{
+        "day_info": {"day_name": "شنبه", "focus": "full body"},
+        "exercises": {"warmup": [], "main": [{"exercise_id": 1, "name_fa": "a", "difficulty_fa": "b", "muscle_names": []}], "cooldown": []}
+    }]
+    args = ({"age": 30}, daily_exercises, "none", "Beginner", "goal", "", [])
+
+    plans = [asyncio.create_task(generator._generate_plan_with_avalai(*args)) for _ in range(3)]
+    await asyncio.to_thread(started.wait, 5)
+    release.set()
+    first, second, third = await asyncio.gather(*plans)
+
+    assert len(requests_made) == 1
+    assert first == second == third
+    # Each caller gets its own plan to persist
+    first["days"][0]["exercises"][0]["sets"] = "5"
+    assert "sets" not in second["days"][0]["exercises"][0]
+    assert "tempo" not in third["days"][0]["exercises"][0]
@@ -0,0 +1,115 @@
+"""
+Tests for telegram_id -> user resolution
+"""
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.core.referral import encode_referral_code
+from app.models.auth_method import UserAuthMethod
+from app.models.user import User
+from app.services import telegram_identity
+from app.services.telegram_identity import find_telegram_user, forget_telegram_user, resolve_telegram_user
+
+
+@pytest_asyncio.fixture
+async def session_factory(async_sqlite_db):
+    # pysqlite's own transaction handling breaks SAVEPOINT; let SQLAlchemy emit BEGIN
+    @event.listens_for(async_sqlite_db.engine.sync_engine, "connect")
+    def _no_driver_transactions(dbapi_connection, _):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(async_sqlite_db.engine.sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    telegram_identity.telegram_user_ids.clear()
+    try:
+        yield async_sqlite_db.session_factory
+    finally:
+        telegram_identity.telegram_user_ids.clear()
+
+
+async def count(session_factory, model):
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(model))
+
+
+@pytest.mark.asyncio
+async def test_first_contact_creates_user_and_auth_method(session_factory):
+    async with session_factory() as db:
+        user_id, created = await resolve_telegram_user(db, 555, {"username": "sam", "first_name": "Sam"})
+    assert created is True
+
+    async with session_factory() as db:
+        user = await db.get(User, user_id)
+        auth_method = await db.scalar(select(UserAuthMethod))
+    assert user.telegram_id == 555
+    assert user.referral_code == encode_referral_code(user_id)
+    assert auth_method.user_id == user_id
+    assert auth_method.auth_provider == "telegram"
+    assert auth_method.auth_identifier == "555"
+    assert auth_method.auth_data == {"username": "sam", "first_name": "Sam"}
+    assert auth_method.is_primary
+
+
+@pytest.mark.asyncio
+async def test_repeat_logins_are_served_from_the_map(session_factory):
+    async with session_factory() as db:
+        user_id, _ = await resolve_telegram_user(db, 555, {})
+
+    statements = []
+    async with session_factory() as db:
+        event.listen(db.bind.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        assert await resolve_telegram_user(db, 555, {}) == (user_id, False)
+    assert statements == []
+    assert await count(session_factory, User) == 1
+
+
+@pytest.mark.asyncio
+async def test_existing_user_is_found_without_creating(session_factory):
+    async with session_factory() as db:
+        user_id, _ = await resolve_telegram_user(db, 555, {})
+    # Another worker's map doesn't know this user
+    forget_telegram_user(555)
+
+    async with session_factory() as db:
+        assert await resolve_telegram_user(db, 555, {}) == (user_id, False)
+    assert await count(session_factory, User) == 1
+    assert await count(session_factory, UserAuthMethod) == 1
+
+
+@pytest.mark.asyncio
+async def test_distinct_accounts_get_distinct_users(session_factory):
+    async with session_factory() as db:
+        first, _ = await resolve_telegram_user(db, 1, {})
+        second, _ = await resolve_telegram_user(db, 2, {})
+    assert first != second
+    assert telegram_identity.telegram_user_ids.get(2) == second
+
+
+@pytest.mark.asyncio
+async def test_deleted_accounts_are_not_found(session_factory, async_sqlite_db):
+    async_sqlite_db.seed(User, [{
+        "user_id": 1, "telegram_id": 555, "is_active": True, "credits": 0, "has_used_referral": False,
+        "deleted_at": datetime(2024, 1, 1, tzinfo=timezone.utc)
+    }])
+    async with session_factory() as db:
+        assert await find_telegram_user(db, 555) is None
+    assert telegram_identity.telegram_user_ids.get(555) is None
+
+
+@pytest.mark.asyncio
+async def test_conflict_without_a_user_raises(session_factory, async_sqlite_db):
+    # A telegram auth method left behind for this id, with no user holding the telegram_id
+    async_sqlite_db.seed(User, [{"user_id": 1, "is_active": True, "credits": 0, "has_used_referral": False}])
+    async_sqlite_db.seed(UserAuthMethod, [{
+        "user_id": 1, "auth_provider": "telegram", "auth_identifier": "555", "is_verified": True, "is_primary": True
+    }])
+    async with session_factory() as db:
+        with pytest.raises(IntegrityError):
+            await resolve_telegram_user(db, 555, {})
+    assert telegram_identity.telegram_user_ids.get(555) is None
@@ -0,0 +1,128 @@
+"""
+Tests for the queued Telegram sender
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.telegram import TelegramSender, TokenBucket
+
+
+def make_sender(handler, **kwargs):
+    options = dict(workers=2, queue_size=100, rate_per_second=100, chat_rate_per_second=100, max_attempts=3)
+    options.update(kwargs)
+    sender = TelegramSender("TEST", **options)
+    sender.transport = httpx.MockTransport(handler)
+    return sender
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_spaces_out_bursts():
+    bucket = TokenBucket(rate=20, capacity=1)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for _ in range(3):
+        await bucket.acquire()
+    assert loop.time() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_messages_are_sent_in_order_per_chat():
+    seen = []
+
+    def handler(request):
+        seen.append(request.read())
+        return httpx.Response(200, json={"ok": True})
+
+    sender = make_sender(handler)
+    for i in range(5):
+        assert sender.enqueue(1, f"m{i}")
+    await wait_for(lambda: sender.counters["sent"] == 5)
+    await sender.stop()
+
+    assert [body.count(f'"m{i}"'.encode()) for i, body in enumerate(seen)] == [1] * 5
+    assert sender.stats()["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_respected():
+    calls = []
+
+    def handler(request):
+        calls.append(asyncio.get_event_loop().time())
+        if len(calls) == 1:
+            return httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.2}})
+        return httpx.Response(200, json={"ok": True})
+
+    sender = make_sender(handler)
+    sender.enqueue(1, "hello")
+    await wait_for(lambda: sender.counters["sent"] == 1)
+    await sender.stop()
+
+    assert sender.counters["rate_limited"] == 1
+    assert sender.counters["retried"] == 1
+    assert calls[1] - calls[0] >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_server_errors_retry_and_client_errors_do_not():
+    statuses = iter([502, 200, 400])
+
+    def handler(request):
+        return httpx.Response(next(statuses), json={})
+
+    sender = make_sender(handler, workers=1)
+    sender.enqueue(1, "flaky")
+    # First retry is scheduled two seconds out
+    await wait_for(lambda: sender.counters["sent"] == 1, timeout=5.0)
+    sender.enqueue(2, "bad")
+    await wait_for(lambda: sender.counters["failed"] == 1)
+    await sender.stop()
+
+    assert sender.counters["retried"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking():
+    sender = make_sender(lambda request: httpx.Response(200, json={"ok": True}), queue_size=1, workers=1)
+    results = [sender.enqueue(1, f"m{i}") for i in range(3)]
+    await sender.stop()
+
+    assert results[0] is True
+    assert False in results
+    assert sender.counters["dropped"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_burst_to_one_chat_does_not_delay_other_chats():
+    sent = []
+
+    def handler(request):
+        sent.append((request.read().decode(), asyncio.get_event_loop().time()))
+        return httpx.Response(200, json={"ok": True})
+
+    # One worker and 5 messages/s per chat: the burst takes ~0.8s to go out
+    sender = make_sender(handler, workers=1, chat_rate_per_second=5)
+    start = asyncio.get_running_loop().time()
+    for i in range(5):
+        sender.enqueue(1, f"burst{i}")
+    sender.enqueue(2, "other")
+    await wait_for(lambda: sender.counters["sent"] == 6)
+    await sender.stop()
+
+    labels = [f"burst{i}" for i in range(5)] + ["other"]
+    order = [next(label for label in labels if label in body) for body, _ in sent]
+    assert order.index("other") == 1
+    assert [label for label in order if label != "other"] == labels[:5]
+    assert sent[1][1] - start < 0.1
+    assert sent[-1][1] - start >= 0.75
+    assert sender.counters["deferred"] == 4
+    assert sender.stats()["waiting_on_chat"] == 0
@@ -0,0 +1,105 @@
+"""
+Tests for webhook update dispatching
+"""
+import asyncio
+import random
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services.telegram_updates import UpdateDispatcher, update_chat_id
+
+
+@asynccontextmanager
+async def no_session():
+    yield None
+
+
+def make_update(update_id, chat_id, text="/start"):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "from": {"id": chat_id}, "text": text}}
+
+
+def make_dispatcher(handler, **kwargs):
+    options = dict(workers=3, queue_size=100, dedup_size=100)
+    options.update(kwargs)
+    return UpdateDispatcher(handler=handler, session_factory=no_session, **options)
+
+
+def test_update_chat_id():
+    assert update_chat_id(make_update(1, 55)) == 55
+    assert update_chat_id({"update_id": 2, "callback_query": {"message": {"chat": {"id": 7}}}}) == 7
+    assert update_chat_id({"update_id": 3}) == 0
+
+
+@pytest.mark.asyncio
+async def test_updates_are_processed_in_order_per_chat():
+    handled = {}
+
+    async def handler(db, update):
+        await asyncio.sleep(random.random() / 100)
+        chat_id = update["message"]["chat"]["id"]
+        handled.setdefault(chat_id, []).append(update["update_id"])
+
+    dispatcher = make_dispatcher(handler)
+    update_id = 0
+    for _ in range(10):
+        for chat_id in (1, 2, 3, 4):
+            update_id += 1
+            assert dispatcher.submit(make_update(update_id, chat_id)) is True
+    await dispatcher.stop()
+
+    assert dispatcher.counters["processed"] == 40
+    for ids in handled.values():
+        assert ids == sorted(ids)
+
+
+@pytest.mark.asyncio
+async def test_redelivered_updates_are_dropped():
+    handled = []
+
+    async def handler(db, update):
+        handled.append(update["update_id"])
+
+    dispatcher = make_dispatcher(handler)
+    assert dispatcher.submit(make_update(1, 10)) is True
+    assert dispatcher.submit(make_update(1, 10)) is None
+    await dispatcher.stop()
+
+    assert handled == [1]
+    assert dispatcher.counters["duplicates"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_without_marking_seen():
+    release = asyncio.Event()
+
+    async def handler(db, update):
+        await release.wait()
+
+    dispatcher = make_dispatcher(handler, workers=1, queue_size=1)
+    assert dispatcher.submit(make_update(1, 10)) is True
+    await asyncio.sleep(0)  # worker picks up update 1
+    assert dispatcher.submit(make_update(2, 10)) is True
+    assert dispatcher.submit(make_update(3, 10)) is False
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert dispatcher.submit(make_update(3, 10)) is True  # redelivery accepted
+    await dispatcher.stop()
+
+    assert dispatcher.counters["processed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_handler_errors_do_not_stop_the_worker():
+    async def handler(db, update):
+        if update["update_id"] == 1:
+            raise ValueError("boom")
+
+    dispatcher = make_dispatcher(handler, workers=1)
+    dispatcher.submit(make_update(1, 10))
+    dispatcher.submit(make_update(2, 10))
+    await dispatcher.stop()
+
+    assert dispatcher.counters["failed"] == 1
+    assert dispatcher.counters["processed"] == 1
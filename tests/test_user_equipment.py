@@ -0,0 +1,46 @@
+"""
+Tests for diff-based equipment updates in PUT /users/me
+"""
+from sqlalchemy import select
+
+from app.models.user import User
+from app.models.user_equipment import UserGymEquipment, UserHomeEquipment
+from app.models.workout_goal import WorkoutGoal
+
+
+def test_equipment_diff_and_response(api, sqlite_db, login):
+    sqlite_db.seed(User, [{"user_id": 7, "age": 30, "is_active": True, "credits": 0, "has_used_referral": False}])
+    sqlite_db.seed(WorkoutGoal, [{
+        "workout_goal_id": 3, "goal_key": "strength", "goal_label_en": "Strength", "focus": "efficiency"
+    }])
+    sqlite_db.seed(UserHomeEquipment, [
+        {"user_equipment_id": 1, "user_id": 7, "equipment_id": 10},
+        {"user_equipment_id": 2, "user_id": 7, "equipment_id": 11},
+    ])
+    sqlite_db.seed(UserGymEquipment, [{"user_equipment_id": 1, "user_id": 7, "equipment_id": 50}])
+    login(7)
+
+    response = api.put("/api/v1/users/me", json={
+        "age": 31, "workout_goal_id": 3, "home_equipment": [11, 12, 12, 13]
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["age"] == 31
+    assert body["workout_goal"]["goal_key"] == "strength"
+    assert body["nutrition_goal"] is None
+    assert body["home_equipment"] == [11, 12, 13]
+    assert body["gym_equipment"] == [50]  # not in the request, untouched
+    assert body["updated_at"] is not None
+
+    home_table = sqlite_db.tables[UserHomeEquipment]
+    with sqlite_db.sync_engine.connect() as conn:
+        home = conn.execute(
+            select(home_table.c.user_equipment_id, home_table.c.equipment_id).order_by(home_table.c.equipment_id)
+        ).all()
+    # Kept rows are not rewritten
+    assert home[0] == (2, 11)
+    assert [equipment_id for _, equipment_id in home] == [11, 12, 13]
+
+    response = api.put("/api/v1/users/me", json={"gym_equipment": []})
+    assert response.json()["gym_equipment"] == []
+    assert response.json()["home_equipment"] == [11, 12, 13]
@@ -0,0 +1,43 @@
+"""
+Tests for the cached GET /users/me profile
+"""
+from sqlalchemy import update
+
+from app.core.principal import invalidate_user
+from app.models.auth_method import UserAuthMethod
+from app.models.user import User
+from app.models.user_equipment import UserGymEquipment, UserHomeEquipment
+
+
+def test_profile_cached_until_invalidated(api, sqlite_db, login):
+    sqlite_db.seed(User, [{"user_id": 7, "age": 30, "is_active": True, "credits": 5, "has_used_referral": False}])
+    sqlite_db.seed(UserAuthMethod, [
+        {"id": 1, "user_id": 7, "auth_provider": "sms", "auth_identifier": "+98912", "is_verified": True, "is_primary": True},
+        {"id": 2, "user_id": 7, "auth_provider": "email", "auth_identifier": "a@b.c", "is_verified": True, "is_primary": False},
+    ])
+    sqlite_db.seed(UserHomeEquipment, [
+        {"user_equipment_id": i, "user_id": 7, "equipment_id": i} for i in range(1, 41)
+    ])
+    sqlite_db.seed(UserGymEquipment, [
+        {"user_equipment_id": i, "user_id": 7, "equipment_id": 100 + i} for i in range(1, 31)
+    ])
+    login(7)
+
+    response = api.get("/api/v1/users/me")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["age"] == 30
+    assert body["home_equipment"] == list(range(1, 41))
+    assert body["gym_equipment"] == list(range(101, 131))
+    assert sorted(method["auth_provider"] for method in body["auth_methods"]) == ["email", "sms"]
+
+    with sqlite_db.sync_engine.begin() as conn:
+        conn.execute(update(sqlite_db.tables[User]).values(age=31))
+
+    # Served from the cache until the user is invalidated
+    assert api.get("/api/v1/users/me").json() == body
+    invalidate_user(7)
+    assert api.get("/api/v1/users/me").json()["age"] == 31
+
+    login(8)
+    assert api.get("/api/v1/users/me").status_code == 401
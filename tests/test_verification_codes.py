@@ -0,0 +1,103 @@
+"""
+Tests for the verification code sweeper
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, text
+
+from app.models.verification_code import VerificationCode, VerificationCodeArchive
+from app.services.verification_codes import (
+    DEFAULT_PARTITION, VerificationCodeSweeper, default_partition, partition_name
+)
+
+
+@pytest.fixture
+def session_factory(async_sqlite_db):
+    return async_sqlite_db.session_factory
+
+
+async def add_codes(session_factory, count, expires_at, identifier="+100"):
+    async with session_factory() as db:
+        db.add_all([
+            VerificationCode(identifier=identifier, code="123456", code_type="sms", expires_at=expires_at)
+            for _ in range(count)
+        ])
+        await db.commit()
+
+
+async def count(session_factory, model):
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(model))
+
+
+def make_sweeper(session_factory, **kwargs):
+    options = dict(interval=60, batch_size=4, retention_hours=24)
+    options.update(kwargs)
+    return VerificationCodeSweeper(session_factory=session_factory, **options)
+
+
+@pytest.mark.asyncio
+async def test_sweep_removes_only_codes_past_retention(session_factory):
+    now = datetime.utcnow()
+    await add_codes(session_factory, 10, now - timedelta(hours=30), identifier="old")
+    await add_codes(session_factory, 3, now - timedelta(hours=1), identifier="recent")
+    await add_codes(session_factory, 2, now + timedelta(minutes=5), identifier="live")
+
+    sweeper = make_sweeper(session_factory)
+    # 10 rows in batches of 4
+    assert await sweeper.sweep_once() == 10
+    assert await count(session_factory, VerificationCode) == 5
+    assert await count(session_factory, VerificationCodeArchive) == 0
+
+    async with session_factory() as db:
+        identifiers = set((await db.scalars(select(VerificationCode.identifier))).all())
+    assert identifiers == {"recent", "live"}
+
+    assert await sweeper.sweep_once() == 0
+    assert sweeper.stats()["swept"] == 10
+    assert sweeper.stats()["runs"] == 2
+
+
+@pytest.mark.asyncio
+async def test_sweep_archives_when_enabled(session_factory):
+    await add_codes(session_factory, 5, datetime.utcnow() - timedelta(days=3))
+
+    sweeper = make_sweeper(session_factory, archive=True)
+    assert await sweeper.sweep_once() == 5
+    assert await count(session_factory, VerificationCode) == 0
+    assert await count(session_factory, VerificationCodeArchive) == 5
+
+    async with session_factory() as db:
+        archived = await db.scalar(select(VerificationCodeArchive).limit(1))
+    assert archived.identifier == "+100"
+    assert archived.archived_at is not None
+
+
+@pytest.mark.asyncio
+async def test_default_partition_is_swept_in_batches(session_factory, async_sqlite_db):
+    # Stand-in for the default partition: same columns, its own rows
+    now = datetime.utcnow()
+    with async_sqlite_db.sync_engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} AS SELECT * FROM verification_codes WHERE 0"))
+        conn.execute(default_partition.insert(), [
+            {"id": i, "identifier": "late", "code": "123456", "code_type": "sms", "attempts": 0, "verified": False,
+             "expires_at": now - timedelta(days=2 if i < 6 else -1), "created_at": now - timedelta(days=2)}
+            for i in range(1, 8)
+        ])
+    await add_codes(session_factory, 2, now - timedelta(days=2))
+
+    sweeper = make_sweeper(session_factory, archive=True)
+    async with session_factory() as db:
+        assert await sweeper.sweep_batches(db, now - timedelta(hours=24), default_partition) == 5
+    assert await count(session_factory, default_partition) == 2
+    # Only the given table is swept
+    assert await count(session_factory, VerificationCode) == 2
+    assert await count(session_factory, VerificationCodeArchive) == 5
+
+
+def test_partition_names_sort_by_day():
+    days = [datetime(2026, 1, 9), datetime(2026, 1, 10), datetime(2026, 12, 1)]
+    names = [partition_name(day) for day in days]
+    assert names == sorted(names)
+    assert names[0] == "verification_codes_p20260109"